@@ -0,0 +1,446 @@
+"""Almacenamiento persistente de partes en SQLite (modo WAL).
+
+Cada hilo usa su propia conexión. Las escrituras de la vista HTML pasan por
+EscritorEnLotes, que agrupa varios partes en una sola transacción para no
+pagar un commit por petición.
+
+El texto de los partes se indexa en una tabla FTS5 de contenido externo
+(partes_fts) que mantienen unos triggers, así que cada guardado actualiza el
+índice en la misma transacción. Lo mismo hacen los triggers de las tablas de
+resumen por paciente y cuidadora (ver resumenes.py).
+
+La tabla pdfs asocia la clave de contenido de cada PDF enlazado con su
+parte, su motor y su fecha de generación, para servirlo en /pdf/<clave>.pdf
+(ver RegistroPDF). EscritorEnLotes elimina las que han caducado.
+"""
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+import resumenes
+from lotes import HiloEnLotes
+from parte import CAMPOS_PARTE, SECCIONES, fecha_iso, normalizar_parte
+
+logger = logging.getLogger(__name__)
+
+ESQUEMA = f"""
+CREATE TABLE IF NOT EXISTS partes (
+    id INTEGER PRIMARY KEY,
+    {', '.join(f"{campo} TEXT NOT NULL DEFAULT ''" for campo in CAMPOS_PARTE)},
+    creado TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_partes_paciente_fecha ON partes (paciente, fecha, id);
+CREATE INDEX IF NOT EXISTS idx_partes_cuidadora_fecha ON partes (cuidadora, fecha, id);
+CREATE TABLE IF NOT EXISTS pdfs (
+    clave TEXT PRIMARY KEY,
+    motor TEXT NOT NULL,
+    datos TEXT NOT NULL,
+    generado TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_pdfs_generado ON pdfs (generado);
+"""
+
+# Campos indexados para la búsqueda de texto
+CAMPOS_BUSQUEDA = ['paciente', 'cuidadora'] + SECCIONES
+
+_FTS_COLUMNAS = ', '.join(CAMPOS_BUSQUEDA)
+_FTS_NUEVOS = ', '.join(f'new.{campo}' for campo in CAMPOS_BUSQUEDA)
+_FTS_VIEJOS = ', '.join(f'old.{campo}' for campo in CAMPOS_BUSQUEDA)
+
+# remove_diacritics 2: "medicacion" encuentra "medicación"
+ESQUEMA_BUSQUEDA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS partes_fts USING fts5(
+    {_FTS_COLUMNAS},
+    content='partes', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS partes_fts_insertar AFTER INSERT ON partes BEGIN
+    INSERT INTO partes_fts (rowid, {_FTS_COLUMNAS}) VALUES (new.id, {_FTS_NUEVOS});
+END;
+CREATE TRIGGER IF NOT EXISTS partes_fts_borrar AFTER DELETE ON partes BEGIN
+    INSERT INTO partes_fts (partes_fts, rowid, {_FTS_COLUMNAS}) VALUES ('delete', old.id, {_FTS_VIEJOS});
+END;
+CREATE TRIGGER IF NOT EXISTS partes_fts_actualizar AFTER UPDATE ON partes BEGIN
+    INSERT INTO partes_fts (partes_fts, rowid, {_FTS_COLUMNAS}) VALUES ('delete', old.id, {_FTS_VIEJOS});
+    INSERT INTO partes_fts (rowid, {_FTS_COLUMNAS}) VALUES (new.id, {_FTS_NUEVOS});
+END;
+"""
+
+# Columnas de la tabla partes, en el orden de _SELECT y de las exportaciones
+COLUMNAS = ['id'] + CAMPOS_PARTE + ['creado']
+_SELECT = f"SELECT {', '.join(COLUMNAS)} FROM partes"
+_INSERT = (
+    f"INSERT INTO partes ({', '.join(CAMPOS_PARTE)}, creado) "
+    f"VALUES ({', '.join('?' for _ in CAMPOS_PARTE)}, ?)"
+)
+
+
+def _fila(datos):
+    parte = normalizar_parte(datos)
+    parte['fecha'] = fecha_iso(parte['fecha'])
+    return [parte[campo] for campo in CAMPOS_PARTE] + [datetime.now().isoformat(timespec='seconds')]
+
+
+def consulta_fts(texto, campos=None):
+    """Traduce el texto del usuario a una consulta FTS5 segura.
+
+    Cada palabra o "frase entre comillas" es un término obligatorio; un '*'
+    al final de una palabra busca por prefijo. Con `campos` la búsqueda se
+    limita a esas columnas. Lanza ValueError si no queda ningún término.
+    """
+    terminos = []
+    for frase, palabra in re.findall(r'"([^"]*)"|(\S+)', texto):
+        palabras = re.findall(r'\w+', frase or palabra)
+        if palabras:
+            prefijo = '*' if palabra.endswith('*') else ''
+            terminos.append(f'"{" ".join(palabras)}"{prefijo}')
+    if not terminos:
+        raise ValueError('La búsqueda no tiene ningún término')
+    expresion = ' '.join(terminos)
+    if campos:
+        return f"{{{' '.join(campos)}}} : ({expresion})"
+    return expresion
+
+
+def codificar_cursor(parte):
+    """Cursor opaco para la paginación por clave (fecha, id)"""
+    return f"{parte['fecha']}:{parte['id']}"
+
+
+def decodificar_cursor(cursor):
+    fecha, _, parte_id = cursor.partition(':')
+    return fecha_iso(fecha), int(parte_id)
+
+
+class Almacen:
+    """Acceso a la base de datos de partes"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+        directorio = os.path.dirname(os.path.abspath(ruta))
+        os.makedirs(directorio, exist_ok=True)
+        conexion = self.conexion()
+        conexion.execute('PRAGMA journal_mode=WAL')
+        conexion.executescript(ESQUEMA)
+        indice_nuevo = conexion.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'partes_fts'"
+        ).fetchone() is None
+        conexion.executescript(ESQUEMA_BUSQUEDA)
+        if indice_nuevo:
+            # Base creada antes del índice: se indexan los partes existentes
+            with conexion:
+                conexion.execute("INSERT INTO partes_fts (partes_fts) VALUES ('rebuild')")
+        resumenes_nuevos = conexion.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = ?", (resumenes.tabla('paciente', 'dia'),)
+        ).fetchone() is None
+        conexion.executescript(resumenes.ESQUEMA_RESUMENES)
+        if resumenes_nuevos:
+            resumenes.rellenar(conexion)
+
+    @classmethod
+    def desde_entorno(cls, directorio_por_defecto):
+        return cls(os.environ.get('PARTE_DB') or os.path.join(directorio_por_defecto, 'partes.db'))
+
+    def conexion(self):
+        """Conexión del hilo actual (se abre en el primer uso)"""
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=10)
+            conexion.row_factory = sqlite3.Row
+            conexion.execute('PRAGMA synchronous=NORMAL')
+            conexion.execute('PRAGMA foreign_keys=ON')
+            self._local.conexion = conexion
+        return conexion
+
+    def cerrar_conexion(self):
+        """Cierra la conexión del hilo actual (se reabrirá en el siguiente uso)"""
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is not None:
+            conexion.close()
+            self._local.conexion = None
+
+    # Escritura
+
+    def guardar(self, datos):
+        """Guarda un parte y devuelve su id"""
+        return self.guardar_varios([datos])[0]
+
+    def guardar_varios(self, lista):
+        """Guarda varios partes en una única transacción y devuelve sus ids"""
+        conexion = self.conexion()
+        with conexion:
+            return [conexion.execute(_INSERT, _fila(datos)).lastrowid for datos in lista]
+
+    def registrar_pdf(self, clave, motor, datos, generado):
+        """Registra un PDF si la clave es nueva y devuelve la fecha de generación registrada.
+
+        Si otro proceso la registra a la vez, gana la primera escritura y los
+        dos devuelven su fecha.
+        """
+        conexion = self.conexion()
+        with conexion:
+            conexion.execute(
+                'INSERT OR IGNORE INTO pdfs (clave, motor, datos, generado) VALUES (?, ?, ?, ?)',
+                (clave, motor, json.dumps(datos, ensure_ascii=False), generado.isoformat()),
+            )
+            fila = conexion.execute('SELECT generado FROM pdfs WHERE clave = ?', (clave,)).fetchone()
+        return datetime.fromisoformat(fila['generado'])
+
+    def purgar_pdfs(self, antes):
+        """Elimina los PDF registrados con fecha de generación anterior a `antes`"""
+        conexion = self.conexion()
+        with conexion:
+            return conexion.execute('DELETE FROM pdfs WHERE generado < ?', (antes.isoformat(),)).rowcount
+
+    # Lectura
+
+    def generado_pdf(self, clave):
+        """Fecha de generación registrada para `clave`, o None"""
+        fila = self.conexion().execute('SELECT generado FROM pdfs WHERE clave = ?', (clave,)).fetchone()
+        return datetime.fromisoformat(fila['generado']) if fila else None
+
+    def pdf_registrado(self, clave):
+        """Devuelve (motor, datos, generado) del PDF registrado con `clave`, o None"""
+        fila = self.conexion().execute(
+            'SELECT motor, datos, generado FROM pdfs WHERE clave = ?', (clave,)
+        ).fetchone()
+        if fila is None:
+            return None
+        return fila['motor'], json.loads(fila['datos']), datetime.fromisoformat(fila['generado'])
+
+    def obtener(self, parte_id):
+        """Devuelve el parte como dict, o None si no existe"""
+        fila = self.conexion().execute(f"{_SELECT} WHERE id = ?", (parte_id,)).fetchone()
+        return dict(fila) if fila else None
+
+    def listar_por_paciente(self, paciente, desde=None, hasta=None, despues=None, limite=50):
+        """Partes de un paciente ordenados por (fecha, id), paginados por clave.
+
+        Devuelve (partes, cursor_siguiente); el cursor es None en la última página.
+        """
+        condiciones = ['paciente = ?']
+        parametros = [paciente]
+        if desde:
+            condiciones.append('fecha >= ?')
+            parametros.append(desde)
+        if hasta:
+            condiciones.append('fecha <= ?')
+            parametros.append(hasta)
+        if despues:
+            condiciones.append('(fecha, id) > (?, ?)')
+            parametros.extend(decodificar_cursor(despues))
+
+        consulta = f"{_SELECT} WHERE {' AND '.join(condiciones)} ORDER BY fecha, id LIMIT ?"
+        # Se pide una fila de más para saber si hay otra página
+        filas = self.conexion().execute(consulta, parametros + [limite + 1]).fetchall()
+        partes = [dict(fila) for fila in filas[:limite]]
+        siguiente = codificar_cursor(partes[-1]) if len(filas) > limite else None
+        return partes, siguiente
+
+    def iterar_por_paciente(self, paciente, desde=None, hasta=None, tamano_pagina=200):
+        """Recorre todos los partes de un paciente página a página"""
+        cursor = None
+        while True:
+            partes, cursor = self.listar_por_paciente(paciente, desde, hasta, cursor, tamano_pagina)
+            yield from partes
+            if cursor is None:
+                return
+
+    def exportar(self, paciente=None, cuidadora=None, desde=None, hasta=None, tamano_bloque=1000):
+        """Recorre los partes filtrados como tuplas de COLUMNAS, sin cargarlos en memoria.
+
+        Usa una conexión de solo lectura propia y lee las filas por bloques
+        del cursor: la exportación ve una foto fija de la base (WAL) sin
+        bloquear a quien escribe. Con paciente o cuidadora sigue el orden
+        (fecha, id) de su índice y si no el de id, así que SQLite no ordena
+        el resultado entero antes de entregar la primera fila.
+        """
+        condiciones = []
+        parametros = []
+        for campo, valor in (('paciente', paciente), ('cuidadora', cuidadora)):
+            if valor:
+                condiciones.append(f'{campo} = ?')
+                parametros.append(valor)
+        if desde:
+            condiciones.append('fecha >= ?')
+            parametros.append(desde)
+        if hasta:
+            condiciones.append('fecha <= ?')
+            parametros.append(hasta)
+        donde = f"WHERE {' AND '.join(condiciones)}" if condiciones else ''
+        orden = 'fecha, id' if paciente or cuidadora else 'id'
+
+        conexion = sqlite3.connect(f'file:{quote(os.path.abspath(self.ruta))}?mode=ro', uri=True, timeout=10)
+        try:
+            cursor = conexion.execute(f"{_SELECT} {donde} ORDER BY {orden}", parametros)
+            while True:
+                filas = cursor.fetchmany(tamano_bloque)
+                if not filas:
+                    return
+                yield from filas
+        finally:
+            conexion.close()
+
+    def buscar(self, texto, campos=None, paciente=None, desde=None, hasta=None, limite=50, desplazamiento=0):
+        """Búsqueda de texto en los partes, de más a menos relevante (BM25).
+
+        Devuelve (resultados, desplazamiento_siguiente); cada resultado lleva
+        los datos de cabecera del parte, un fragmento con los términos
+        encontrados entre corchetes y su puntuación. El desplazamiento
+        siguiente es None en la última página.
+        """
+        condiciones = ['partes_fts MATCH ?']
+        parametros = [consulta_fts(texto, campos)]
+        if paciente:
+            condiciones.append('p.paciente = ?')
+            parametros.append(paciente)
+        if desde:
+            condiciones.append('p.fecha >= ?')
+            parametros.append(desde)
+        if hasta:
+            condiciones.append('p.fecha <= ?')
+            parametros.append(hasta)
+
+        consulta = (
+            "SELECT p.id, p.paciente, p.cuidadora, p.fecha, p.estado_general, "
+            "snippet(partes_fts, -1, '[', ']', '…', 16) AS fragmento, bm25(partes_fts) AS puntuacion "
+            "FROM partes_fts JOIN partes p ON p.id = partes_fts.rowid "
+            f"WHERE {' AND '.join(condiciones)} "
+            "ORDER BY puntuacion, p.fecha DESC, p.id DESC LIMIT ? OFFSET ?"
+        )
+        filas = self.conexion().execute(consulta, parametros + [limite + 1, desplazamiento]).fetchall()
+        resultados = [dict(fila) for fila in filas[:limite]]
+        siguiente = desplazamiento + limite if len(filas) > limite else None
+        return resultados, siguiente
+
+    def serie_resumen(self, dimension, valor, periodo, desde, hasta):
+        """Resúmenes de un paciente o una cuidadora, uno por día o semana del rango"""
+        filas = self.conexion().execute(
+            f"SELECT * FROM {resumenes.tabla(dimension, periodo)} "
+            f"WHERE {dimension} = ? AND periodo >= ? AND periodo <= ? ORDER BY periodo",
+            (valor, desde, hasta),
+        )
+        return [dict(resumenes.como_dict(fila), periodo=fila['periodo']) for fila in filas]
+
+    def totales_resumen(self, dimension, periodo, desde, hasta, limite=100):
+        """Totales por paciente o cuidadora en el rango, de más a menos partes"""
+        sumas = ', '.join(f'SUM({c}) AS {c}' for c in resumenes.CONTADORES)
+        filas = self.conexion().execute(
+            f"SELECT {dimension}, {sumas} FROM {resumenes.tabla(dimension, periodo)} "
+            f"WHERE periodo >= ? AND periodo <= ? GROUP BY {dimension} "
+            f"ORDER BY SUM(partes) DESC, {dimension} LIMIT ?",
+            (desde, hasta, limite),
+        )
+        return [dict(resumenes.como_dict(fila), **{dimension: fila[dimension]}) for fila in filas]
+
+    def resumen_paciente(self, paciente, desde, hasta):
+        """Distribución de estado_general y días con signos de alerta en un rango"""
+        conexion = self.conexion()
+        filtro = 'paciente = ? AND fecha >= ? AND fecha <= ?'
+        parametros = (paciente, desde, hasta)
+        estados = {
+            fila[0]: fila[1]
+            for fila in conexion.execute(
+                f"SELECT estado_general, COUNT(*) FROM partes WHERE {filtro} GROUP BY estado_general",
+                parametros,
+            )
+        }
+        dias_alerta = [
+            fila[0]
+            for fila in conexion.execute(
+                f"SELECT DISTINCT fecha FROM partes WHERE {filtro} AND signos_alerta != '' ORDER BY fecha",
+                parametros,
+            )
+        ]
+        return {
+            'total': sum(estados.values()),
+            'estados': estados,
+            'dias_con_alerta': dias_alerta,
+        }
+
+
+class EscritorEnLotes(HiloEnLotes):
+    """Hilo que agrupa las escrituras pendientes en transacciones de varios partes.
+
+    Con `ttl_pdfs` elimina además, como mucho una vez por hora, los registros
+    de RegistroPDF que han caducado.
+    """
+
+    NOMBRE_HILO = 'escritor-partes'
+    PURGA_CADA = 3600
+
+    def __init__(self, almacen, max_lote=100, espera=0.05, ttl_pdfs=None):
+        super().__init__(max_lote, espera)
+        self.almacen = almacen
+        self.ttl_pdfs = ttl_pdfs
+        self._ultima_purga = 0.0
+
+    def encolar(self, datos):
+        """Programa el guardado de un parte sin esperar al disco"""
+        self._arrancar()
+        self._cola.put(dict(datos))
+
+    def _procesar(self, lote):
+        self.almacen.guardar_varios(lote)
+        if self.ttl_pdfs and time.monotonic() - self._ultima_purga > self.PURGA_CADA:
+            self._ultima_purga = time.monotonic()
+            self.almacen.purgar_pdfs(datetime.now() - timedelta(seconds=self.ttl_pdfs))
+
+    def _fallo(self, lote):
+        logger.exception('No se pudieron guardar %d escrituras', len(lote))
+
+
+class RegistroPDF:
+    """Fecha de generación de cada clave de /pdf/<clave>.pdf.
+
+    La primera vez que se enlaza una clave queda registrada la fecha de
+    generación del parte; después todos los workers usan la registrada, así
+    que los bytes de una clave no dependen del worker ni de la caché. El ETag
+    y la clave de la caché incluyen esa fecha (cache_pdf.clave_pdf): si el
+    registro caduca y la clave se registra de nuevo con otra fecha, no se
+    mezclan los bytes antiguos con los nuevos. Las claves recientes se
+    recuerdan en memoria; solo una clave nueva escribe en la base.
+    """
+
+    def __init__(self, almacen, ttl=None, maximo=10000):
+        self.almacen = almacen
+        self.ttl = ttl
+        self.maximo = maximo
+        self._generados = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _vigente(self, generado):
+        return not self.ttl or generado > datetime.now() - timedelta(seconds=self.ttl)
+
+    def _recordar(self, clave, generado):
+        with self._lock:
+            self._generados[clave] = generado
+            self._generados.move_to_end(clave)
+            while len(self._generados) > self.maximo:
+                self._generados.popitem(last=False)
+        return generado
+
+    def consultar(self, clave):
+        """Fecha de generación registrada para `clave`, o None si no está registrada"""
+        with self._lock:
+            registrado = self._generados.get(clave)
+            if registrado is not None and self._vigente(registrado):
+                self._generados.move_to_end(clave)
+                return registrado
+        # Una clave caducada sigue valiendo hasta que el escritor la elimina
+        registrado = self.almacen.generado_pdf(clave)
+        return None if registrado is None else self._recordar(clave, registrado)
+
+    def generado(self, clave, motor, datos, generado):
+        """Registra la clave si es nueva y devuelve su fecha de generación"""
+        registrado = self.consultar(clave)
+        if registrado is None:
+            registrado = self._recordar(clave, self.almacen.registrar_pdf(clave, motor, datos, generado))
+        return registrado
@@ -1,962 +1,765 @@
-from flask import Flask, request, render_template_string, make_response
-from datetime import datetime
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.pdfgen import canvas
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
-from io import BytesIO
+from flask import (
+    Flask,
+    Response,
+    abort,
+    g,
+    jsonify,
+    make_response,
+    redirect,
+    render_template,
+    request,
+    send_file,
+    send_from_directory,
+    url_for,
+)
+import click
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+import hashlib
 import os
+import time
+from functools import lru_cache
+
+# ReportLab y el cliente de Google no se importan aquí: los generadores de PDF
+# y el archivo en Drive se cargan en su primer uso (o en el maestro de
+# gunicorn con PARTE_PRECARGAR=1, ver precargar)
+from almacenamiento import CAMPOS_BUSQUEDA, Almacen, EscritorEnLotes, RegistroPDF
+from archivo_drive import ArchivoDrive, precargar as precargar_drive
+from cache_pdf import CachePDF, clave_parte, clave_pdf
+from exportacion import FORMATOS as FORMATOS_EXPORTACION, disponible as formato_disponible, exportar
+from importacion import FORMATOS as FORMATOS_IMPORTACION, Importacion
+from metricas import CACHE_PDF, PETICIONES, cronometro, registro as registro_metricas
+from parte import CAMPOS_PARTE, ErrorValidacion, Parte, parsear_fecha
+from perfilado import TIPOS as TIPOS_PERFIL, Perfilador
+from renderizado import MOTORES, ColaLlena, RenderizadorPDF, TiempoAgotado, motor_pdf
+from resumenes import PERIODOS as PERIODOS_RESUMEN
+from salida_pdf import en_trozos
+from trabajos import TERMINADO, ColaTrabajos
 
 app = Flask(__name__)
 
-HTML_TEMPLATE = '''
-<!DOCTYPE html>
-<html lang="es">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Sistema de Parte Diario</title>
-    <link href="https://fonts.googleapis.com/css2?family=Poppins:wght@300;400;500;600&family=Roboto:wght@300;400&display=swap" rel="stylesheet">
-    <style>
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-
-        body {
-            font-family: 'Roboto', sans-serif;
-            background: linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%);
-            min-height: 100vh;
-            padding: 20px;
-        }
-
-        .container {
-            max-width: 1200px;
-            margin: 0 auto;
-        }
-
-        .header {
-            text-align: center;
-            margin-bottom: 40px;
-            padding: 30px;
-            background: white;
-            border-radius: 15px;
-            box-shadow: 0 10px 30px rgba(0,0,0,0.1);
-        }
-
-        .header h1 {
-            font-family: 'Poppins', sans-serif;
-            color: #2c3e50;
-            font-size: 2.5em;
-            margin-bottom: 10px;
-            background: linear-gradient(45deg, #3498db, #2c3e50);
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-        }
-
-        .header p {
-            color: #7f8c8d;
-            font-size: 1.1em;
-        }
-
-        .form-container {
-            background: white;
-            padding: 40px;
-            border-radius: 15px;
-            box-shadow: 0 15px 35px rgba(0,0,0,0.1);
-            margin-bottom: 30px;
-        }
-
-        .form-grid {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
-            gap: 25px;
-            margin-bottom: 30px;
-        }
-
-        .form-group {
-            margin-bottom: 25px;
-        }
-
-        .form-group label {
-            display: block;
-            margin-bottom: 8px;
-            font-weight: 500;
-            color: #2c3e50;
-            font-family: 'Poppins', sans-serif;
-        }
-
-        .form-group input,
-        .form-group select,
-        .form-group textarea {
-            width: 100%;
-            padding: 12px 15px;
-            border: 2px solid #e0e0e0;
-            border-radius: 8px;
-            font-size: 16px;
-            transition: all 0.3s ease;
-            font-family: 'Roboto', sans-serif;
-        }
-
-        .form-group input:focus,
-        .form-group select:focus,
-        .form-group textarea:focus {
-            border-color: #3498db;
-            outline: none;
-            box-shadow: 0 0 0 3px rgba(52, 152, 219, 0.1);
-        }
-
-        .form-group textarea {
-            min-height: 120px;
-            resize: vertical;
-        }
-
-        .checkbox-group {
-            display: flex;
-            gap: 20px;
-            flex-wrap: wrap;
-            margin-top: 10px;
-        }
-
-        .checkbox-item {
-            display: flex;
-            align-items: center;
-            gap: 8px;
-        }
-
-        .checkbox-item input[type="checkbox"] {
-            width: auto;
-        }
-
-        .btn-submit {
-            background: linear-gradient(45deg, #3498db, #2980b9);
-            color: white;
-            border: none;
-            padding: 16px 40px;
-            font-size: 18px;
-            border-radius: 8px;
-            cursor: pointer;
-            transition: all 0.3s ease;
-            font-family: 'Poppins', sans-serif;
-            font-weight: 500;
-            display: block;
-            margin: 0 auto;
-            min-width: 200px;
-        }
-
-        .btn-submit:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 10px 20px rgba(52, 152, 219, 0.3);
-        }
-
-        .parte-container {
-            background: white;
-            padding: 40px;
-            border-radius: 15px;
-            box-shadow: 0 15px 35px rgba(0,0,0,0.1);
-            margin-top: 30px;
-            border-left: 5px solid #3498db;
-        }
-
-        .parte-header {
-            text-align: center;
-            margin-bottom: 40px;
-            padding-bottom: 20px;
-            border-bottom: 2px solid #f0f0f0;
-        }
-
-        .parte-title {
-            font-family: 'Poppins', sans-serif;
-            color: #2c3e50;
-            font-size: 2.2em;
-            margin-bottom: 10px;
-        }
-
-        .parte-subtitle {
-            color: #7f8c8d;
-            font-size: 1.2em;
-        }
-
-        .parte-section {
-            margin-bottom: 30px;
-            padding: 20px;
-            background: #f8f9fa;
-            border-radius: 10px;
-        }
-
-        .section-title {
-            font-family: 'Poppins', sans-serif;
-            color: #3498db;
-            font-size: 1.3em;
-            margin-bottom: 15px;
-            padding-bottom: 10px;
-            border-bottom: 2px solid #e0e0e0;
-        }
-
-        .section-content {
-            color: #2c3e50;
-            line-height: 1.6;
-            white-space: pre-line;
-        }
-
-        .info-grid {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
-            gap: 20px;
-            margin-bottom: 25px;
-        }
-
-        .info-item {
-            padding: 15px;
-            background: white;
-            border-radius: 8px;
-            box-shadow: 0 3px 10px rgba(0,0,0,0.05);
-        }
-
-        .info-label {
-            font-weight: 600;
-            color: #7f8c8d;
-            font-size: 0.9em;
-            text-transform: uppercase;
-            margin-bottom: 5px;
-        }
-
-        .info-value {
-            color: #2c3e50;
-            font-size: 1.1em;
-        }
-
-        .signature-section {
-            margin-top: 40px;
-            padding-top: 20px;
-            border-top: 2px dashed #e0e0e0;
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-        }
-
-        .action-buttons {
-            display: flex;
-            gap: 15px;
-            justify-content: center;
-            margin-top: 30px;
-            flex-wrap: wrap;
-        }
-
-        .btn-pdf {
-            background: linear-gradient(45deg, #e74c3c, #c0392b);
-            color: white;
-            border: none;
-            padding: 15px 35px;
-            border-radius: 8px;
-            cursor: pointer;
-            font-family: 'Poppins', sans-serif;
-            font-weight: 500;
-            display: flex;
-            align-items: center;
-            gap: 10px;
-            text-decoration: none;
-            font-size: 16px;
-        }
-
-        .btn-print {
-            background: linear-gradient(45deg, #3498db, #2980b9);
-            color: white;
-            border: none;
-            padding: 15px 35px;
-            border-radius: 8px;
-            cursor: pointer;
-            font-family: 'Poppins', sans-serif;
-            font-weight: 500;
-            display: flex;
-            align-items: center;
-            gap: 10px;
-            font-size: 16px;
-        }
-
-        .btn-back {
-            background: linear-gradient(45deg, #95a5a6, #7f8c8d);
-            color: white;
-            border: none;
-            padding: 15px 35px;
-            border-radius: 8px;
-            cursor: pointer;
-            font-family: 'Poppins', sans-serif;
-            font-weight: 500;
-            text-decoration: none;
-            display: inline-block;
-            display: flex;
-            align-items: center;
-            gap: 10px;
-            font-size: 16px;
-        }
-
-        @media print {
-            body {
-                background: white;
-            }
-            .parte-container {
-                box-shadow: none;
-                border: none;
-            }
-            .action-buttons {
-                display: none;
-            }
-        }
-
-        .status-indicator {
-            display: inline-block;
-            width: 12px;
-            height: 12px;
-            border-radius: 50%;
-            margin-right: 8px;
-        }
-
-        .status-good { background-color: #2ecc71; }
-        .status-regular { background-color: #f39c12; }
-        .status-bad { background-color: #e74c3c; }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>📋 Sistema de Parte Diario</h1>
-            <p>Registro completo de atención al paciente</p>
-        </div>
-
-        <div class="form-container">
-            <form action="/generar" method="post">
-                <div class="form-grid">
-                    <div class="form-group">
-                        <label for="paciente">👤 Nombre del Paciente *</label>
-                        <input type="text" id="paciente" name="paciente" required placeholder="Ingrese nombre completo">
-                    </div>
-
-                    <div class="form-group">
-                        <label for="cuidadora">👩‍⚕️ Nombre de la Cuidadora *</label>
-                        <input type="text" id="cuidadora" name="cuidadora" required placeholder="Nombre completo de la cuidadora">
-                    </div>
-
-                    <div class="form-group">
-                        <label for="fecha">📅 Fecha *</label>
-                        <input type="date" id="fecha" name="fecha" value="{{ fecha_hoy }}" required>
-                    </div>
-                </div>
-
-                <div class="form-grid">
-                    <div class="form-group">
-                        <label>😊 Estado General del Paciente</label>
-                        <div class="checkbox-group">
-                            <label class="checkbox-item">
-                                <input type="radio" name="estado_general" value="Bueno" checked> 
-                                <span class="status-indicator status-good"></span> Bueno
-                            </label>
-                            <label class="checkbox-item">
-                                <input type="radio" name="estado_general" value="Regular">
-                                <span class="status-indicator status-regular"></span> Regular
-                            </label>
-                            <label class="checkbox-item">
-                                <input type="radio" name="estado_general" value="Malo">
-                                <span class="status-indicator status-bad"></span> Malo
-                            </label>
-                        </div>
-                        <textarea name="estado_detalle" placeholder="Describa el estado general del paciente, humor, energía, etc."></textarea>
-                    </div>
-
-                    <div class="form-group">
-                        <label>💊 Medicación Administrada</label>
-                        <textarea name="medicacion" placeholder="Lista de medicamentos, dosis y horarios"></textarea>
-                    </div>
-                </div>
-
-                <div class="form-grid">
-                    <div class="form-group">
-                        <label>🍽️ Alimentación</label>
-                        <textarea name="alimentacion" placeholder="Describa comidas, cantidades, horarios y aceptación"></textarea>
-                    </div>
-
-                    <div class="form-group">
-                        <label>💧 Hidratación</label>
-                        <textarea name="hidratacion" placeholder="Registro de líquidos consumidos"></textarea>
-                    </div>
-                </div>
-
-                <div class="form-grid">
-                    <div class="form-group">
-                        <label>🚽 Eliminación</label>
-                        <textarea name="eliminacion" placeholder="Registro de deposiciones y micciones"></textarea>
-                    </div>
-
-                    <div class="form-group">
-                        <label>🛌 Descanso y Sueño</label>
-                        <textarea name="descanso" placeholder="Horas de sueño, calidad del descanso"></textarea>
-                    </div>
-                </div>
-
-                <div class="form-grid">
-                    <div class="form-group">
-                        <label>🚶‍♂️ Movilidad y Ejercicio</label>
-                        <textarea name="movilidad" placeholder="Actividad física, paseos, ejercicios realizados"></textarea>
-                    </div>
-
-                    <div class="form-group">
-                        <label>🧼 Higiene y Cuidados</label>
-                        <textarea name="higiene" placeholder="Baño, aseo, cambios de ropa, cuidados especiales"></textarea>
-                    </div>
-                </div>
-
-                <div class="form-group">
-                    <label>📝 Observaciones y Notas Importantes</label>
-                    <textarea name="observaciones" placeholder="Incidentes, cambios notorios, llamadas al médico, etc."></textarea>
-                </div>
-
-                <div class="form-group">
-                    <label>⚠️ Signos de Alerta</label>
-                    <textarea name="signos_alerta" placeholder="Síntomas preocupantes, cambios que requieren atención"></textarea>
-                </div>
-
-                <button type="submit" class="btn-submit">📄 Generar Parte Diario</button>
-            </form>
-        </div>
-    </div>
-</body>
-</html>
-'''
-
-
-def generar_pdf(datos):
-    """Genera un PDF profesional del parte diario"""
-    buffer = BytesIO()
-
-    # Configurar el documento
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        rightMargin=72,
-        leftMargin=72,
-        topMargin=72,
-        bottomMargin=72
-    )
+# Los estáticos llevan la huella de su contenido en la URL (?v=...), así que
+# el navegador y el proxy pueden guardarlos durante un año
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 365 * 24 * 3600
 
-    # Estilos
-    styles = getSampleStyleSheet()
-
-    # Crear estilos personalizados
-    titulo_style = ParagraphStyle(
-        'Titulo',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#2c3e50'),
-        alignment=TA_CENTER,
-        spaceAfter=30
-    )
+# Cantidad máxima de partes aceptados en una petición de lote
+LOTE_MAXIMO = int(os.environ.get('PARTE_LOTE_MAXIMO', 500))
 
-    subtitulo_style = ParagraphStyle(
-        'Subtitulo',
-        parent=styles['Heading2'],
-        fontSize=12,
-        textColor=colors.HexColor('#7f8c8d'),
-        alignment=TA_CENTER,
-        spaceAfter=40
-    )
+# Partes por lote en /descargar-pdf/lote, que genera el documento mientras el
+# cliente espera; los lotes mayores (hasta LOTE_MAXIMO) van por /api/trabajos
+LOTE_MAXIMO_SINCRONO = int(os.environ.get('PARTE_LOTE_MAXIMO_SINCRONO', 50))
 
-    seccion_style = ParagraphStyle(
-        'Seccion',
-        parent=styles['Heading2'],
-        fontSize=14,
-        textColor=colors.HexColor('#3498db'),
-        spaceAfter=12,
-        spaceBefore=20
-    )
+# Tipos MIME de los formatos de /descargar-pdf/lote (ver lote_pdf.FORMATOS)
+TIPOS_LOTE = {'pdf': 'application/pdf', 'zip': 'application/zip'}
 
-    contenido_style = ParagraphStyle(
-        'Contenido',
-        parent=styles['Normal'],
-        fontSize=11,
-        textColor=colors.HexColor('#2c3e50'),
-        leading=14,
-        spaceAfter=10
-    )
+# Envío del PDF al cliente en trozos, sin copias (PARTE_PDF_STREAMING=0 lo desactiva)
+PDF_STREAMING = os.environ.get('PARTE_PDF_STREAMING', '1') != '0'
 
-    firma_style = ParagraphStyle(
-        'Firma',
-        parent=styles['Normal'],
-        fontSize=12,
-        textColor=colors.black,
-        alignment=TA_LEFT,
-        spaceBefore=20
-    )
+# Motor de PDF por defecto de /descargar-pdf (platypus o canvas); cada
+# petición puede elegir otro con ?motor=
+MOTOR_PDF = os.environ.get('PARTE_MOTOR_PDF', 'platypus')
+
+# Tiempo que se conservan los registros de /pdf/<clave>.pdf (PARTE_PDFS_TTL, segundos)
+PDFS_TTL = float(os.environ.get('PARTE_PDFS_TTL', 30 * 24 * 3600))
+
+# Cache-Control de los PDF direccionados por contenido (/pdf/<clave>.pdf): la
+# URL cambia si cambia el parte, así que no hace falta revalidarlos. Son
+# documentos de salud: por defecto solo los guarda el navegador (private), y
+# para guardarlos en cachés compartidas hay que indicarlo en
+# PARTE_PDF_CACHE_CONTROL (p. ej. 'public, max-age=2592000, immutable')
+CACHE_CONTROL_PDF = os.environ.get('PARTE_PDF_CACHE_CONTROL', f'private, max-age={int(PDFS_TTL)}, immutable')
+
+# Backend de renderizado (en proceso por defecto, pool con PARTE_RENDER_PROCESOS)
+renderizador = RenderizadorPDF.desde_entorno()
+
+# Caché de PDF ya generados (memoria y, con PARTE_CACHE_DIR, disco compartido)
+cache_pdf = CachePDF.desde_entorno()
+
+# Base de datos de partes (PARTE_DB, por defecto instance/partes.db)
+almacen = Almacen.desde_entorno(app.instance_path)
+escritor = EscritorEnLotes(almacen, ttl_pdfs=PDFS_TTL)
+registro_pdf = RegistroPDF(almacen, ttl=PDFS_TTL)
+
+# Trabajos de renderizado asíncronos (PARTE_TRABAJOS_HILOS, PARTE_TRABAJOS_TTL)
+cola_trabajos = ColaTrabajos.desde_entorno(almacen, renderizador, app.instance_path)
+
+# Archivo en Google Drive de los PDF generados (PARTE_DRIVE_CREDENCIALES; sin
+# credenciales queda desactivado)
+archivo_drive = ArchivoDrive.desde_entorno()
+
+# Perfilado de peticiones concretas y exportación para administradores (PARTE_ADMIN_TOKEN)
+perfilador = Perfilador.desde_entorno(app.instance_path)
+
+
+@app.before_request
+def arrancar_trabajos():
+    # Con gunicorn y ASGI los hilos ya se arrancaron al crear el worker (nunca
+    # en el maestro); esto cubre el servidor de desarrollo de Flask
+    cola_trabajos.arrancar()
+
+
+@app.before_request
+def iniciar_cronometro():
+    g.inicio_peticion = time.perf_counter()
+
+
+@app.before_request
+def iniciar_perfil():
+    tipo = perfilador.tipo_pedido(request)
+    if tipo is None:
+        return None
+    if not perfilador.es_admin(request):
+        return jsonify({'error': 'El perfilado está reservado a administradores'}), 403
+    if tipo not in TIPOS_PERFIL:
+        return jsonify({'error': f"Tipo de perfil no soportado ({', '.join(TIPOS_PERFIL)})"}), 400
+    g.perfil = perfilador.iniciar(tipo)
+    return None
+
+
+@app.after_request
+def guardar_perfil(response):
+    sesion = g.pop('perfil', None)
+    if sesion is not None:
+        response.headers['X-Perfil-Archivo'] = perfilador.terminar(sesion, request.path)
+    return response
 
-    # Convertir fecha
-    fecha_str = datos.get('fecha', datetime.now().strftime('%Y-%m-%d'))
-    try:
-        fecha = datetime.strptime(fecha_str, '%Y-%m-%d')
-        fecha_formateada = fecha.strftime('%d/%m/%Y')
-    except:
-        fecha_formateada = datetime.now().strftime('%d/%m/%Y')
-
-    # Crear contenido
-    elementos = []
-
-    # Título
-    elementos.append(Paragraph("PARTE DIARIO DE ATENCIÓN", titulo_style))
-    elementos.append(Paragraph("Registro completo de cuidados y observaciones", subtitulo_style))
-
-    # Información básica
-    info_data = [
-        ['Paciente:', datos.get('paciente', 'No especificado')],
-        ['Cuidadora:', datos.get('cuidadora', 'No especificada')],
-        ['Fecha:', fecha_formateada],
-        ['Estado General:', datos.get('estado_general', 'No evaluado')]
-    ]
-
-    info_table = Table(info_data, colWidths=[100, 400])
-    info_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f8f9fa')),
-        ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#7f8c8d')),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('TOPPADDING', (0, 0), (-1, -1), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e0e0e0')),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
-
-    elementos.append(info_table)
-    elementos.append(Spacer(1, 30))
-
-    # Función para agregar secciones
-    def agregar_seccion(titulo, contenido):
-        if contenido and contenido.strip():
-            elementos.append(Paragraph(titulo, seccion_style))
-            elementos.append(Paragraph(contenido, contenido_style))
-            elementos.append(Spacer(1, 15))
-
-    # Secciones dinámicas
-    agregar_seccion("ESTADO GENERAL", datos.get('estado_detalle', ''))
-    agregar_seccion("MEDICACIÓN ADMINISTRADA", datos.get('medicacion', ''))
-    agregar_seccion("ALIMENTACIÓN", datos.get('alimentacion', ''))
-    agregar_seccion("HIDRATACIÓN", datos.get('hidratacion', ''))
-    agregar_seccion("ELIMINACIÓN", datos.get('eliminacion', ''))
-    agregar_seccion("DESCANSO Y SUEÑO", datos.get('descanso', ''))
-    agregar_seccion("MOVILIDAD Y EJERCICIO", datos.get('movilidad', ''))
-    agregar_seccion("HIGIENE Y CUIDADOS", datos.get('higiene', ''))
-
-    # Signos de alerta (si existen)
-    if datos.get('signos_alerta'):
-        alerta_style = ParagraphStyle(
-            'Alerta',
-            parent=styles['Normal'],
-            fontSize=11,
-            textColor=colors.HexColor('#721c24'),
-            backColor=colors.HexColor('#f8d7da'),
-            borderPadding=10,
-            leading=14
-        )
-        elementos.append(Paragraph("SIGNOS DE ALERTA:", seccion_style))
-        elementos.append(Paragraph(datos.get('signos_alerta'), alerta_style))
-        elementos.append(Spacer(1, 15))
-
-    agregar_seccion("OBSERVACIONES ADICIONALES", datos.get('observaciones', ''))
-
-    # Firma
-    elementos.append(Spacer(1, 40))
-    elementos.append(Paragraph("___________________________________", firma_style))
-    elementos.append(Paragraph(datos.get('cuidadora', 'Cuidadora Responsable'), firma_style))
-    elementos.append(Paragraph("Cuidadora Responsable", firma_style))
-
-    # Fecha de generación
-    elementos.append(Spacer(1, 30))
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=9,
-        textColor=colors.gray,
-        alignment=TA_CENTER
-    )
-    elementos.append(Paragraph(
-        f"Documento generado el {datetime.now().strftime('%d/%m/%Y a las %H:%M')}",
-        footer_style
-    ))
 
-    # Construir PDF
-    doc.build(elementos)
+@app.after_request
+def registrar_duracion(response):
+    inicio = g.get('inicio_peticion')
+    if inicio is not None:
+        ruta = request.url_rule.rule if request.url_rule else 'desconocida'
+        PETICIONES.observar(time.perf_counter() - inicio, ruta=ruta, metodo=request.method)
+    return response
+
+
+def _medir_envio(trozos):
+    """Envuelve el cuerpo de la respuesta para medir el tiempo de envío"""
+    with cronometro('respuesta_envio'):
+        yield from trozos
+
 
-    # Obtener el valor del buffer
-    pdf = buffer.getvalue()
-    buffer.close()
+@lru_cache(maxsize=None)
+def _huella_estatico(filename):
+    with open(os.path.join(app.static_folder, filename), 'rb') as archivo:
+        return hashlib.sha256(archivo.read()).hexdigest()[:12]
 
-    return pdf
+
+@app.template_global()
+def url_estatico(filename):
+    """URL de un archivo estático con la huella de su contenido"""
+    return url_for('static', filename=filename, v=_huella_estatico(filename))
 
 
 @app.route('/')
 def index():
     fecha_hoy = datetime.now().strftime('%Y-%m-%d')
-    return render_template_string(HTML_TEMPLATE, fecha_hoy=fecha_hoy)
+    return render_template('index.html', fecha_hoy=fecha_hoy)
 
 
 @app.route('/generar', methods=['POST'])
 def generar():
-    datos = request.form
+    parte = Parte(request.form)
 
-    # Obtener fecha o usar la actual
-    fecha_str = datos.get('fecha', datetime.now().strftime('%Y-%m-%d'))
-    try:
-        fecha = datetime.strptime(fecha_str, '%Y-%m-%d')
-        fecha_formateada = fecha.strftime('%d/%m/%Y')
-    except:
-        fecha_formateada = datetime.now().strftime('%d/%m/%Y')
+    # Guardar el parte sin esperar a la escritura en disco
+    escritor.encolar(parte.como_dict())
+
+    return _html_parte(parte)
+
+
+def _html_parte(parte, enlazar=True):
+    """Vista HTML de un parte"""
+    # El botón de descarga enlaza a la URL por contenido del PDF, que el
+    # navegador puede guardar. Sin `enlazar` (vista previa) no se registra
+    # nada y el botón envía el formulario a /descargar-pdf
+    url_pdf = ruta_pdf(registrar_pdf(parte, MOTOR_PDF)) if enlazar else None
 
     # Crear parte diario con formato mejorado
-    parte_html = f'''
-    <!DOCTYPE html>
-    <html lang="es">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Parte Diario - {datos.get('paciente', 'Paciente')}</title>
-        <style>
-            body {{
-                font-family: 'Arial', sans-serif;
-                line-height: 1.6;
-                color: #333;
-                max-width: 1000px;
-                margin: 0 auto;
-                padding: 20px;
-                background: #f5f5f5;
-            }}
-
-            .parte-wrapper {{
-                background: white;
-                padding: 40px;
-                border-radius: 15px;
-                box-shadow: 0 10px 30px rgba(0,0,0,0.1);
-            }}
-
-            .header {{
-                text-align: center;
-                margin-bottom: 40px;
-                padding-bottom: 20px;
-                border-bottom: 3px solid #3498db;
-            }}
-
-            .header h1 {{
-                color: #2c3e50;
-                font-size: 28px;
-                margin-bottom: 10px;
-            }}
-
-            .header .subtitle {{
-                color: #7f8c8d;
-                font-size: 18px;
-            }}
-
-            .info-grid {{
-                display: grid;
-                grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
-                gap: 20px;
-                margin-bottom: 30px;
-                padding: 20px;
-                background: #f8f9fa;
-                border-radius: 10px;
-            }}
-
-            .info-item {{
-                padding: 10px;
-            }}
-
-            .info-label {{
-                font-weight: bold;
-                color: #3498db;
-                font-size: 14px;
-                text-transform: uppercase;
-            }}
-
-            .info-value {{
-                color: #2c3e50;
-                font-size: 16px;
-                margin-top: 5px;
-            }}
-
-            .section {{
-                margin-bottom: 25px;
-                padding: 20px;
-                border-left: 4px solid #3498db;
-                background: #f8f9fa;
-                border-radius: 0 8px 8px 0;
-            }}
-
-            .section-title {{
-                color: #2c3e50;
-                font-size: 18px;
-                font-weight: bold;
-                margin-bottom: 15px;
-                display: flex;
-                align-items: center;
-                gap: 10px;
-            }}
-
-            .section-content {{
-                color: #444;
-                white-space: pre-line;
-                line-height: 1.8;
-            }}
-
-            .signature {{
-                margin-top: 40px;
-                padding-top: 20px;
-                border-top: 2px solid #ddd;
-                text-align: right;
-            }}
-
-            .signature-name {{
-                font-weight: bold;
-                font-size: 16px;
-                color: #2c3e50;
-            }}
-
-            .signature-role {{
-                color: #7f8c8d;
-                font-size: 14px;
-            }}
-
-            .timestamp {{
-                text-align: center;
-                color: #95a5a6;
-                font-size: 14px;
-                margin-top: 30px;
-                padding-top: 20px;
-                border-top: 1px solid #eee;
-            }}
-
-            .status-badge {{
-                display: inline-block;
-                padding: 5px 15px;
-                border-radius: 20px;
-                font-size: 14px;
-                font-weight: bold;
-                margin-bottom: 10px;
-            }}
-
-            .status-good {{ background: #d4edda; color: #155724; }}
-            .status-regular {{ background: #fff3cd; color: #856404; }}
-            .status-bad {{ background: #f8d7da; color: #721c24; }}
-
-            .alert-box {{
-                background: #fff3cd;
-                border-left: 4px solid #ffc107;
-                padding: 15px;
-                margin: 15px 0;
-                border-radius: 0 5px 5px 0;
-            }}
-
-            .action-buttons {{
-                display: flex;
-                gap: 15px;
-                justify-content: center;
-                margin-top: 40px;
-                flex-wrap: wrap;
-            }}
-
-            .btn {{
-                padding: 12px 30px;
-                border-radius: 8px;
-                text-decoration: none;
-                font-weight: 500;
-                display: inline-flex;
-                align-items: center;
-                gap: 10px;
-                font-size: 16px;
-                border: none;
-                cursor: pointer;
-                transition: all 0.3s ease;
-            }}
-
-            .btn:hover {{
-                transform: translateY(-2px);
-                box-shadow: 0 5px 15px rgba(0,0,0,0.1);
-            }}
-
-            .btn-pdf {{
-                background: linear-gradient(45deg, #e74c3c, #c0392b);
-                color: white;
-            }}
-
-            .btn-print {{
-                background: linear-gradient(45deg, #3498db, #2980b9);
-                color: white;
-            }}
-
-            .btn-back {{
-                background: linear-gradient(45deg, #95a5a6, #7f8c8d);
-                color: white;
-            }}
-
-            @media print {{
-                body {{
-                    background: white;
-                    padding: 0;
-                }}
-
-                .parte-wrapper {{
-                    box-shadow: none;
-                    padding: 20px;
-                }}
-
-                .action-buttons {{
-                    display: none;
-                }}
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="parte-wrapper">
-            <div class="header">
-                <h1>📋 PARTE DIARIO DE ATENCIÓN</h1>
-                <div class="subtitle">Registro completo de cuidados y observaciones</div>
-            </div>
-
-            <div class="info-grid">
-                <div class="info-item">
-                    <div class="info-label">Paciente</div>
-                    <div class="info-value">👤 {datos.get('paciente', 'No especificado')}</div>
-                </div>
-
-                <div class="info-item">
-                    <div class="info-label">Cuidadora Responsable</div>
-                    <div class="info-value">👩‍⚕️ {datos.get('cuidadora', 'No especificada')}</div>
-                </div>
-
-                <div class="info-item">
-                    <div class="info-label">Fecha</div>
-                    <div class="info-value">📅 {fecha_formateada}</div>
-                </div>
-
-                <div class="info-item">
-                    <div class="info-label">Estado General</div>
-                    <div class="status-badge status-{datos.get('estado_general', '').lower()}">
-                        {datos.get('estado_general', 'No evaluado')}
-                    </div>
-                </div>
-            </div>
-
-            <div class="section">
-                <div class="section-title">😊 ESTADO GENERAL - DETALLES</div>
-                <div class="section-content">{datos.get('estado_detalle', 'Sin observaciones')}</div>
-            </div>
-
-            <div class="section">
-                <div class="section-title">💊 MEDICACIÓN</div>
-                <div class="section-content">{datos.get('medicacion', 'No se administró medicación')}</div>
-            </div>
-
-            <div class="section">
-                <div class="section-title">🍽️ ALIMENTACIÓN</div>
-                <div class="section-content">{datos.get('alimentacion', 'No registrada')}</div>
-            </div>
-
-            <div class="section">
-                <div class="section-title">💧 HIDRATACIÓN</div>
-                <div class="section-content">{datos.get('hidratacion', 'No registrada')}</div>
-            </div>
-
-            <div class="section">
-                <div class="section-title">🚽 ELIMINACIÓN</div>
-                <div class="section-content">{datos.get('eliminacion', 'No registrada')}</div>
-            </div>
-
-            <div class="section">
-                <div class="section-title">🛌 DESCANSO Y SUEÑO</div>
-                <div class="section-content">{datos.get('descanso', 'No registrado')}</div>
-            </div>
-
-            <div class="section">
-                <div class="section-title">🚶‍♂️ MOVILIDAD Y EJERCICIO</div>
-                <div class="section-content">{datos.get('movilidad', 'No registrada')}</div>
-            </div>
-
-            <div class="section">
-                <div class="section-title">🧼 HIGIENE Y CUIDADOS</div>
-                <div class="section-content">{datos.get('higiene', 'No registrada')}</div>
-            </div>
-
-            {f'<div class="alert-box"><strong>⚠️ SIGNOS DE ALERTA:</strong><br>{datos.get("signos_alerta", "")}</div>' if datos.get("signos_alerta") else ''}
-
-            <div class="section">
-                <div class="section-title">📝 OBSERVACIONES ADICIONALES</div>
-                <div class="section-content">{datos.get('observaciones', 'Ninguna observación adicional')}</div>
-            </div>
-
-            <div class="signature">
-                <div class="signature-name">{datos.get('cuidadora', 'Cuidador/a')}</div>
-                <div class="signature-role">Cuidadora Responsable</div>
-            </div>
-
-            <div class="timestamp">
-                Documento generado el {datetime.now().strftime('%d/%m/%Y a las %H:%M')}
-            </div>
-
-            <div class="action-buttons">
-                <form action="/descargar-pdf" method="post" style="display: inline;">
-                    <input type="hidden" name="paciente" value="{datos.get('paciente', '')}">
-                    <input type="hidden" name="cuidadora" value="{datos.get('cuidadora', '')}">
-                    <input type="hidden" name="fecha" value="{datos.get('fecha', '')}">
-                    <input type="hidden" name="estado_general" value="{datos.get('estado_general', '')}">
-                    <input type="hidden" name="estado_detalle" value="{datos.get('estado_detalle', '')}">
-                    <input type="hidden" name="medicacion" value="{datos.get('medicacion', '')}">
-                    <input type="hidden" name="alimentacion" value="{datos.get('alimentacion', '')}">
-                    <input type="hidden" name="hidratacion" value="{datos.get('hidratacion', '')}">
-                    <input type="hidden" name="eliminacion" value="{datos.get('eliminacion', '')}">
-                    <input type="hidden" name="descanso" value="{datos.get('descanso', '')}">
-                    <input type="hidden" name="movilidad" value="{datos.get('movilidad', '')}">
-                    <input type="hidden" name="higiene" value="{datos.get('higiene', '')}">
-                    <input type="hidden" name="observaciones" value="{datos.get('observaciones', '')}">
-                    <input type="hidden" name="signos_alerta" value="{datos.get('signos_alerta', '')}">
-                    <button type="submit" class="btn btn-pdf">📥 Descargar PDF</button>
-                </form>
-
-                <button onclick="window.print()" class="btn btn-print">🖨️ Imprimir</button>
-
-                <a href="/" class="btn btn-back">📝 Nuevo Parte</a>
-            </div>
-        </div>
-    </body>
-    </html>
-    '''
-
-    return parte_html
+    with cronometro('html_render'):
+        return render_template(
+            'parte.html',
+            parte=parte,
+            url_pdf=url_pdf,
+            campos=CAMPOS_PARTE,
+            generado=parte.generado.strftime('%d/%m/%Y a las %H:%M'),
+        )
+
+
+def ruta_pdf(clave):
+    return f'/pdf/{clave}.pdf'
+
+
+def registrar_pdf(parte, motor):
+    """Registra el parte para /pdf/<clave>.pdf y devuelve la clave.
+
+    Fija `parte.generado` a la fecha de la primera vez que se registró esa
+    clave, para que cualquier renderizado posterior dé los mismos bytes.
+    """
+    clave = clave_parte(parte, motor)
+    parte.generado = registro_pdf.generado(clave, motor, parte.como_dict(), parte.generado)
+    return clave
 
 
 @app.route('/descargar-pdf', methods=['POST'])
 def descargar_pdf():
     """Endpoint para descargar el parte diario como PDF"""
-    datos = request.form
+    with cronometro('form_parseo'):
+        parte = Parte(request.form)
+
+    motor = request.args.get('motor', MOTOR_PDF)
+    if motor not in MOTORES:
+        return jsonify({'error': f"Motor de PDF desconocido; use {' o '.join(MOTORES)}"}), 400
+
+    return _respuesta_pdf(parte, motor)
+
+
+def _respuesta_pdf(parte, motor):
+    """Genera (o toma de la caché) el PDF de un parte y arma la respuesta"""
+    clave = registrar_pdf(parte, motor)
+
+    # Generar PDF (o reutilizar uno idéntico ya generado)
+    with cronometro('pdf_obtener'):
+        if 'perfil' in g:
+            # Al perfilar se renderiza en este hilo y sin caché, para que el
+            # perfil incluya todo el trabajo del motor; tampoco cuenta en las
+            # métricas de la caché, que no se ha consultado
+            pdf_content, nivel_cache = motor_pdf(motor)(parte), None
+        else:
+            pdf_content, nivel_cache = cache_pdf.obtener_o_generar(parte, renderizador.renderizar, motor)
+            CACHE_PDF.incrementar(resultado='hit' if nivel_cache else 'miss')
 
-    # Generar PDF
-    pdf_content = generar_pdf(datos)
+    # Los PDF recién generados se archivan en Drive en segundo plano
+    if archivo_drive is not None and not nivel_cache:
+        archivo_drive.encolar(parte, pdf_content, motor)
 
     # Crear respuesta con el PDF
-    response = make_response(pdf_content)
-    paciente_nombre = datos.get('paciente', 'parte_diario').replace(' ', '_')
-    fecha_str = datos.get('fecha', datetime.now().strftime('%Y-%m-%d'))
+    if PDF_STREAMING:
+        response = Response(
+            _medir_envio(en_trozos(pdf_content)),
+            mimetype='application/pdf',
+            direct_passthrough=True,
+        )
+        response.content_length = len(pdf_content)
+    else:
+        response = make_response(pdf_content)
+    response.headers['Content-Type'] = 'application/pdf'
+    response.headers['Content-Disposition'] = f'attachment; filename="{parte.nombre_archivo}"'
+    response.headers['X-Cache'] = 'HIT' if nivel_cache else 'MISS'
+    if nivel_cache:
+        response.headers['X-Cache-Nivel'] = nivel_cache
+    # El mismo PDF puede pedirse después por GET, con caché HTTP
+    response.headers['Content-Location'] = ruta_pdf(clave)
+    response.set_etag(clave_pdf(clave, parte.generado))
+
+    return response
+
+
+@app.route('/pdf/<clave>.pdf')
+def pdf_por_clave(clave):
+    """PDF de un parte por su clave de contenido, con ETag fuerte, 304 y rangos de bytes"""
+    generado = registro_pdf.consultar(clave)
+    if generado is None:
+        return jsonify({'error': 'PDF no encontrado'}), 404
+    if not request.if_none_match.star_tag and request.if_none_match.contains_weak(clave_pdf(clave, generado)):
+        # El ETag identifica los bytes: no hace falta ni consultar la caché
+        response = Response(status=304)
+        response.set_etag(clave_pdf(clave, generado))
+        response.headers['Cache-Control'] = CACHE_CONTROL_PDF
+        return response
+
+    registro = almacen.pdf_registrado(clave)
+    if registro is None:
+        return jsonify({'error': 'PDF no encontrado'}), 404
+    motor, datos, generado = registro
+    parte = Parte(datos)
+    parte.generado = generado
+    actual = clave_parte(parte, motor)
+    if actual != clave:
+        # Clave de una versión anterior del diseño: se redirige al PDF actual,
+        # que se registra ya porque el cliente lo pedirá enseguida
+        registro_pdf.generado(actual, motor, datos, generado)
+        return redirect(ruta_pdf(actual), 301)
+
+    with cronometro('pdf_obtener'):
+        pdf_content, nivel_cache = cache_pdf.obtener_o_generar(parte, renderizador.renderizar, motor)
+    CACHE_PDF.incrementar(resultado='hit' if nivel_cache else 'miss')
+    if archivo_drive is not None and not nivel_cache:
+        archivo_drive.encolar(parte, pdf_content, motor)
+
+    response = Response(pdf_content, mimetype='application/pdf')
+    response.headers['Content-Disposition'] = f'attachment; filename="{parte.nombre_archivo}"'
+    response.headers['X-Cache'] = 'HIT' if nivel_cache else 'MISS'
+    if nivel_cache:
+        response.headers['X-Cache-Nivel'] = nivel_cache
+    response.set_etag(clave_pdf(clave, generado))
+    response.headers['Cache-Control'] = CACHE_CONTROL_PDF
+    # Range e If-Range: 206 con el trozo pedido, o 416 si está fuera del PDF
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(pdf_content))
+
+
+def _validar_lote(partes, maximo=LOTE_MAXIMO, mensaje_maximo=''):
+    """Comprueba un array JSON de partes; devuelve (partes, None) o (None, respuesta de error).
+
+    Lanza ErrorValidacion con los errores de cada parte no válido.
+    """
+    if not isinstance(partes, list) or not partes:
+        return None, (jsonify({'error': 'Se esperaba un array JSON de partes'}), 400)
+    if len(partes) > maximo:
+        return None, (jsonify({'error': f'El lote admite como máximo {maximo} partes{mensaje_maximo}'}), 413)
+    return _partes_validos(partes), None
+
+
+def _partes_validos(objetos):
+    """Valida una lista de partes JSON; lanza ErrorValidacion con los errores por posición"""
+    partes, errores = [], {}
+    for indice, objeto in enumerate(objetos):
+        try:
+            partes.append(Parte.desde_json(objeto).como_dict())
+        except ErrorValidacion as error:
+            errores[str(indice)] = error.errores
+    if errores:
+        raise ErrorValidacion(errores)
+    return partes
+
+
+@app.route('/descargar-pdf/lote', methods=['POST'])
+def descargar_pdf_lote():
+    """Descarga varios partes (array JSON) en un único PDF o en un ZIP"""
+    partes, error = _validar_lote(
+        request.get_json(silent=True), LOTE_MAXIMO_SINCRONO, '; para lotes mayores use POST /api/trabajos',
+    )
+    if error:
+        return error
+
+    formato = request.args.get('formato', 'pdf')
+    if formato not in TIPOS_LOTE:
+        return jsonify({'error': 'Formato no soportado (pdf o zip)'}), 400
+
+    # El lote se genera entero antes de responder, con el pool y el plazo del
+    # renderizador: la cola llena o el tiempo agotado aún son un 503 o un 504
+    contenido = renderizador.renderizar_lote(partes, formato)
+    response = Response(contenido, mimetype=TIPOS_LOTE[formato])
+    filename = f"partes_diarios_{datetime.now().strftime('%Y%m%d')}.{formato}"
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+    return response
+
+
+@app.route('/api/partes/<int:parte_id>')
+def obtener_parte(parte_id):
+    """Devuelve un parte guardado"""
+    parte = almacen.obtener(parte_id)
+    if parte is None:
+        return jsonify({'error': 'Parte no encontrado'}), 404
+    return jsonify(parte)
+
 
+@app.route('/api/partes')
+def listar_partes():
+    """Lista los partes de un paciente en un rango de fechas (paginación por cursor)"""
+    paciente = request.args.get('paciente')
+    if not paciente:
+        return jsonify({'error': 'El parámetro paciente es obligatorio'}), 400
+    limite = min(request.args.get('limite', 50, type=int), 500)
     try:
-        fecha = datetime.strptime(fecha_str, '%Y-%m-%d')
-        fecha_nombre = fecha.strftime('%Y%m%d')
-    except:
-        fecha_nombre = datetime.now().strftime('%Y%m%d')
+        partes, siguiente = almacen.listar_por_paciente(
+            paciente,
+            desde=request.args.get('desde'),
+            hasta=request.args.get('hasta'),
+            despues=request.args.get('despues'),
+            limite=max(limite, 1),
+        )
+    except ValueError:
+        return jsonify({'error': 'Cursor no válido'}), 400
+    return jsonify({'partes': partes, 'siguiente': siguiente})
+
+
+@app.route('/api/partes/buscar')
+def buscar_partes():
+    """Búsqueda de texto en los partes guardados, con filtros por campo, paciente y fechas"""
+    texto = request.args.get('q', '')
+    campos = [campo for campo in request.args.get('campos', '').split(',') if campo]
+    desconocidos = [campo for campo in campos if campo not in CAMPOS_BUSQUEDA]
+    if desconocidos:
+        return jsonify({'error': f"Campos no indexados: {', '.join(desconocidos)}"}), 400
+    desde = request.args.get('desde')
+    hasta = request.args.get('hasta')
+    if (desde and not parsear_fecha(desde)) or (hasta and not parsear_fecha(hasta)):
+        return jsonify({'error': 'Las fechas deben tener el formato AAAA-MM-DD'}), 400
+    limite = min(request.args.get('limite', 50, type=int), 500)
+    try:
+        resultados, siguiente = almacen.buscar(
+            texto,
+            campos=campos,
+            paciente=request.args.get('paciente'),
+            desde=desde,
+            hasta=hasta,
+            limite=max(limite, 1),
+            desplazamiento=max(request.args.get('desplazamiento', 0, type=int), 0),
+        )
+    except ValueError:
+        return jsonify({'error': 'El parámetro q debe tener al menos una palabra'}), 400
+    return jsonify({'resultados': resultados, 'siguiente': siguiente})
+
+
+def _rango_analitica():
+    """Periodo y rango de fechas de una consulta de analítica; devuelve (valores, None) o (None, error)"""
+    periodo = request.args.get('periodo', 'semana')
+    if periodo not in PERIODOS_RESUMEN:
+        return None, (jsonify({'error': f"Periodo no soportado ({', '.join(PERIODOS_RESUMEN)})"}), 400)
+    fechas = {}
+    for nombre in ('desde', 'hasta'):
+        valor = request.args.get(nombre)
+        fechas[nombre] = parsear_fecha(valor)
+        if valor and fechas[nombre] is None:
+            return None, (jsonify({'error': 'Las fechas deben tener el formato AAAA-MM-DD'}), 400)
+    # Por defecto, las últimas doce semanas
+    hasta = fechas['hasta'] or datetime.now().date()
+    desde = fechas['desde'] or hasta - timedelta(weeks=12)
+    if periodo == 'semana':
+        # Las semanas se identifican por su lunes
+        desde -= timedelta(days=desde.weekday())
+    return (periodo, desde.isoformat(), hasta.isoformat()), None
+
+
+@app.route('/api/partes/exportar')
+def exportar_partes():
+    """Exporta los partes filtrados por paciente, cuidadora y fechas en CSV, JSONL o Parquet.
+
+    Son datos de salud de todos los pacientes: solo para administradores
+    (X-Admin-Token, como /admin/perfiles). Sin token configurado, la
+    exportación masiva solo está disponible con `flask exportar`.
+    """
+    if not perfilador.es_admin(request):
+        abort(403)
+    formato = request.args.get('formato', 'csv')
+    if formato not in FORMATOS_EXPORTACION:
+        return jsonify({'error': f"Formato desconocido; use {', '.join(FORMATOS_EXPORTACION)}"}), 400
+    if not formato_disponible(formato):
+        return jsonify({'error': f'El formato {formato} no está disponible en este servidor'}), 501
+    desde = request.args.get('desde')
+    hasta = request.args.get('hasta')
+    if (desde and not parsear_fecha(desde)) or (hasta and not parsear_fecha(hasta)):
+        return jsonify({'error': 'Las fechas deben tener el formato AAAA-MM-DD'}), 400
+
+    filas = almacen.exportar(
+        paciente=request.args.get('paciente'),
+        cuidadora=request.args.get('cuidadora'),
+        desde=desde,
+        hasta=hasta,
+    )
+    _, tipo, extension = FORMATOS_EXPORTACION[formato]
+    nombre = '_'.join(['partes'] + [valor for valor in (desde, hasta) if valor])
+    return Response(
+        exportar(filas, formato),
+        mimetype=tipo,
+        headers={
+            'Content-Disposition': f'attachment; filename="{nombre}.{extension}"',
+            'Cache-Control': 'no-store',
+        },
+    )
 
-    filename = f"parte_diario_{paciente_nombre}_{fecha_nombre}.pdf"
 
-    response.headers['Content-Type'] = 'application/pdf'
+@app.route('/api/analitica/<any(paciente, cuidadora):dimension>')
+def analitica_serie(dimension):
+    """Partes, estados y alertas de un paciente o una cuidadora por día o semana"""
+    valor = request.args.get(dimension)
+    if not valor:
+        return jsonify({'error': f'El parámetro {dimension} es obligatorio'}), 400
+    rango, error = _rango_analitica()
+    if error:
+        return error
+    periodo, desde, hasta = rango
+    serie = almacen.serie_resumen(dimension, valor, periodo, desde, hasta)
+    total = {'partes': 0, 'estados': {}, 'con_alerta': 0}
+    for fila in serie:
+        total['partes'] += fila['partes']
+        total['con_alerta'] += fila['con_alerta']
+        for estado, cantidad in fila['estados'].items():
+            total['estados'][estado] = total['estados'].get(estado, 0) + cantidad
+    return jsonify({dimension: valor, 'periodo': periodo, 'desde': desde, 'hasta': hasta,
+                    'serie': serie, 'total': total})
+
+
+@app.route('/api/analitica/<any(pacientes, cuidadoras):grupo>')
+def analitica_totales(grupo):
+    """Totales por paciente o por cuidadora en un rango, de más a menos partes"""
+    rango, error = _rango_analitica()
+    if error:
+        return error
+    periodo, desde, hasta = rango
+    limite = min(max(request.args.get('limite', 100, type=int), 1), 1000)
+    totales = almacen.totales_resumen(grupo[:-1], periodo, desde, hasta, limite)
+    return jsonify({'periodo': periodo, 'desde': desde, 'hasta': hasta, grupo: totales})
+
+
+@app.route('/api/informes/paciente')
+def informe_paciente():
+    """Informe PDF de un paciente entre dos fechas, con resumen y el detalle de cada día"""
+    paciente = request.args.get('paciente')
+    desde = parsear_fecha(request.args.get('desde'))
+    hasta = parsear_fecha(request.args.get('hasta'))
+    if not paciente or not desde or not hasta:
+        return jsonify({'error': 'Se requieren paciente, desde y hasta (AAAA-MM-DD)'}), 400
+    if desde > hasta:
+        return jsonify({'error': 'La fecha desde es posterior a hasta'}), 400
+
+    from informe_pdf import generar_informe_pdf
+
+    pdf_content = generar_informe_pdf(almacen, paciente, desde.isoformat(), hasta.isoformat())
+
+    response = Response(en_trozos(pdf_content), mimetype='application/pdf', direct_passthrough=True)
+    response.content_length = len(pdf_content)
+    paciente_nombre = paciente.replace(' ', '_')
+    filename = f"informe_{paciente_nombre}_{desde.strftime('%Y%m%d')}_{hasta.strftime('%Y%m%d')}.pdf"
     response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
 
     return response
 
 
+@app.route('/api/trabajos', methods=['POST'])
+def crear_trabajo():
+    """Encola el renderizado de un lote de partes o de un informe de paciente"""
+    cuerpo = request.get_json(silent=True)
+    if not isinstance(cuerpo, dict):
+        return jsonify({'error': 'Se esperaba un objeto JSON con partes o informe'}), 400
+
+    fecha_nombre = datetime.now().strftime('%Y%m%d')
+    if 'partes' in cuerpo:
+        partes, error = _validar_lote(cuerpo['partes'])
+        if error:
+            return error
+        trabajo_id = cola_trabajos.crear('lote', {'partes': partes}, f"partes_diarios_{fecha_nombre}.pdf")
+    elif 'informe' in cuerpo and isinstance(cuerpo['informe'], dict):
+        informe = cuerpo['informe']
+        paciente = informe.get('paciente')
+        desde = parsear_fecha(informe.get('desde'))
+        hasta = parsear_fecha(informe.get('hasta'))
+        if not paciente or not desde or not hasta or desde > hasta:
+            return jsonify({'error': 'El informe requiere paciente, desde y hasta (AAAA-MM-DD)'}), 400
+        paciente_nombre = paciente.replace(' ', '_')
+        trabajo_id = cola_trabajos.crear(
+            'informe',
+            {'paciente': paciente, 'desde': desde.isoformat(), 'hasta': hasta.isoformat()},
+            f"informe_{paciente_nombre}_{desde.strftime('%Y%m%d')}_{hasta.strftime('%Y%m%d')}.pdf",
+        )
+    else:
+        return jsonify({'error': 'Se esperaba un objeto JSON con partes o informe'}), 400
+
+    url_estado = url_for('estado_trabajo', trabajo_id=trabajo_id)
+    response = jsonify({
+        'id': trabajo_id,
+        'estado': 'pendiente',
+        'url_estado': url_estado,
+        'url_descarga': url_for('descargar_trabajo', trabajo_id=trabajo_id),
+    })
+    response.status_code = 202
+    response.headers['Location'] = url_estado
+    return response
+
+
+@app.route('/api/trabajos/<trabajo_id>')
+def estado_trabajo(trabajo_id):
+    """Estado de un trabajo de renderizado"""
+    trabajo = cola_trabajos.obtener(trabajo_id)
+    if trabajo is None:
+        return jsonify({'error': 'Trabajo no encontrado o expirado'}), 404
+    return jsonify(trabajo)
+
+
+@app.route('/api/trabajos/<trabajo_id>/descarga')
+def descargar_trabajo(trabajo_id):
+    """Descarga el PDF de un trabajo terminado"""
+    trabajo = cola_trabajos.obtener(trabajo_id)
+    if trabajo is None:
+        return jsonify({'error': 'Trabajo no encontrado o expirado'}), 404
+    if trabajo['estado'] != TERMINADO:
+        return jsonify({'error': 'El trabajo todavía no terminó', 'estado': trabajo['estado']}), 409
+    return send_file(
+        cola_trabajos.ruta_artefacto(trabajo_id),
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=trabajo['nombre'],
+        max_age=0,
+    )
+
+
+# API JSON versionada: mismo parte que el formulario, en objetos JSON
+
+def _parte_json():
+    """Parte validado del cuerpo JSON de la petición (ErrorValidacion si no es válido)"""
+    return Parte.desde_json(request.get_json(silent=True))
+
+
+def _motor_pedido():
+    motor = request.args.get('motor', MOTOR_PDF)
+    if motor not in MOTORES:
+        raise ErrorValidacion({'motor': f"Motor de PDF desconocido; use {' o '.join(MOTORES)}"})
+    return motor
+
+
+@app.route('/api/v1/partes/validar', methods=['POST'])
+def api_validar():
+    """Valida un parte y lo devuelve normalizado, sin guardarlo"""
+    return jsonify({'valido': True, 'parte': _parte_json().como_dict()})
+
+
+@app.route('/api/v1/partes/vista-previa', methods=['POST'])
+def api_vista_previa():
+    """Vista HTML de un parte, sin guardarlo"""
+    return _html_parte(_parte_json(), enlazar=False)
+
+
+@app.route('/api/v1/partes/pdf', methods=['POST'])
+def api_pdf():
+    """PDF de un parte (admite ?motor= como /descargar-pdf)"""
+    motor = _motor_pedido()
+    return _respuesta_pdf(_parte_json(), motor)
+
+
+@app.route('/api/v1/partes', methods=['POST'])
+def api_crear():
+    """Guarda un parte y devuelve su id"""
+    parte = _parte_json().como_dict()
+    parte_id = almacen.guardar(parte)
+    response = jsonify({'id': parte_id, 'parte': parte})
+    response.status_code = 201
+    response.headers['Location'] = url_for('obtener_parte', parte_id=parte_id)
+    return response
+
+
+@app.route('/api/v1/partes/lote', methods=['POST'])
+def api_crear_lote():
+    """Guarda un array de partes en una sola transacción; si alguno no es válido no guarda ninguno"""
+    cuerpo = request.get_json(silent=True)
+    if not isinstance(cuerpo, list) or not cuerpo:
+        raise ErrorValidacion({'': 'Se esperaba un array JSON de partes'})
+    if len(cuerpo) > LOTE_MAXIMO:
+        return jsonify({'error': f'El lote admite como máximo {LOTE_MAXIMO} partes'}), 413
+
+    ids = almacen.guardar_varios(_partes_validos(cuerpo))
+    response = jsonify({'ids': ids})
+    response.status_code = 201
+    return response
+
+
+@app.errorhandler(ErrorValidacion)
+def parte_no_valido(error):
+    return jsonify({'valido': False, 'errores': error.errores}), 422
+
+
+@app.route('/metrics')
+def metrics():
+    """Métricas en formato de texto de Prometheus (sumadas entre workers)"""
+    return Response(registro_metricas.exponer(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/admin/perfiles')
+def listar_perfiles():
+    """Lista los perfiles guardados en el buffer circular"""
+    if not perfilador.es_admin(request):
+        abort(403)
+    return jsonify({'perfiles': perfilador.listar()})
+
+
+@app.route('/admin/perfiles/<nombre>')
+def descargar_perfil(nombre):
+    """Descarga un perfil (.prof para pstats, .txt con pilas colapsadas)"""
+    if not perfilador.es_admin(request):
+        abort(403)
+    if not perfilador.nombre_valido(nombre):
+        abort(404)
+    return send_from_directory(perfilador.directorio, nombre, as_attachment=True, max_age=0)
+
+
+@app.errorhandler(ColaLlena)
+@app.errorhandler(BrokenProcessPool)
+def cola_llena(error):
+    response = jsonify({'error': 'Servidor ocupado generando PDF, reintente en unos segundos'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '2'
+    return response
+
+
+@app.errorhandler(TiempoAgotado)
+def tiempo_agotado(error):
+    return jsonify({'error': 'La generación del PDF superó el tiempo máximo'}), 504
+
+
+@app.cli.command('importar')
+@click.argument('entrada', type=click.Path(exists=True, dir_okay=False))
+@click.option('--salida', required=True,
+              help='Directorio de los PDF, o archivo .zip (se escribe como una serie de ZIP)')
+@click.option('--formato', type=click.Choice(FORMATOS_IMPORTACION), help='Por defecto, según la extensión')
+@click.option('--motor', type=click.Choice(list(MOTORES)), default=MOTOR_PDF, show_default=True)
+@click.option('--procesos', type=int, default=os.cpu_count(), show_default=True,
+              help='Procesos de renderizado (0: en este proceso)')
+@click.option('--trozo', type=click.IntRange(1), default=100, show_default=True,
+              help='Registros por trozo enviado al pool')
+@click.option('--por-zip', type=click.IntRange(1), default=5000, show_default=True,
+              help='PDF por cada ZIP de la serie')
+@click.option('--desde-cero', is_flag=True, help='Descarta el punto de control y empieza de nuevo')
+def importar(entrada, salida, formato, motor, procesos, trozo, por_zip, desde_cero):
+    """Renderiza y archiva los partes de un archivo JSONL o CSV."""
+    try:
+        importacion = Importacion(entrada, salida, formato=formato, motor=motor, procesos=procesos,
+                                  trozo=trozo, por_zip=por_zip, informar=click.echo)
+        if desde_cero:
+            importacion.descartar_punto_control()
+        importacion.ejecutar()
+    except ValueError as error:
+        raise click.ClickException(str(error))
+
+
+@app.cli.command('exportar')
+@click.option('--formato', type=click.Choice(list(FORMATOS_EXPORTACION)), default='csv', show_default=True)
+@click.option('--salida', type=click.File('wb'), default='-', help='Archivo de salida (por defecto, la salida estándar)')
+@click.option('--paciente')
+@click.option('--cuidadora')
+@click.option('--desde', help='AAAA-MM-DD')
+@click.option('--hasta', help='AAAA-MM-DD')
+def exportar_cli(formato, salida, paciente, cuidadora, desde, hasta):
+    """Exporta los partes guardados en CSV, JSONL o Parquet."""
+    if not formato_disponible(formato):
+        raise click.ClickException(f'El formato {formato} necesita pyarrow')
+    if (desde and not parsear_fecha(desde)) or (hasta and not parsear_fecha(hasta)):
+        raise click.BadParameter('Las fechas deben tener el formato AAAA-MM-DD')
+    contador = [0]
+
+    def contar(filas):
+        for fila in filas:
+            contador[0] += 1
+            yield fila
+
+    inicio = time.perf_counter()
+    filas = almacen.exportar(paciente=paciente, cuidadora=cuidadora, desde=desde, hasta=hasta)
+    for trozo in exportar(contar(filas), formato):
+        salida.write(trozo)
+    duracion = time.perf_counter() - inicio
+    click.echo(f'{contador[0]} partes exportados en {duracion:.1f} s', err=True)
+
+
+def precargar():
+    """Carga los subsistemas perezosos: ReportLab, los motores de PDF y el cliente de Google.
+
+    La llama el maestro de gunicorn antes de crear los workers (gunicorn.conf.py
+    con PARTE_PRECARGAR=1), así que al terminar no puede quedar ninguna
+    conexión a SQLite abierta que heredarían los procesos hijos.
+    """
+    import informe_pdf
+    import lote_pdf
+    from estilos_pdf import obtener_estilos
+    from pdf_canvas import obtener_metricas
+
+    for motor in MOTORES:
+        motor_pdf(motor)
+    obtener_estilos()
+    obtener_metricas()
+    if archivo_drive is not None:
+        precargar_drive()
+    almacen.cerrar_conexion()
+
+
 if __name__ == '__main__':
+    cola_trabajos.arrancar()
     app.run(host='0.0.0.0', port=10000)
@@ -0,0 +1,302 @@
+"""Archivo de los PDF generados en Google Drive, una carpeta por paciente.
+
+Las subidas se hacen desde un hilo en segundo plano, así que /descargar-pdf
+no espera a Drive. El hilo agrupa los PDF pendientes y, por cada lote:
+
+- descarta los que ya están en Drive: cada PDF lleva su clave de caché en
+  `appProperties.clave_parte` y una consulta files.list por lote busca las
+  de todo el lote (el mismo parte vuelve a encolarse cada vez que falla la
+  caché, en otro worker, tras salir del LRU o desde /pdf/<clave>.pdf);
+- busca con una sola consulta files.list las carpetas de los pacientes que
+  aún no conoce y crea las que faltan en una única petición batch; si
+  algunas fallan, vuelve a buscar y crea solo las que siguen faltando, para
+  no duplicar las que Drive sí creó;
+- sube cada PDF con una subida reanudable (si un trozo falla, la subida
+  continúa desde el último byte confirmado);
+- reintenta los errores transitorios (429, 5xx, red) con espera exponencial.
+
+Se activa con PARTE_DRIVE_CREDENCIALES (fichero JSON de cuenta de servicio o
+de usuario autorizado). PARTE_DRIVE_CARPETA_RAIZ es el id de la carpeta
+raíz y PARTE_DRIVE_ENDPOINT permite apuntar a otro servidor (p. ej. el Drive
+falso de benchmarks/drive_falso.py).
+
+El cliente de Google se importa en el hilo de subidas, con el primer PDF
+encolado: los workers que no generan PDF no lo cargan nunca.
+"""
+import io
+import json
+import logging
+import os
+import queue
+import random
+import time
+
+from cache_pdf import clave_parte
+from lotes import HiloEnLotes
+from metricas import ARCHIVO_DRIVE, cronometro
+from parte import Parte
+
+logger = logging.getLogger(__name__)
+
+ALCANCES = ['https://www.googleapis.com/auth/drive.file']
+TIPO_CARPETA = 'application/vnd.google-apps.folder'
+
+# Estados HTTP que merece la pena reintentar
+ESTADOS_TRANSITORIOS = {408, 429, 500, 502, 503, 504}
+
+# Nombres o claves por consulta files.list (la longitud de `q` está limitada)
+NOMBRES_POR_CONSULTA = 40
+
+# Propiedad de aplicación con la clave de caché del PDF subido
+PROPIEDAD_CLAVE = 'clave_parte'
+
+
+def _literal(texto):
+    """Cadena entre comillas para el lenguaje de consulta de Drive"""
+    return "'" + texto.replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+
+def precargar():
+    """Importa el cliente de la API de Google"""
+    import google.auth
+    import googleapiclient.discovery
+    import googleapiclient.http
+
+
+def _es_transitorio(error):
+    import httplib2
+    from google.auth.exceptions import TransportError
+    from googleapiclient.errors import HttpError
+
+    if isinstance(error, HttpError):
+        return error.resp.status in ESTADOS_TRANSITORIOS
+    return isinstance(error, (TransportError, httplib2.HttpLib2Error, OSError))
+
+
+class ArchivoDrive(HiloEnLotes):
+    """Cola de PDF pendientes de archivar y el hilo que los sube a Drive"""
+
+    NOMBRE_HILO = 'archivo-drive'
+
+    def __init__(self, credenciales, carpeta_raiz='root', endpoint=None, max_lote=20, espera=0.5,
+                 intentos=5, espera_reintento=1.0, tamano_trozo=256 * 1024, max_cola=1000):
+        super().__init__(max_lote, espera, max_cola)
+        self.credenciales = credenciales
+        self.carpeta_raiz = carpeta_raiz
+        self.endpoint = endpoint
+        self.intentos = intentos
+        self.espera_reintento = espera_reintento
+        self.tamano_trozo = tamano_trozo
+        self._carpetas = {}
+        self._servicio = None
+
+    @classmethod
+    def desde_entorno(cls):
+        """Devuelve el archivo configurado, o None si no hay credenciales"""
+        credenciales = os.environ.get('PARTE_DRIVE_CREDENCIALES')
+        if not credenciales:
+            return None
+        return cls(
+            credenciales,
+            carpeta_raiz=os.environ.get('PARTE_DRIVE_CARPETA_RAIZ', 'root'),
+            endpoint=os.environ.get('PARTE_DRIVE_ENDPOINT') or None,
+            intentos=int(os.environ.get('PARTE_DRIVE_INTENTOS', 5)),
+        )
+
+    def encolar(self, datos, pdf, motor='platypus'):
+        """Programa el archivo de un PDF; devuelve False si la cola está llena"""
+        parte = Parte.de(datos)
+        self._arrancar()
+        try:
+            self._cola.put_nowait((parte, pdf, motor))
+        except queue.Full:
+            ARCHIVO_DRIVE.incrementar(resultado='descartado')
+            logger.warning('Cola de Drive llena: no se archiva %s', parte.nombre_archivo)
+            return False
+        return True
+
+    def _fallo(self, lote):
+        ARCHIVO_DRIVE.incrementar(len(lote), resultado='error')
+        logger.exception('No se pudieron archivar %d PDF en Drive', len(lote))
+
+    # Cliente de la API
+
+    def _servicio_drive(self):
+        # Solo lo usa el hilo de subidas (httplib2 no es seguro entre hilos)
+        if self._servicio is None:
+            import google.auth
+            from googleapiclient.discovery import build, build_from_document
+            from googleapiclient.discovery_cache import get_static_doc
+
+            credenciales, _ = google.auth.load_credentials_from_file(self.credenciales, scopes=ALCANCES)
+            if self.endpoint:
+                # El documento de descubrimiento incluido en la librería, con
+                # todas las URL (API, subidas y batch) apuntando al endpoint
+                documento = json.loads(get_static_doc('drive', 'v3'))
+                documento['rootUrl'] = self.endpoint.rstrip('/') + '/'
+                documento['baseUrl'] = documento['rootUrl'] + documento['servicePath']
+                self._servicio = build_from_document(documento, credentials=credenciales)
+            else:
+                self._servicio = build('drive', 'v3', credentials=credenciales, cache_discovery=False)
+        return self._servicio
+
+    def _con_reintentos(self, funcion):
+        """Llama a `funcion` reintentando los errores transitorios con espera exponencial"""
+        for intento in range(self.intentos):
+            try:
+                return funcion()
+            except Exception as error:
+                if not _es_transitorio(error) or intento == self.intentos - 1:
+                    raise
+                self._esperar(intento)
+
+    def _esperar(self, intento):
+        """Espera exponencial con variación aleatoria antes del reintento `intento` + 1"""
+        espera = self.espera_reintento * 2 ** intento
+        time.sleep(espera + random.uniform(0, espera))
+
+    # Carpetas por paciente
+
+    def _buscar_carpetas(self, nombres):
+        """Añade a self._carpetas las carpetas de `nombres` que ya existen en Drive"""
+        servicio = self._servicio_drive()
+        for inicio in range(0, len(nombres), NOMBRES_POR_CONSULTA):
+            grupo = nombres[inicio:inicio + NOMBRES_POR_CONSULTA]
+            consulta = (
+                f"mimeType = '{TIPO_CARPETA}' and {_literal(self.carpeta_raiz)} in parents "
+                f"and trashed = false and ({' or '.join(f'name = {_literal(n)}' for n in grupo)})"
+            )
+            peticion = servicio.files().list(
+                q=consulta, fields='files(id, name)', pageSize=len(grupo) * 2, spaces='drive',
+            )
+            for carpeta in self._con_reintentos(peticion.execute).get('files', []):
+                self._carpetas.setdefault(carpeta['name'], carpeta['id'])
+
+    def _crear_carpetas(self, nombres):
+        """Crea las carpetas en una petición batch; devuelve las que merece la pena reintentar"""
+        servicio = self._servicio_drive()
+        reintentar = []
+
+        def creada(indice, respuesta, error):
+            nombre = nombres[int(indice)]
+            if error is None:
+                self._carpetas[nombre] = respuesta['id']
+            elif _es_transitorio(error):
+                reintentar.append(nombre)
+            else:
+                logger.warning('No se pudo crear la carpeta de %s en Drive: %s', nombre, error)
+
+        lote = servicio.new_batch_http_request()
+        for indice, nombre in enumerate(nombres):
+            lote.add(
+                servicio.files().create(
+                    body={'name': nombre, 'mimeType': TIPO_CARPETA, 'parents': [self.carpeta_raiz]},
+                    fields='id',
+                ),
+                callback=creada,
+                request_id=str(indice),
+            )
+        try:
+            lote.execute()
+        except Exception as error:
+            if not _es_transitorio(error):
+                raise
+            # Falló el batch entero: se reintentan todas las que no tienen carpeta
+            return [nombre for nombre in nombres if nombre not in self._carpetas]
+        return reintentar
+
+    def _resolver_carpetas(self, pacientes):
+        """Rellena self._carpetas para todos los pacientes del lote"""
+        pendientes = sorted(set(pacientes) - self._carpetas.keys())
+        for intento in range(self.intentos):
+            if intento:
+                self._esperar(intento - 1)
+            # Antes de cada intento se buscan también las que pudo crear el
+            # anterior aunque su respuesta se perdiera
+            self._buscar_carpetas(pendientes)
+            faltan = [nombre for nombre in pendientes if nombre not in self._carpetas]
+            if not faltan:
+                return
+            pendientes = self._crear_carpetas(faltan)
+            if not pendientes:
+                return
+        logger.warning('No se pudieron crear %d carpetas de paciente en Drive', len(pendientes))
+
+    # Subidas
+
+    def _buscar_archivados(self, claves):
+        """Claves de `claves` que ya tienen un PDF en Drive"""
+        servicio = self._servicio_drive()
+        archivados = set()
+        for inicio in range(0, len(claves), NOMBRES_POR_CONSULTA):
+            grupo = claves[inicio:inicio + NOMBRES_POR_CONSULTA]
+            condiciones = ' or '.join(
+                f'appProperties has {{ key={_literal(PROPIEDAD_CLAVE)} and value={_literal(clave)} }}'
+                for clave in grupo
+            )
+            peticion = servicio.files().list(
+                q=f'trashed = false and ({condiciones})', fields='nextPageToken, files(appProperties)',
+                pageSize=len(grupo) * 2, spaces='drive',
+            )
+            while peticion is not None:
+                respuesta = self._con_reintentos(peticion.execute)
+                for fichero in respuesta.get('files', []):
+                    archivados.add(fichero.get('appProperties', {}).get(PROPIEDAD_CLAVE))
+                peticion = servicio.files().list_next(peticion, respuesta)
+        return archivados
+
+    def _subir(self, carpeta, parte, pdf, clave):
+        """Sube un PDF con una subida reanudable y devuelve el id del fichero"""
+        from googleapiclient.http import MediaIoBaseUpload
+
+        servicio = self._servicio_drive()
+        medio = MediaIoBaseUpload(
+            io.BytesIO(pdf), mimetype='application/pdf', chunksize=self.tamano_trozo, resumable=True,
+        )
+        peticion = servicio.files().create(
+            body={
+                'name': parte.nombre_archivo,
+                'parents': [carpeta],
+                'appProperties': {PROPIEDAD_CLAVE: clave},
+            },
+            media_body=medio,
+            fields='id',
+        )
+        respuesta = None
+        while respuesta is None:
+            # Tras un error, next_chunk pregunta a Drive cuántos bytes tiene
+            # y continúa desde ahí
+            _, respuesta = self._con_reintentos(peticion.next_chunk)
+        return respuesta['id']
+
+    def _procesar(self, lote):
+        # Un parte repetido dentro del lote se sube una sola vez
+        pendientes = {}
+        for parte, pdf, motor in lote:
+            pendientes.setdefault(clave_parte(parte, motor), (parte, pdf))
+        with cronometro('drive_duplicados'):
+            archivados = self._buscar_archivados(list(pendientes))
+        for clave in archivados & pendientes.keys():
+            del pendientes[clave]
+        if len(pendientes) < len(lote):
+            ARCHIVO_DRIVE.incrementar(len(lote) - len(pendientes), resultado='ya_archivado')
+        if not pendientes:
+            return
+
+        pacientes = [parte.paciente or 'Sin paciente' for parte, _ in pendientes.values()]
+        with cronometro('drive_carpetas'):
+            self._resolver_carpetas(pacientes)
+
+        for paciente, (clave, (parte, pdf)) in zip(pacientes, pendientes.items()):
+            carpeta = self._carpetas.get(paciente)
+            if carpeta is None:
+                ARCHIVO_DRIVE.incrementar(resultado='error')
+                continue
+            try:
+                with cronometro('drive_subida'):
+                    self._subir(carpeta, parte, pdf, clave)
+            except Exception:
+                ARCHIVO_DRIVE.incrementar(resultado='error')
+                logger.exception('No se pudo archivar %s en Drive', parte.nombre_archivo)
+            else:
+                ARCHIVO_DRIVE.incrementar(resultado='subido')
@@ -0,0 +1,322 @@
+"""Modo ASGI: la aplicación sobre un bucle de eventos.
+
+    uvicorn asgi:aplicacion --workers 2
+    gunicorn -k uvicorn.workers.UvicornWorker -w 2 asgi:aplicacion
+
+Las descargas de PDF (/descargar-pdf y /api/v1/partes/pdf) tienen aquí
+manejadores asíncronos: el cuerpo se lee y el PDF se envía esperando al
+cliente en el bucle, y la caché y el renderizado se ejecutan en un executor
+de hilos (que con PARTE_RENDER_PROCESOS solo espera al pool de procesos).
+Un cliente lento, subiendo o descargando, ocupa una corrutina y no un hilo
+ni un proceso. El archivo en Drive ya es una cola que no bloquea.
+
+El resto de rutas de app.py (también GET /pdf/<clave>.pdf) pasan por un
+adaptador WSGI propio (_WsgiEnHilos), que lee el cuerpo completo en el
+bucle antes de ejecutar la vista en un pool de PARTE_ASGI_HILOS_WSGI hilos,
+así que hasta ese número de peticiones a Flask (/generar, los lotes, los
+informes, la API...) avanzan a la vez.
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from tempfile import SpooledTemporaryFile
+from urllib.parse import parse_qs, parse_qsl
+
+from app import (
+    MOTOR_PDF,
+    app,
+    archivo_drive,
+    cache_pdf,
+    cola_trabajos,
+    registrar_pdf,
+    renderizador,
+    ruta_pdf,
+)
+from cache_pdf import clave_pdf
+from metricas import CACHE_PDF, PETICIONES, cronometro
+from parte import ErrorValidacion, Parte
+from renderizado import MOTORES, ColaLlena, TiempoAgotado
+from salida_pdf import en_trozos
+
+# Hilos para la caché y el renderizado (PARTE_ASGI_HILOS)
+HILOS = int(os.environ.get('PARTE_ASGI_HILOS', 8))
+
+# Hilos para las vistas de Flask (PARTE_ASGI_HILOS_WSGI)
+HILOS_WSGI = int(os.environ.get('PARTE_ASGI_HILOS_WSGI', HILOS))
+
+# Tamaño máximo del cuerpo de una descarga de PDF
+CUERPO_MAXIMO = int(os.environ.get('PARTE_ASGI_CUERPO_MAXIMO', 1024 * 1024))
+
+FORMULARIO = 'application/x-www-form-urlencoded'
+
+_executor = ThreadPoolExecutor(max_workers=HILOS, thread_name_prefix='asgi-pdf')
+_executor_wsgi = ThreadPoolExecutor(max_workers=HILOS_WSGI, thread_name_prefix='asgi-wsgi')
+
+
+def _environ(scope, cuerpo):
+    """environ WSGI de una petición HTTP ASGI cuyo cuerpo ya está en `cuerpo`"""
+    raiz = scope.get('root_path', '').encode('utf-8').decode('latin-1')
+    ruta = scope['path'].encode('utf-8').decode('latin-1')
+    if ruta.startswith(raiz):
+        ruta = ruta[len(raiz):]
+    servidor = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': raiz,
+        'PATH_INFO': ruta,
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': servidor[0],
+        'SERVER_PORT': str(servidor[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': cuerpo,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for nombre, valor in scope['headers']:
+        nombre = nombre.decode('latin-1').upper().replace('-', '_')
+        if nombre not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            nombre = f'HTTP_{nombre}'
+        valor = valor.decode('latin-1')
+        if nombre in environ:
+            # Cabeceras repetidas: una sola con los valores unidos
+            valor = f"{environ[nombre]}{'; ' if nombre == 'HTTP_COOKIE' else ','}{valor}"
+        environ[nombre] = valor
+    return environ
+
+
+class _WsgiEnHilos:
+    """Adaptador ASGI -> WSGI que ejecuta cada petición en un hilo de _executor_wsgi.
+
+    El cuerpo se lee completo en el bucle (en memoria o, si es grande, en un
+    archivo temporal); el hilo ejecuta la vista y envía cada trozo de la
+    respuesta esperando a que el bucle lo entregue.
+    """
+
+    def __init__(self, aplicacion_wsgi):
+        self.aplicacion_wsgi = aplicacion_wsgi
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            raise ValueError(f"Tipo de conexión no admitido: {scope['type']}")
+        with SpooledTemporaryFile(max_size=64 * 1024) as cuerpo:
+            while True:
+                mensaje = await receive()
+                if mensaje['type'] == 'http.disconnect':
+                    return
+                cuerpo.write(mensaje.get('body', b''))
+                if not mensaje.get('more_body'):
+                    break
+            cuerpo.seek(0)
+            bucle = asyncio.get_running_loop()
+            await bucle.run_in_executor(_executor_wsgi, self._ejecutar, _environ(scope, cuerpo), send, bucle)
+
+    def _ejecutar(self, environ, send, bucle):
+        def enviar(mensaje):
+            asyncio.run_coroutine_threadsafe(send(mensaje), bucle).result()
+
+        inicio = {}
+
+        def start_response(estado, cabeceras, exc_info=None):
+            if exc_info is not None and inicio.get('enviado'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            inicio['mensaje'] = {
+                'type': 'http.response.start',
+                'status': int(estado.split(' ', 1)[0]),
+                'headers': [(nombre.lower().encode('latin-1'), valor.encode('latin-1'))
+                            for nombre, valor in cabeceras],
+            }
+
+        def empezar():
+            if not inicio.get('enviado'):
+                inicio['enviado'] = True
+                enviar(inicio['mensaje'])
+
+        respuesta = self.aplicacion_wsgi(environ, start_response)
+        try:
+            for trozo in respuesta:
+                if trozo:
+                    empezar()
+                    enviar({'type': 'http.response.body', 'body': trozo, 'more_body': True})
+        finally:
+            if hasattr(respuesta, 'close'):
+                respuesta.close()
+        empezar()
+        enviar({'type': 'http.response.body', 'body': b''})
+
+
+_wsgi = _WsgiEnHilos(app)
+
+
+class _CuerpoDemasiadoGrande(Exception):
+    pass
+
+
+async def _leer_cuerpo(receive):
+    partes = []
+    tamano = 0
+    while True:
+        mensaje = await receive()
+        if mensaje['type'] == 'http.disconnect':
+            return None
+        partes.append(mensaje.get('body', b''))
+        tamano += len(partes[-1])
+        if tamano > CUERPO_MAXIMO:
+            raise _CuerpoDemasiadoGrande()
+        if not mensaje.get('more_body'):
+            return b''.join(partes)
+
+
+def _cabeceras(scope):
+    return {nombre.decode('latin-1').lower(): valor.decode('latin-1') for nombre, valor in scope['headers']}
+
+
+async def _json(send, estado, cuerpo, cabeceras=()):
+    datos = json.dumps(cuerpo, ensure_ascii=False).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': estado,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(datos)).encode()),
+            *cabeceras,
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': datos})
+
+
+def _parte_formulario(cuerpo):
+    # Como request.form: ante claves repetidas vale la primera
+    datos = {}
+    for clave, valor in parse_qsl(cuerpo.decode('latin-1'), keep_blank_values=True,
+                                  encoding='utf-8', errors='replace'):
+        datos.setdefault(clave, valor)
+    return Parte(datos)
+
+
+def _parte_json(cuerpo):
+    try:
+        objeto = json.loads(cuerpo)
+    except ValueError:
+        objeto = None
+    return Parte.desde_json(objeto)
+
+
+# Ruta -> (tipo de contenido que se atiende aquí, lector del parte)
+DESCARGAS = {
+    '/descargar-pdf': (FORMULARIO, _parte_formulario),
+    '/api/v1/partes/pdf': ('application/json', _parte_json),
+}
+
+
+async def _descargar_pdf(scope, receive, send):
+    """Versión asíncrona de app._respuesta_pdf; devuelve False si la petición debe ir a Flask.
+
+    Solo decide pasarla a Flask antes de leer el cuerpo, así que este sigue
+    disponible en `receive` para _WsgiEnHilos.
+    """
+    tipo, lector = DESCARGAS[scope['path']]
+    cabeceras = _cabeceras(scope)
+    consulta = parse_qs(scope['query_string'].decode('latin-1'))
+    if (not cabeceras.get('content-type', '').startswith(tipo)
+            or 'perfil' in consulta or 'x-perfil' in cabeceras):
+        # Formularios multipart y peticiones perfiladas: las atiende Flask
+        return False
+
+    try:
+        cuerpo = await _leer_cuerpo(receive)
+    except _CuerpoDemasiadoGrande:
+        await _json(send, 413, {'error': 'El cuerpo de la petición es demasiado grande'})
+        return True
+    if cuerpo is None:
+        return True
+
+    motor = consulta.get('motor', [MOTOR_PDF])[0]
+    if motor not in MOTORES:
+        # Los mismos errores que dan las vistas de Flask
+        mensaje = f"Motor de PDF desconocido; use {' o '.join(MOTORES)}"
+        if lector is _parte_json:
+            await _json(send, 422, {'valido': False, 'errores': {'motor': mensaje}})
+        else:
+            await _json(send, 400, {'error': mensaje})
+        return True
+    try:
+        with cronometro('form_parseo'):
+            parte = lector(cuerpo)
+    except ErrorValidacion as error:
+        await _json(send, 422, {'valido': False, 'errores': error.errores})
+        return True
+
+    bucle = asyncio.get_running_loop()
+    clave = await bucle.run_in_executor(_executor, registrar_pdf, parte, motor)
+    try:
+        with cronometro('pdf_obtener'):
+            pdf_content, nivel_cache = await bucle.run_in_executor(
+                _executor, cache_pdf.obtener_o_generar, parte, renderizador.renderizar, motor,
+            )
+    except (ColaLlena, BrokenProcessPool):
+        await _json(send, 503, {'error': 'Servidor ocupado generando PDF, reintente en unos segundos'},
+                    [(b'retry-after', b'2')])
+        return True
+    except TiempoAgotado:
+        await _json(send, 504, {'error': 'La generación del PDF superó el tiempo máximo'})
+        return True
+    CACHE_PDF.incrementar(resultado='hit' if nivel_cache else 'miss')
+
+    if archivo_drive is not None and not nivel_cache:
+        archivo_drive.encolar(parte, pdf_content, motor)
+
+    respuesta = [
+        (b'content-type', b'application/pdf'),
+        (b'content-length', str(len(pdf_content)).encode()),
+        (b'content-disposition', f'attachment; filename="{parte.nombre_archivo}"'.encode('latin-1', 'replace')),
+        (b'x-cache', b'HIT' if nivel_cache else b'MISS'),
+        (b'content-location', ruta_pdf(clave).encode()),
+        (b'etag', f'"{clave_pdf(clave, parte.generado)}"'.encode()),
+    ]
+    if nivel_cache:
+        respuesta.append((b'x-cache-nivel', nivel_cache.encode()))
+    await send({'type': 'http.response.start', 'status': 200, 'headers': respuesta})
+    # Cada trozo espera a que el cliente lo acepte, sin ocupar ningún hilo
+    with cronometro('respuesta_envio'):
+        for trozo in en_trozos(pdf_content):
+            await send({'type': 'http.response.body', 'body': trozo, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    return True
+
+
+async def _ciclo_de_vida(receive, send):
+    while True:
+        mensaje = await receive()
+        if mensaje['type'] == 'lifespan.startup':
+            cola_trabajos.arrancar()
+            await send({'type': 'lifespan.startup.complete'})
+        elif mensaje['type'] == 'lifespan.shutdown':
+            _executor.shutdown(wait=True)
+            _executor_wsgi.shutdown(wait=True)
+            renderizador.cerrar()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def aplicacion(scope, receive, send):
+    """Aplicación ASGI"""
+    if scope['type'] == 'lifespan':
+        return await _ciclo_de_vida(receive, send)
+
+    if scope['type'] == 'http' and scope['method'] == 'POST' and scope['path'] in DESCARGAS:
+        inicio = time.perf_counter()
+        if await _descargar_pdf(scope, receive, send):
+            PETICIONES.observar(time.perf_counter() - inicio, ruta=scope['path'], metodo='POST')
+            return
+
+    await _wsgi(scope, receive, send)
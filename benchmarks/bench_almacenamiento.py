@@ -0,0 +1,57 @@
+"""Benchmark del almacenamiento SQLite de partes.
+
+Carga N partes (por defecto un millón) en una base temporal mediante
+escrituras por lotes y mide la latencia de las lecturas puntuales por id y
+del listado paginado de un paciente.
+
+Uso: python benchmarks/bench_almacenamiento.py [cantidad]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from comun import medir, parte_ejemplo, resumen
+
+from almacenamiento import Almacen
+
+PACIENTES = 2000
+LOTE = 5000
+
+
+def main():
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as directorio:
+        almacen = Almacen(os.path.join(directorio, 'partes.db'))
+        base = parte_ejemplo('corto')
+        inicio_fechas = date(2020, 1, 1)
+
+        inicio = time.perf_counter()
+        for desde in range(0, cantidad, LOTE):
+            lote = []
+            for indice in range(desde, min(desde + LOTE, cantidad)):
+                datos = dict(base)
+                datos['paciente'] = f'Paciente {indice % PACIENTES}'
+                datos['fecha'] = (inicio_fechas + timedelta(days=indice // PACIENTES)).isoformat()
+                lote.append(datos)
+            almacen.guardar_varios(lote)
+        carga = time.perf_counter() - inicio
+        print(f'carga: {cantidad} partes en {carga:.1f} s ({cantidad / carga:.0f} partes/s)')
+
+        ids = [random.randint(1, cantidad) for _ in range(2000)]
+        iterador = iter(ids * 2)
+        lectura = resumen(medir(lambda: almacen.obtener(next(iterador)), 2000, calentamiento=0))
+        print(f"lectura por id: mediana={lectura['mediana_ms']:.3f} ms p95={lectura['p95_ms']:.3f} ms")
+
+        def listado():
+            paciente = f'Paciente {random.randrange(PACIENTES)}'
+            almacen.listar_por_paciente(paciente, desde='2020-01-15', hasta='2020-12-31', limite=50)
+
+        lista = resumen(medir(listado, 500))
+        print(f"listado (50 por página): mediana={lista['mediana_ms']:.3f} ms p95={lista['p95_ms']:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
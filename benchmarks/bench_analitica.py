@@ -0,0 +1,89 @@
+"""Benchmark de la analítica: tablas de resumen frente a agregar sobre `partes`.
+
+Carga N partes (por defecto 200.000) y compara, para las consultas de los
+paneles, leer las tablas de resumen con calcular lo mismo con GROUP BY sobre
+la tabla de partes.
+
+Uso: python benchmarks/bench_analitica.py [cantidad]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from comun import medir, parte_ejemplo, resumen
+
+from almacenamiento import Almacen
+
+PACIENTES = 100
+CUIDADORAS = 37
+LOTE = 5000
+
+AGREGADO_PACIENTE = """
+SELECT date(fecha, 'weekday 0', '-6 days') AS semana, COUNT(*), SUM(estado_general = 'Bueno'),
+       SUM(estado_general = 'Regular'), SUM(estado_general = 'Malo'), SUM(signos_alerta != '')
+FROM partes WHERE paciente = ? AND fecha >= ? AND fecha <= ? GROUP BY semana
+"""
+AGREGADO_CUIDADORAS = """
+SELECT cuidadora, COUNT(*), SUM(signos_alerta != '') FROM partes
+WHERE fecha >= ? AND fecha <= ? GROUP BY cuidadora ORDER BY COUNT(*) DESC
+"""
+
+
+def main():
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    aleatorio = random.Random(1)
+    with tempfile.TemporaryDirectory() as directorio:
+        almacen = Almacen(os.path.join(directorio, 'partes.db'))
+        base = parte_ejemplo('corto')
+        inicio_fechas = date(2020, 1, 1)
+
+        inicio = time.perf_counter()
+        for desde in range(0, cantidad, LOTE):
+            lote = []
+            for indice in range(desde, min(desde + LOTE, cantidad)):
+                datos = dict(base)
+                datos['paciente'] = f'Paciente {indice % PACIENTES}'
+                datos['cuidadora'] = f'Cuidadora {indice % CUIDADORAS}'
+                datos['fecha'] = (inicio_fechas + timedelta(days=indice // PACIENTES)).isoformat()
+                datos['estado_general'] = aleatorio.choice(['Bueno', 'Regular', 'Malo'])
+                datos['signos_alerta'] = 'fiebre' if aleatorio.random() < 0.05 else ''
+                lote.append(datos)
+            almacen.guardar_varios(lote)
+        carga = time.perf_counter() - inicio
+        ultimo = inicio_fechas + timedelta(days=(cantidad - 1) // PACIENTES)
+        print(f'carga: {cantidad} partes en {carga:.1f} s ({cantidad / carga:.0f} partes/s), '
+              f'hasta {ultimo.isoformat()}')
+
+        conexion = almacen.conexion()
+        doce_semanas = ((ultimo - timedelta(weeks=12)).isoformat(), ultimo.isoformat())
+        un_ano = ((ultimo - timedelta(days=365)).isoformat(), ultimo.isoformat())
+
+        def paciente():
+            return f'Paciente {aleatorio.randrange(PACIENTES)}'
+
+        casos = {
+            'paciente, 12 semanas': (
+                lambda: almacen.serie_resumen('paciente', paciente(), 'semana', *doce_semanas),
+                lambda: conexion.execute(AGREGADO_PACIENTE, (paciente(), *doce_semanas)).fetchall(),
+            ),
+            'cuidadoras, 1 año': (
+                lambda: almacen.totales_resumen('cuidadora', 'semana', *un_ano),
+                lambda: conexion.execute(AGREGADO_CUIDADORAS, un_ano).fetchall(),
+            ),
+            'cuidadoras, todo': (
+                lambda: almacen.totales_resumen('cuidadora', 'semana', '0000-00-00', '9999-99-99'),
+                lambda: conexion.execute(AGREGADO_CUIDADORAS, ('0000-00-00', '9999-99-99')).fetchall(),
+            ),
+        }
+        for nombre, (con_resumen, sin_resumen) in casos.items():
+            rapido = resumen(medir(con_resumen, 50))
+            lento = resumen(medir(sin_resumen, 10))
+            print(f"{nombre:22s} resumen: mediana={rapido['mediana_ms']:.2f} ms  "
+                  f"GROUP BY sobre partes: mediana={lento['mediana_ms']:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
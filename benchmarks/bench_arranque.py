@@ -0,0 +1,131 @@
+"""Benchmark del arranque: tiempo de importación y de la primera petición.
+
+Cada medida se hace en un proceso nuevo, como un worker recién arrancado:
+
+- proceso: `import app`, la primera petición a `/` y la primera descarga de
+  PDF con el cliente de pruebas de Flask. En modo `precargado` se llama antes
+  a app.precargar(), que es lo que hace el maestro de gunicorn con
+  PARTE_PRECARGAR=1 antes de crear los workers.
+- gunicorn: desde que se lanza gunicorn hasta que responde `/`, y la
+  latencia de la primera descarga de PDF, con y sin PARTE_PRECARGAR.
+
+Uso: python benchmarks/bench_arranque.py [repeticiones] [--sin-gunicorn]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from statistics import median
+from urllib.parse import urlencode
+
+from comun import RAIZ, parte_ejemplo
+
+SCRIPT = """
+import json, sys, time
+inicio = time.perf_counter()
+import app
+medidas = {'importar': time.perf_counter() - inicio}
+if sys.argv[1] == 'precargado':
+    inicio = time.perf_counter()
+    app.precargar()
+    medidas['precargar'] = time.perf_counter() - inicio
+cliente = app.app.test_client()
+inicio = time.perf_counter()
+cliente.get('/')
+medidas['primera_get'] = time.perf_counter() - inicio
+inicio = time.perf_counter()
+respuesta = cliente.post('/descargar-pdf', data=json.loads(sys.argv[2]))
+assert respuesta.status_code == 200
+medidas['primera_pdf'] = time.perf_counter() - inicio
+medidas['modulos'] = len(sys.modules)
+print(json.dumps(medidas))
+"""
+
+
+def _entorno(directorio, **extra):
+    return dict(os.environ, PARTE_DB=os.path.join(directorio, 'partes.db'), **extra)
+
+
+def medir_proceso(modo, repeticiones, directorio):
+    datos = json.dumps(parte_ejemplo('tipico'))
+    resultados = []
+    for _ in range(repeticiones):
+        salida = subprocess.run(
+            [sys.executable, '-c', SCRIPT, modo, datos],
+            cwd=RAIZ, env=_entorno(directorio), capture_output=True, text=True, check=True,
+        )
+        resultados.append(json.loads(salida.stdout))
+    return {clave: median(r[clave] for r in resultados) for clave in resultados[0]}
+
+
+def _esperar(puerto, proceso, plazo=60):
+    import http.client
+    limite = time.perf_counter() + plazo
+    while time.perf_counter() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError('gunicorn terminó al arrancar')
+        try:
+            conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=5)
+            conexion.request('GET', '/')
+            if conexion.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.01)
+    raise RuntimeError('gunicorn no arrancó a tiempo')
+
+
+def medir_gunicorn(precargar, repeticiones, directorio):
+    import http.client
+    import socket
+
+    cuerpo = urlencode(parte_ejemplo('tipico'))
+    resultados = []
+    for _ in range(repeticiones):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            puerto = s.getsockname()[1]
+        inicio = time.perf_counter()
+        proceso = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-w', '1', '-b', f'127.0.0.1:{puerto}',
+             '--log-level', 'warning', 'app:app'],
+            cwd=RAIZ, env=_entorno(directorio, PARTE_PRECARGAR='1' if precargar else '0'),
+        )
+        try:
+            _esperar(puerto, proceso)
+            arranque = time.perf_counter() - inicio
+            conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=60)
+            inicio = time.perf_counter()
+            conexion.request('POST', '/descargar-pdf', cuerpo,
+                             {'Content-Type': 'application/x-www-form-urlencoded'})
+            conexion.getresponse().read()
+            resultados.append({'primera_respuesta': arranque, 'primera_pdf': time.perf_counter() - inicio})
+        finally:
+            proceso.terminate()
+            proceso.wait()
+    return {clave: median(r[clave] for r in resultados) for clave in resultados[0]}
+
+
+def _ms(medidas):
+    return ' '.join(
+        f'{clave}={valor * 1000:.0f} ms' if clave != 'modulos' else f'{clave}={valor}'
+        for clave, valor in medidas.items()
+    )
+
+
+def main():
+    argumentos = [a for a in sys.argv[1:] if not a.startswith('--')]
+    repeticiones = int(argumentos[0]) if argumentos else 5
+
+    with tempfile.TemporaryDirectory() as directorio:
+        for modo in ('perezoso', 'precargado'):
+            print(f'proceso  {modo:17s} {_ms(medir_proceso(modo, repeticiones, directorio))}')
+        if '--sin-gunicorn' not in sys.argv:
+            for precargar in (False, True):
+                nombre = 'PARTE_PRECARGAR=1' if precargar else 'perezoso'
+                print(f'gunicorn {nombre:17s} {_ms(medir_gunicorn(precargar, repeticiones, directorio))}')
+
+
+if __name__ == '__main__':
+    main()
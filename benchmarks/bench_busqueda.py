@@ -0,0 +1,82 @@
+"""Benchmark de la búsqueda de texto (FTS5) sobre los partes guardados.
+
+Carga N partes (por defecto 200.000: unos 100 pacientes durante cinco años)
+con texto variado y mide el ritmo de carga con el índice activo y la
+latencia de varias búsquedas: un término raro, uno frecuente limitado a un
+campo, por prefijo, y por paciente en un rango de fechas.
+
+Uso: python benchmarks/bench_busqueda.py [cantidad]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from comun import SECCIONES, medir, resumen
+
+from almacenamiento import Almacen
+
+PACIENTES = 100
+LOTE = 5000
+
+VOCABULARIO = (
+    'tranquilo inquieto come bebe duerme camina paseo ducha cambio pañal aseo '
+    'dolor cabeza espalda rodilla tos mareo náuseas vómito apetito agua zumo '
+    'infusión siesta noche despierta levanta silla grúa andador bastón crema '
+    'paracetamol ibuprofeno omeprazol metformina sintrom insulina enalapril '
+    'lorazepam tensión glucosa saturación temperatura normal estable bien regular'
+).split()
+ALERTAS = ['fiebre de 38', 'caída en el baño', 'desorientación', 'tensión alta', 'herida en el talón']
+
+
+def _parte(indice, inicio_fechas, aleatorio):
+    datos = {
+        'paciente': f'Paciente {indice % PACIENTES}',
+        'cuidadora': f'Cuidadora {indice % 37}',
+        'fecha': (inicio_fechas + timedelta(days=indice // PACIENTES)).isoformat(),
+        'estado_general': aleatorio.choice(['Bueno', 'Regular', 'Malo']),
+    }
+    for seccion in SECCIONES:
+        datos[seccion] = ' '.join(aleatorio.choices(VOCABULARIO, k=aleatorio.randint(5, 30)))
+    datos['signos_alerta'] = aleatorio.choice(ALERTAS) if aleatorio.random() < 0.05 else ''
+    # Un término raro en uno de cada mil partes
+    if indice % 1000 == 0:
+        datos['observaciones'] += ' hipoglucemia'
+    return datos
+
+
+def main():
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    aleatorio = random.Random(1)
+    with tempfile.TemporaryDirectory() as directorio:
+        almacen = Almacen(os.path.join(directorio, 'partes.db'))
+        inicio_fechas = date(2020, 1, 1)
+
+        inicio = time.perf_counter()
+        for desde in range(0, cantidad, LOTE):
+            almacen.guardar_varios([
+                _parte(indice, inicio_fechas, aleatorio) for indice in range(desde, min(desde + LOTE, cantidad))
+            ])
+        carga = time.perf_counter() - inicio
+        print(f'carga con índice: {cantidad} partes en {carga:.1f} s ({cantidad / carga:.0f} partes/s)')
+
+        busquedas = {
+            'término raro': lambda: almacen.buscar('hipoglucemia'),
+            'fiebre en signos_alerta': lambda: almacen.buscar('fiebre', campos=['signos_alerta']),
+            'prefijo (parac*)': lambda: almacen.buscar('parac*', limite=20),
+            'paciente + 3 meses': lambda: almacen.buscar(
+                'fiebre', paciente=f'Paciente {aleatorio.randrange(PACIENTES)}',
+                desde='2022-01-01', hasta='2022-03-31',
+            ),
+            'frase en un campo': lambda: almacen.buscar('"caída en el baño"', campos=['signos_alerta']),
+        }
+        for nombre, busqueda in busquedas.items():
+            tiempos = resumen(medir(busqueda, 50))
+            print(f"{nombre:26s} mediana={tiempos['mediana_ms']:.2f} ms p95={tiempos['p95_ms']:.2f} ms "
+                  f"({len(busqueda()[0])} resultados)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""Benchmark de concurrencia: gunicorn síncrono frente al modo ASGI (asgi.py).
+
+Arranca cada servidor con los mismos procesos, abre K conexiones de clientes
+lentos y, mientras siguen abiertas, mide cuántas peticiones normales se
+atienden y con qué latencia. Hay dos clases de cliente lento:
+
+- subida:   envía las cabeceras de un POST /descargar-pdf y solo parte del cuerpo
+- descarga: pide un PDF muy largo y no lee la respuesta
+
+Con workers síncronos cada cliente lento ocupa un proceso entero; en el modo
+ASGI solo ocupa una corrutina.
+
+Después lanza N peticiones lentas a la vez a una ruta que atiende Flask
+también en el modo ASGI (POST /descargar-pdf/lote, que renderiza varios
+partes sin caché) y mide cuánto tardan en total y la latencia de GET /
+mientras tanto. En el modo ASGI esas vistas se ejecutan en un pool de hilos
+(PARTE_ASGI_HILOS_WSGI); si compartieran un único hilo, irían de una en una
+y GET / esperaría detrás de todas.
+
+Uso: python benchmarks/bench_concurrencia.py [--workers 2] [--lentos 0,2,10,100,500] [--vistas 1,4,8]
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+from comun import RAIZ, parte_ejemplo
+
+FORMULARIO = 'application/x-www-form-urlencoded'
+
+SERVIDORES = {
+    'sync': lambda workers, puerto: [
+        sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{puerto}',
+        '--log-level', 'warning', 'app:app',
+    ],
+    'asgi': lambda workers, puerto: [
+        sys.executable, '-m', 'uvicorn', 'asgi:aplicacion', '--workers', str(workers),
+        '--port', str(puerto), '--log-level', 'warning', '--backlog', '4096',
+    ],
+}
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _arrancar(servidor, workers, directorio):
+    puerto = _puerto_libre()
+    proceso = subprocess.Popen(
+        SERVIDORES[servidor](workers, puerto), cwd=RAIZ,
+        env=dict(os.environ, PARTE_DB=os.path.join(directorio, 'partes.db')),
+    )
+    limite = time.perf_counter() + 60
+    while time.perf_counter() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f'{servidor} terminó al arrancar')
+        try:
+            if _peticion(puerto, 'GET', '/', None, 1)[0] == 200:
+                return proceso, puerto
+        except OSError:
+            time.sleep(0.05)
+    proceso.terminate()
+    raise RuntimeError(f'{servidor} no arrancó a tiempo')
+
+
+def _peticion(puerto, metodo, ruta, cuerpo, timeout, tipo=FORMULARIO):
+    conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=timeout)
+    try:
+        inicio = time.perf_counter()
+        conexion.request(metodo, ruta, cuerpo, {'Content-Type': tipo} if cuerpo else {})
+        respuesta = conexion.getresponse()
+        respuesta.read()
+        return respuesta.status, time.perf_counter() - inicio
+    finally:
+        conexion.close()
+
+
+def _clientes_lentos(puerto, cantidad, clase, cuerpo_largo):
+    """Abre `cantidad` conexiones que se quedan a medias; devuelve los sockets"""
+    sockets = []
+    for _ in range(cantidad):
+        s = socket.socket()
+        # Ventana de recepción mínima: el servidor no puede volcar el PDF en el búfer
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        s.settimeout(5)
+        s.connect(('127.0.0.1', puerto))
+        cabecera = (
+            f'POST /descargar-pdf HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: {FORMULARIO}\r\n'
+            f'Content-Length: {len(cuerpo_largo)}\r\n\r\n'
+        ).encode()
+        if clase == 'subida':
+            s.sendall(cabecera + cuerpo_largo[:100])
+        else:
+            s.sendall(cabecera + cuerpo_largo)
+        sockets.append(s)
+    return sockets
+
+
+def medir(servidor, workers, lentos, clase, peticiones=20, timeout=5, plazo=15):
+    cuerpo = urlencode(parte_ejemplo('tipico')).encode()
+    cuerpo_largo = urlencode(parte_ejemplo('muy_largo')).encode()
+    with tempfile.TemporaryDirectory() as directorio:
+        proceso, puerto = _arrancar(servidor, workers, directorio)
+        try:
+            # PDF en la caché antes de empezar
+            _peticion(puerto, 'POST', '/descargar-pdf', cuerpo, 60)
+            _peticion(puerto, 'POST', '/descargar-pdf', cuerpo_largo, 60)
+            sockets = _clientes_lentos(puerto, lentos, clase, cuerpo_largo)
+            time.sleep(0.5)
+            latencias = []
+            inicio = time.perf_counter()
+            for indice in range(peticiones):
+                if time.perf_counter() - inicio > plazo:
+                    break
+                metodo, ruta, datos = ('GET', '/', None) if indice % 2 else ('POST', '/descargar-pdf', cuerpo)
+                try:
+                    estado, duracion = _peticion(puerto, metodo, ruta, datos, timeout)
+                    if estado == 200:
+                        latencias.append(duracion)
+                except OSError:
+                    pass
+            total = time.perf_counter() - inicio
+            for s in sockets:
+                s.close()
+        finally:
+            proceso.terminate()
+            proceso.wait()
+    latencias.sort()
+    return {
+        'atendidas': len(latencias),
+        'p50_ms': latencias[len(latencias) // 2] * 1000 if latencias else None,
+        'p95_ms': latencias[int(len(latencias) * 0.95)] * 1000 if latencias else None,
+        'segundos': total,
+    }
+
+
+def medir_vistas(servidor, workers, concurrentes, partes_por_lote=4):
+    """Lanza `concurrentes` lotes a la vez y mide GET / mientras se atienden"""
+    with tempfile.TemporaryDirectory() as directorio:
+        proceso, puerto = _arrancar(servidor, workers, directorio)
+        try:
+            duraciones = []
+
+            def lote(indice):
+                # Fechas distintas en cada lote: ningún PDF está en la caché
+                partes = [parte_ejemplo('tipico', fecha=f'2023-{indice % 12 + 1:02d}-{numero + 1:02d}')
+                          for numero in range(partes_por_lote)]
+                cuerpo = json.dumps(partes).encode()
+                estado, duracion = _peticion(puerto, 'POST', '/descargar-pdf/lote?formato=zip', cuerpo, 120,
+                                             'application/json')
+                if estado == 200:
+                    duraciones.append(duracion)
+
+            hilos = [threading.Thread(target=lote, args=(indice,)) for indice in range(concurrentes)]
+            inicio = time.perf_counter()
+            for hilo in hilos:
+                hilo.start()
+            latencias = []
+            while any(hilo.is_alive() for hilo in hilos):
+                try:
+                    estado, duracion = _peticion(puerto, 'GET', '/', None, 30)
+                    if estado == 200:
+                        latencias.append(duracion)
+                except OSError:
+                    pass
+                time.sleep(0.05)
+            for hilo in hilos:
+                hilo.join()
+            total = time.perf_counter() - inicio
+        finally:
+            proceso.terminate()
+            proceso.wait()
+    latencias.sort()
+    return {
+        'lotes': len(duraciones),
+        'segundos': total,
+        'get_p50_ms': latencias[len(latencias) // 2] * 1000 if latencias else None,
+        'get_max_ms': latencias[-1] * 1000 if latencias else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--lentos', default='0,2,10,100,500')
+    parser.add_argument('--peticiones', type=int, default=20)
+    parser.add_argument('--vistas', default='1,4,8')
+    args = parser.parse_args()
+
+    print(f'{args.workers} procesos, {args.peticiones} peticiones normales (timeout 5 s, 15 s por caso) '
+          'con K clientes lentos', flush=True)
+    for clase in ('subida', 'descarga'):
+        for lentos in [int(k) for k in args.lentos.split(',')]:
+            for servidor in SERVIDORES:
+                r = medir(servidor, args.workers, lentos, clase, args.peticiones)
+                latencia = (f"p50={r['p50_ms']:.1f} ms p95={r['p95_ms']:.1f} ms"
+                            if r['atendidas'] else 'sin respuesta')
+                print(f"{clase:8s} K={lentos:<4d} {servidor:5s} atendidas={r['atendidas']:>3d}/{args.peticiones} "
+                      f"{latencia} ({r['segundos']:.1f} s)", flush=True)
+
+    print('N lotes concurrentes (POST /descargar-pdf/lote, 4 partes sin caché) y GET / mientras tanto', flush=True)
+    for concurrentes in [int(n) for n in args.vistas.split(',')]:
+        for servidor in SERVIDORES:
+            r = medir_vistas(servidor, args.workers, concurrentes)
+            latencia = (f"GET / p50={r['get_p50_ms']:.1f} ms max={r['get_max_ms']:.1f} ms"
+                        if r['get_p50_ms'] is not None else 'GET / sin respuesta')
+            print(f"lotes    N={concurrentes:<4d} {servidor:5s} completados={r['lotes']}/{concurrentes} "
+                  f"en {r['segundos']:.1f} s, {latencia}", flush=True)
+
+
+if __name__ == '__main__':
+    main()
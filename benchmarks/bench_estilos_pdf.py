@@ -0,0 +1,56 @@
+"""Benchmark del registro de estilos de generar_pdf.
+
+Compara la latencia y las asignaciones de memoria por PDF de un parte típico
+de diez secciones con el registro compartido frente a reconstruir los estilos
+en cada llamada (el comportamiento anterior).
+
+Uso: python benchmarks/bench_estilos_pdf.py [repeticiones]
+"""
+import sys
+import tracemalloc
+
+from comun import medir, parte_ejemplo, resumen
+
+from pdf_parte import generar_pdf
+from estilos_pdf import obtener_estilos
+
+
+def _asignaciones(funcion):
+    """Bloques y bytes asignados (netos y pico) durante una llamada"""
+    tracemalloc.start()
+    antes = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    funcion()
+    _, pico = tracemalloc.get_traced_memory()
+    despues = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    diferencias = despues.compare_to(antes, 'filename')
+    bloques = sum(d.count_diff for d in diferencias if d.count_diff > 0)
+    return bloques, pico
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    datos = parte_ejemplo('tipico')
+
+    def sin_registro():
+        obtener_estilos.cache_clear()
+        generar_pdf(datos)
+
+    def con_registro():
+        generar_pdf(datos)
+
+    for nombre, funcion in [('sin registro', sin_registro), ('con registro', con_registro)]:
+        tiempos = resumen(medir(funcion, repeticiones))
+        bloques, pico = _asignaciones(funcion)
+        print(
+            f"{nombre:14s} mediana={tiempos['mediana_ms']:.2f} ms "
+            f"p95={tiempos['p95_ms']:.2f} ms bloques={bloques} pico={pico / 1024:.0f} KiB"
+        )
+
+    estilos = resumen(medir(lambda: (obtener_estilos.cache_clear(), obtener_estilos()), repeticiones))
+    print(f"construcción de estilos: {estilos['mediana_ms']:.3f} ms por PDF evitados")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""Benchmark de las fuentes del PDF: tamaño, tiempo y caracteres sin glifo.
+
+Genera con generar_pdf partes en español, con símbolos y emoji y con
+nombres en griego y cirílico, con tres configuraciones:
+
+- helvetica: PARTE_FUENTE=Helvetica, la fuente estándar sin incrustar (lo de
+  antes; lo que no está en WinAnsi sale como un cuadro o no sale).
+- subconjunto: DejaVu Sans con solo los glifos usados (fuentes.py).
+- completa: DejaVu Sans incrustada entera. ReportLab solo incrusta
+  subconjuntos, así que es una estimación a partir del PDF anterior: se
+  cambian los flujos /FontFile2 por cada archivo TTF comprimido con zlib y
+  al tiempo se suma el de comprimirlos.
+
+Cada configuración se mide en un proceso nuevo, porque las fuentes se
+registran una vez por proceso.
+
+Uso: python benchmarks/bench_fuentes.py [repeticiones]
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import zlib
+
+from comun import RAIZ, medir, parte_ejemplo, resumen
+
+SIMBOLOS = 'Tensión 12/8 ✓, dosis ½ comprimido → 3×/día, coste 4,50 € “sin cambios”… 💊 🩺 ⚠️ 😊'
+GRIEGO = 'Ελένη Παπαδοπούλου'
+CIRILICO = 'Ольга Иванова'
+
+
+def escenarios():
+    simbolos = parte_ejemplo('tipico')
+    simbolos['medicacion'] = simbolos['observaciones'] = SIMBOLOS
+    alfabetos = parte_ejemplo('tipico', paciente=GRIEGO)
+    alfabetos['cuidadora'] = CIRILICO
+    alfabetos['observaciones'] = f'{GRIEGO} pasó buena noche; avisada {CIRILICO}. Καλημέρα. Спасибо.'
+    return {
+        'español': parte_ejemplo('tipico'),
+        'español largo': parte_ejemplo('muy_largo'),
+        'símbolos y emoji': simbolos,
+        'griego y cirílico': alfabetos,
+    }
+
+
+def _flujos_fuente(pdf):
+    """Bytes de los flujos /FontFile2 (los subconjuntos incrustados)"""
+    return sum(int(longitud) for longitud in re.findall(rb'/Length (\d+)[^>]*/Length1', pdf))
+
+
+def medir_configuracion(repeticiones):
+    """Se ejecuta en el proceso hijo con PARTE_FUENTE ya fijada"""
+    import pdf_parte
+    from fuentes import cobertura, fuente_respaldo, registrar_fuentes
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    pdf_parte.cache_secciones.maximo = 0
+    fuentes = registrar_fuentes()
+    archivos = []
+    for nombre in dict.fromkeys([fuentes.normal, fuentes.negrita]):
+        fuente = pdfmetrics.getFont(nombre)
+        if isinstance(fuente, TTFont):
+            archivos.append(fuente.face.filename)
+
+    resultados = {}
+    for escenario, datos in escenarios().items():
+        pdf = pdf_parte.generar_pdf(datos)
+        texto = ''.join(str(valor) for valor in datos.values())
+        sin_glifo = {
+            caracter for caracter in texto
+            if not caracter.isspace() and ord(caracter) not in cobertura(fuentes.normal)
+            and fuente_respaldo(caracter) is None
+        }
+        resultados[escenario] = {
+            'bytes': len(pdf),
+            'bytes_fuentes': _flujos_fuente(pdf),
+            'sin_glifo': len(sin_glifo),
+            **resumen(medir(lambda: pdf_parte.generar_pdf(datos), repeticiones)),
+        }
+    return {'archivos': archivos, 'escenarios': resultados}
+
+
+def completa(subconjunto):
+    """Estimación de la incrustación completa a partir del subconjunto"""
+    bytes_completos = 0
+    segundos = 0.0
+    for archivo in subconjunto['archivos']:
+        with open(archivo, 'rb') as f:
+            contenido = f.read()
+        inicio = time.perf_counter()
+        bytes_completos += len(zlib.compress(contenido))
+        segundos += time.perf_counter() - inicio
+    resultados = {}
+    for escenario, medidas in subconjunto['escenarios'].items():
+        resultados[escenario] = {
+            'bytes': medidas['bytes'] - medidas['bytes_fuentes'] + bytes_completos,
+            'bytes_fuentes': bytes_completos,
+            'sin_glifo': medidas['sin_glifo'],
+            'mediana_ms': medidas['mediana_ms'] + segundos * 1000,
+            'p95_ms': medidas['p95_ms'] + segundos * 1000,
+        }
+    return resultados
+
+
+def lanzar(repeticiones, **entorno):
+    salida = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--medir', str(repeticiones)],
+        cwd=RAIZ, env=dict(os.environ, **entorno), capture_output=True, text=True, check=True,
+    )
+    return json.loads(salida.stdout)
+
+
+def main():
+    if sys.argv[1:2] == ['--medir']:
+        print(json.dumps(medir_configuracion(int(sys.argv[2]))))
+        return
+
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    helvetica = lanzar(repeticiones, PARTE_FUENTE='Helvetica')
+    subconjunto = lanzar(repeticiones)
+    if not subconjunto['archivos']:
+        print('No hay DejaVu Sans instalada: solo se puede medir Helvetica')
+    configuraciones = {
+        'helvetica': helvetica['escenarios'],
+        'subconjunto': subconjunto['escenarios'],
+    }
+    if subconjunto['archivos']:
+        configuraciones['completa (estimada)'] = completa(subconjunto)
+
+    for escenario in helvetica['escenarios']:
+        print(escenario)
+        for nombre, resultados in configuraciones.items():
+            medidas = resultados[escenario]
+            print(f"  {nombre:20s} {medidas['bytes'] / 1024:8.1f} KB  "
+                  f"(fuentes {medidas['bytes_fuentes'] / 1024:6.1f} KB)  "
+                  f"mediana={medidas['mediana_ms']:6.1f} ms  p95={medidas['p95_ms']:6.1f} ms  "
+                  f"caracteres sin glifo={medidas['sin_glifo']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Benchmark de memoria de /descargar-pdf con descargas concurrentes.
+
+Levanta la aplicación en un servidor WSGI con hilos (en un proceso aparte),
+lanza N descargas simultáneas de partes largos distintos (sin caché) y mide
+el pico de RSS del servidor en cada modo:
+
+- anterior: BytesIO + getvalue() + make_response (comportamiento previo)
+- buffer:   PDF sin copia intermedia, respuesta completa en memoria
+- streaming: PDF sin copia intermedia enviado en trozos
+
+Uso: python benchmarks/bench_memoria_pdf.py [concurrencia]
+"""
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlencode
+
+from comun import RAIZ, parte_ejemplo
+
+SERVIDOR = r'''
+import os, sys, tempfile
+sys.path.insert(0, sys.argv[1])
+os.environ['PARTE_DB'] = os.path.join(tempfile.mkdtemp(), 'partes.db')
+from io import BytesIO
+import renderizado
+from pdf_parte import construir_elementos, nuevo_documento
+
+if sys.argv[3] == 'anterior':
+    def generar_pdf(datos):
+        buffer = BytesIO()
+        nuevo_documento(buffer).build(construir_elementos(datos))
+        pdf = buffer.getvalue()
+        buffer.close()
+        return pdf
+    renderizado.generar_pdf = generar_pdf
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+from app import app
+
+class SinRegistro(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+make_server('127.0.0.1', int(sys.argv[2]), app, threaded=True, request_handler=SinRegistro).serve_forever()
+'''
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _pico_rss_kib(pid):
+    with open(f'/proc/{pid}/status') as archivo:
+        for linea in archivo:
+            if linea.startswith('VmHWM:'):
+                return int(linea.split()[1])
+    return 0
+
+
+def _esperar(puerto):
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', puerto), timeout=0.1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('El servidor no arrancó')
+
+
+def _descargar(puerto, cuerpo, tamanos):
+    conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=300)
+    conexion.request('POST', '/descargar-pdf', cuerpo, {'Content-Type': 'application/x-www-form-urlencoded'})
+    respuesta = conexion.getresponse()
+    # El cliente lee despacio y descarta, como un móvil con mala conexión
+    total = 0
+    while True:
+        trozo = respuesta.read(16 * 1024)
+        if not trozo:
+            break
+        total += len(trozo)
+        time.sleep(0.001)
+    conexion.close()
+    tamanos.append(total)
+
+
+def medir_modo(modo, concurrencia):
+    puerto = _puerto_libre()
+    entorno = dict(os.environ, PARTE_CACHE_MB='0', PARTE_PDF_STREAMING='0' if modo != 'streaming' else '1')
+    servidor = subprocess.Popen([sys.executable, '-c', SERVIDOR, RAIZ, str(puerto), modo], env=entorno)
+    try:
+        _esperar(puerto)
+        base = _pico_rss_kib(servidor.pid)
+        cuerpos = [
+            urlencode(parte_ejemplo('muy_largo', paciente=f'Paciente {indice}')).encode()
+            for indice in range(concurrencia)
+        ]
+        tamanos = []
+        hilos = [threading.Thread(target=_descargar, args=(puerto, cuerpo, tamanos)) for cuerpo in cuerpos]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+        pico = _pico_rss_kib(servidor.pid)
+    finally:
+        servidor.terminate()
+        servidor.wait()
+    print(
+        f'{modo:10s} pico RSS={pico / 1024:6.1f} MiB (arranque {base / 1024:.1f} MiB) '
+        f'PDF={max(tamanos) / 1024:.0f} KiB en {duracion:.1f} s'
+    )
+
+
+def main():
+    concurrencia = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    for modo in ['anterior', 'buffer', 'streaming']:
+        medir_modo(modo, concurrencia)
+
+
+if __name__ == '__main__':
+    main()
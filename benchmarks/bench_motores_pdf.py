@@ -0,0 +1,40 @@
+"""Benchmark de los motores de PDF de un parte: platypus frente a canvas.
+
+Genera el mismo parte con generar_pdf (SimpleDocTemplate) y con
+generar_pdf_canvas (dibujo directo de la plantilla) para cada tamaño de
+ejemplo. La caché de secciones se desactiva para medir el coste completo.
+
+Uso: python benchmarks/bench_motores_pdf.py [repeticiones]
+"""
+import sys
+
+from comun import TAMANOS, medir, parte_ejemplo, resumen
+
+import pdf_parte
+from metricas import PDF_MOTOR
+from pdf_canvas import generar_pdf_canvas
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    pdf_parte.cache_secciones.maximo = 0
+
+    for tamano in TAMANOS:
+        datos = parte_ejemplo(tamano)
+        resultados = [
+            (nombre, resumen(medir(lambda: funcion(datos), repeticiones)))
+            for nombre, funcion in [('platypus', pdf_parte.generar_pdf), ('canvas', generar_pdf_canvas)]
+        ]
+        base = resultados[0][1]['mediana_ms']
+        for nombre, tiempos in resultados:
+            print(
+                f"{tamano:10s} {nombre:9s} mediana={tiempos['mediana_ms']:.2f} ms "
+                f"p95={tiempos['p95_ms']:.2f} ms ({base / tiempos['mediana_ms']:.1f}x)"
+            )
+
+    # Un PDF del motor canvas que se generó con platypus indica un respaldo
+    print('PDF por motor:', PDF_MOTOR.instantanea())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Benchmark de peticiones por segundo de las páginas HTML (`/` y `/generar`).
+
+Usa el cliente de pruebas de Flask, sin red, para medir solo el coste del
+servidor. Para comparar antes/después basta con ejecutarlo en cada commit.
+
+Uso: python benchmarks/bench_paginas_html.py [segundos_por_ruta]
+"""
+import os
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode
+
+from comun import parte_ejemplo
+
+# La base de datos del benchmark no debe mezclarse con la real
+os.environ.setdefault('PARTE_DB', os.path.join(tempfile.mkdtemp(), 'partes.db'))
+
+from app import app
+
+
+def peticiones_por_segundo(peticion, segundos):
+    peticion()
+    cantidad = 0
+    inicio = time.perf_counter()
+    while time.perf_counter() - inicio < segundos:
+        respuesta = peticion()
+        assert respuesta.status_code == 200, respuesta.status_code
+        cantidad += 1
+    return cantidad / (time.perf_counter() - inicio)
+
+
+def main():
+    segundos = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    cliente = app.test_client()
+    # El cuerpo se codifica una sola vez para no medir el trabajo del cliente
+    cuerpo = urlencode(parte_ejemplo('tipico'))
+    formulario = 'application/x-www-form-urlencoded'
+
+    rutas = {
+        'GET /': lambda: cliente.get('/'),
+        'POST /generar': lambda: cliente.post('/generar', data=cuerpo, content_type=formulario),
+    }
+    for nombre, peticion in rutas.items():
+        print(f'{nombre:15s} {peticiones_por_segundo(peticion, segundos):8.0f} req/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""Benchmark de la re-descarga del PDF tras editar una sola sección.
+
+Simula el flujo habitual de la cuidadora: descarga el PDF, corrige una
+sección y lo vuelve a descargar. Cada repetición cambia las observaciones,
+así que la caché de PDFs completos nunca acierta; se compara la caché de
+secciones activada frente a desactivada.
+
+Uso: python benchmarks/bench_reedicion_pdf.py [repeticiones]
+"""
+import itertools
+import sys
+
+from comun import TAMANOS, medir, parte_ejemplo, resumen
+
+import pdf_parte
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    maximo = pdf_parte.cache_secciones.maximo or 2048
+
+    for tamano in TAMANOS:
+        datos = parte_ejemplo(tamano)
+        original = datos['observaciones']
+        ediciones = itertools.count()
+
+        def reeditar():
+            datos['observaciones'] = f"{original} Corrección {next(ediciones)}."
+            pdf_parte.generar_pdf(datos)
+
+        resultados = []
+        for nombre, limite in [('sin caché', 0), ('con caché', maximo)]:
+            pdf_parte.cache_secciones.maximo = limite
+            resultados.append((nombre, resumen(medir(reeditar, repeticiones))))
+
+        base = resultados[0][1]['mediana_ms']
+        for nombre, tiempos in resultados:
+            print(
+                f"{tamano:10s} {nombre:10s} mediana={tiempos['mediana_ms']:.2f} ms "
+                f"p95={tiempos['p95_ms']:.2f} ms ({base / tiempos['mediana_ms']:.2f}x)"
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+"""Banco de carga de las rutas de la aplicación (`/`, `/generar`, `/descargar-pdf`).
+
+Ejecuta cada ruta con partes de distintos tamaños (de corto a muy largo)
+contra dos destinos:
+
+- cliente:  el cliente de pruebas de Flask en este proceso (coste puro del servidor)
+- gunicorn: un gunicorn local arrancado para la ocasión, con N clientes concurrentes
+
+Informa latencias p50/p95/p99, rendimiento y pico de memoria por ruta, y
+puede guardar los resultados en JSON para compararlos entre commits.
+
+Uso:
+    python benchmarks/carga.py --destino cliente --peticiones 200
+    python benchmarks/carga.py --destino gunicorn --workers 2 --concurrencia 8
+    python benchmarks/carga.py --salida actual.json --comparar base.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from urllib.parse import urlencode
+
+from comun import RAIZ, TAMANOS, parte_ejemplo
+
+FORMULARIO = 'application/x-www-form-urlencoded'
+
+
+def _casos(tamanos):
+    """(nombre, método, ruta, cuerpo) de cada combinación ruta/tamaño"""
+    casos = [('GET /', 'GET', '/', None)]
+    for ruta in ['/generar', '/descargar-pdf']:
+        for tamano in tamanos:
+            cuerpo = urlencode(parte_ejemplo(tamano)).encode()
+            casos.append((f'POST {ruta} [{tamano}]', 'POST', ruta, cuerpo))
+    return casos
+
+
+def _percentil(ordenadas, p):
+    if not ordenadas:
+        return 0.0
+    return ordenadas[min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))]
+
+
+def _estadisticas(latencias, duracion, errores):
+    ordenadas = sorted(latencias)
+    return {
+        'peticiones': len(latencias),
+        'errores': errores,
+        'p50_ms': _percentil(ordenadas, 50) * 1000,
+        'p95_ms': _percentil(ordenadas, 95) * 1000,
+        'p99_ms': _percentil(ordenadas, 99) * 1000,
+        'rps': len(latencias) / duracion if duracion else 0.0,
+    }
+
+
+# Destino: cliente de pruebas de Flask
+
+def medir_cliente(casos, peticiones):
+    os.environ.setdefault('PARTE_DB', os.path.join(tempfile.mkdtemp(), 'partes.db'))
+    from app import app
+
+    cliente = app.test_client()
+    resultados = {}
+    for nombre, metodo, ruta, cuerpo in casos:
+        def peticion():
+            if metodo == 'GET':
+                return cliente.get(ruta)
+            return cliente.post(ruta, data=cuerpo, content_type=FORMULARIO)
+
+        peticion()
+        latencias = []
+        errores = 0
+        inicio = time.perf_counter()
+        for _ in range(peticiones):
+            t0 = time.perf_counter()
+            respuesta = peticion()
+            respuesta.close()
+            latencias.append(time.perf_counter() - t0)
+            errores += respuesta.status_code >= 400
+        duracion = time.perf_counter() - inicio
+
+        # El pico de memoria se mide aparte: tracemalloc distorsiona las latencias
+        tracemalloc.start()
+        for _ in range(min(peticiones, 5)):
+            peticion().close()
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        resultados[nombre] = _estadisticas(latencias, duracion, errores)
+        resultados[nombre]['pico_memoria_kib'] = pico / 1024
+    return resultados
+
+
+# Destino: gunicorn local
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _pids_arbol(pid):
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as archivo:
+            for hijo in archivo.read().split():
+                pids.extend(_pids_arbol(int(hijo)))
+    except FileNotFoundError:
+        pass
+    return pids
+
+
+def _rss_kib(pid):
+    try:
+        with open(f'/proc/{pid}/status') as archivo:
+            for linea in archivo:
+                if linea.startswith('VmRSS:'):
+                    return int(linea.split()[1])
+    except FileNotFoundError:
+        pass
+    return 0
+
+
+class _MonitorMemoria(threading.Thread):
+    """Muestrea la RSS total de gunicorn (master y workers) y guarda el pico"""
+
+    def __init__(self, pid):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.pico = 0
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.is_set():
+            self.pico = max(self.pico, sum(_rss_kib(p) for p in _pids_arbol(self.pid)))
+            self._parar.wait(0.05)
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+        return self.pico
+
+
+def _arrancar_gunicorn(workers, directorio):
+    puerto = _puerto_libre()
+    entorno = dict(os.environ, PARTE_DB=os.path.join(directorio, 'partes.db'))
+    proceso = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{puerto}',
+         '--log-level', 'warning', 'app:app'],
+        cwd=RAIZ,
+        env=entorno,
+    )
+    for _ in range(200):
+        try:
+            socket.create_connection(('127.0.0.1', puerto), timeout=0.1).close()
+            return proceso, puerto
+        except OSError:
+            if proceso.poll() is not None:
+                raise RuntimeError('gunicorn terminó al arrancar')
+            time.sleep(0.05)
+    proceso.terminate()
+    raise RuntimeError('gunicorn no arrancó a tiempo')
+
+
+def _peticion_http(puerto, metodo, ruta, cuerpo):
+    conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=120)
+    try:
+        cabeceras = {'Content-Type': FORMULARIO} if cuerpo else {}
+        conexion.request(metodo, ruta, cuerpo, cabeceras)
+        respuesta = conexion.getresponse()
+        respuesta.read()
+        return respuesta.status
+    finally:
+        conexion.close()
+
+
+def medir_gunicorn(casos, peticiones, workers, concurrencia):
+    resultados = {}
+    with tempfile.TemporaryDirectory() as directorio:
+        proceso, puerto = _arrancar_gunicorn(workers, directorio)
+        try:
+            for nombre, metodo, ruta, cuerpo in casos:
+                _peticion_http(puerto, metodo, ruta, cuerpo)
+                latencias = []
+                errores = []
+                restantes = iter(range(peticiones))
+                lock = threading.Lock()
+
+                def cliente():
+                    while True:
+                        with lock:
+                            if next(restantes, None) is None:
+                                return
+                        t0 = time.perf_counter()
+                        try:
+                            estado = _peticion_http(puerto, metodo, ruta, cuerpo)
+                        except OSError:
+                            estado = 599
+                        duracion = time.perf_counter() - t0
+                        with lock:
+                            latencias.append(duracion)
+                            if estado >= 400:
+                                errores.append(estado)
+
+                monitor = _MonitorMemoria(proceso.pid)
+                monitor.start()
+                hilos = [threading.Thread(target=cliente) for _ in range(concurrencia)]
+                inicio = time.perf_counter()
+                for hilo in hilos:
+                    hilo.start()
+                for hilo in hilos:
+                    hilo.join()
+                duracion = time.perf_counter() - inicio
+
+                resultados[nombre] = _estadisticas(latencias, duracion, len(errores))
+                resultados[nombre]['pico_memoria_kib'] = monitor.parar()
+        finally:
+            proceso.terminate()
+            proceso.wait()
+    return resultados
+
+
+# Informe
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def imprimir(destino, resultados, base=None):
+    print(f'\n== {destino} ==')
+    print(f"{'caso':34s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'req/s':>9s} {'mem KiB':>10s} {'err':>4s}")
+    for nombre, r in resultados.items():
+        linea = (
+            f"{nombre:34s} {r['p50_ms']:9.2f} {r['p95_ms']:9.2f} {r['p99_ms']:9.2f} "
+            f"{r['rps']:9.1f} {r['pico_memoria_kib']:10.0f} {r['errores']:4d}"
+        )
+        anterior = (base or {}).get(destino, {}).get(nombre)
+        if anterior and anterior['p50_ms']:
+            cambio = (r['p50_ms'] - anterior['p50_ms']) / anterior['p50_ms'] * 100
+            linea += f'   p50 {cambio:+.1f}%'
+        print(linea)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--destino', choices=['cliente', 'gunicorn', 'ambos'], default='cliente')
+    parser.add_argument('--peticiones', type=int, default=100, help='peticiones por caso')
+    parser.add_argument('--tamanos', default=','.join(TAMANOS), help='tamaños de parte separados por coma')
+    parser.add_argument('--workers', type=int, default=2, help='workers de gunicorn')
+    parser.add_argument('--concurrencia', type=int, default=4, help='clientes concurrentes contra gunicorn')
+    parser.add_argument('--con-cache', action='store_true', help='no desactivar las cachés de PDF y de secciones')
+    parser.add_argument('--salida', help='guardar los resultados en este JSON')
+    parser.add_argument('--comparar', help='JSON de una ejecución anterior para comparar')
+    args = parser.parse_args()
+
+    if not args.con_cache:
+        # Sin caché (ni de PDF ni de secciones) cada descarga mide el renderizado real
+        os.environ['PARTE_CACHE_MB'] = '0'
+        os.environ['PARTE_CACHE_SECCIONES'] = '0'
+        os.environ.pop('PARTE_CACHE_DIR', None)
+
+    casos = _casos(args.tamanos.split(','))
+    base = None
+    if args.comparar:
+        with open(args.comparar) as archivo:
+            base = json.load(archivo)['resultados']
+
+    resultados = {}
+    if args.destino in ('cliente', 'ambos'):
+        resultados['cliente'] = medir_cliente(casos, args.peticiones)
+        imprimir('cliente', resultados['cliente'], base)
+    if args.destino in ('gunicorn', 'ambos'):
+        resultados['gunicorn'] = medir_gunicorn(casos, args.peticiones, args.workers, args.concurrencia)
+        imprimir('gunicorn', resultados['gunicorn'], base)
+
+    if args.salida:
+        with open(args.salida, 'w') as archivo:
+            json.dump({
+                'commit': _commit(),
+                'fecha': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'cpus': os.cpu_count(),
+                'parametros': vars(args),
+                'resultados': resultados,
+            }, archivo, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Utilidades compartidas por los benchmarks (payloads de ejemplo y medición)"""
+import os
+import statistics
+import sys
+import time
+
+# Permite ejecutar los scripts como `python benchmarks/bench_xxx.py` desde la raíz
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+# Las secciones de texto son las del parte: los payloads siguen al modelo
+from parte import SECCIONES
+
+_FRASE = (
+    'Paciente tranquilo durante la mañana, acepta la medicación sin dificultad '
+    'y se registra buena tolerancia oral. '
+)
+
+# Cantidad de frases por sección según el tamaño del parte
+TAMANOS = {
+    'corto': 1,
+    'tipico': 4,
+    'largo': 20,
+    'muy_largo': 120,
+}
+
+
+def parte_ejemplo(tamano='tipico', paciente='María López', fecha='2024-03-15'):
+    """Devuelve un parte con las diez secciones de texto completas"""
+    repeticiones = TAMANOS[tamano]
+    datos = {
+        'paciente': paciente,
+        'cuidadora': 'Ana Pérez',
+        'fecha': fecha,
+        'estado_general': 'Regular',
+    }
+    for seccion in SECCIONES:
+        datos[seccion] = f'{seccion}: ' + _FRASE * repeticiones
+    return datos
+
+
+def medir(funcion, repeticiones, calentamiento=3):
+    """Ejecuta `funcion` y devuelve la lista de duraciones en segundos"""
+    for _ in range(calentamiento):
+        funcion()
+    duraciones = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        duraciones.append(time.perf_counter() - inicio)
+    return duraciones
+
+
+def resumen(duraciones):
+    """Mediana y percentil 95 en milisegundos"""
+    ordenadas = sorted(duraciones)
+    p95 = ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.95))]
+    return {
+        'mediana_ms': statistics.median(ordenadas) * 1000,
+        'p95_ms': p95 * 1000,
+    }
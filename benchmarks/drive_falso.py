@@ -0,0 +1,263 @@
+"""Servidor HTTP que imita la parte de la API de Drive que usa archivo_drive.
+
+Implementa el token OAuth, files.list de carpetas y de ficheros por
+`appProperties`, files.create (JSON, batch y subida reanudable por trozos) y
+un resumen en /estado (con los PDF subidos más de una vez). Con --fallos
+responde 503 a una fracción de las peticiones (y de las partes de cada
+batch), para probar los reintentos y la reanudación de las subidas. Con
+--perdidas una fracción de los batch crea las carpetas y aun así responde
+503, como si se perdiera la respuesta: no debe haber carpetas duplicadas.
+
+Uso:
+    python benchmarks/drive_falso.py --puerto 8099 --credenciales /tmp/drive.json --fallos 0.1
+    PARTE_DRIVE_CREDENCIALES=/tmp/drive.json PARTE_DRIVE_ENDPOINT=http://127.0.0.1:8099 python app.py
+    curl http://127.0.0.1:8099/estado
+"""
+import argparse
+import email.parser
+import email.policy
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+TIPO_CARPETA = 'application/vnd.google-apps.folder'
+
+
+class Drive:
+    """Estado en memoria: ficheros (incluidas carpetas) y subidas en curso"""
+
+    def __init__(self):
+        self.ficheros = {}
+        self.subidas = {}
+        self.peticiones = 0
+        self.fallos = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def crear(self, metadatos, contenido=None):
+        with self._lock:
+            fichero = dict(metadatos, id=f'f{next(self._ids)}')
+            if contenido is not None:
+                fichero['size'] = len(contenido)
+            self.ficheros[fichero['id']] = fichero
+            return {'id': fichero['id'], 'name': fichero.get('name')}
+
+    def buscar(self, consulta):
+        if 'appProperties has' in consulta:
+            return self.buscar_propiedades(consulta)
+        nombres = {re.sub(r"\\(.)", r'\1', n) for n in re.findall(r"name = '((?:\\.|[^'])*)'", consulta)}
+        padre = re.search(r"'((?:\\.|[^'])*)' in parents", consulta)
+        with self._lock:
+            return [
+                {'id': f['id'], 'name': f['name']}
+                for f in self.ficheros.values()
+                if f.get('mimeType') == TIPO_CARPETA and f.get('name') in nombres
+                and (padre is None or padre.group(1) in f.get('parents', []))
+            ]
+
+    def buscar_propiedades(self, consulta):
+        propiedades = {
+            (re.sub(r"\\(.)", r'\1', clave), re.sub(r"\\(.)", r'\1', valor))
+            for clave, valor in re.findall(
+                r"appProperties has \{ key='((?:\\.|[^'])*)' and value='((?:\\.|[^'])*)' \}", consulta
+            )
+        }
+        with self._lock:
+            return [
+                {'id': f['id'], 'appProperties': f['appProperties']}
+                for f in self.ficheros.values()
+                if propiedades & set(f.get('appProperties', {}).items())
+            ]
+
+    def estado(self):
+        with self._lock:
+            carpetas = {f['id']: f['name'] for f in self.ficheros.values() if f.get('mimeType') == TIPO_CARPETA}
+            pdfs = [f for f in self.ficheros.values() if f.get('mimeType') != TIPO_CARPETA]
+            return {
+                'peticiones': self.peticiones,
+                'fallos_simulados': self.fallos,
+                'carpetas': sorted(carpetas.values()),
+                'pdfs': len(pdfs),
+                'bytes': sum(f.get('size', 0) for f in pdfs),
+                'duplicados': len(pdfs) - len({f.get('appProperties', {}).get('clave_parte', f['id']) for f in pdfs}),
+                'por_carpeta': {
+                    nombre: sum(1 for f in pdfs if id_carpeta in f.get('parents', []))
+                    for id_carpeta, nombre in carpetas.items()
+                },
+                'subidas_en_curso': len(self.subidas),
+            }
+
+
+class Manejador(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    drive = None
+    prob_fallo = 0.0
+    prob_perdida = 0.0
+    latencia = 0.0
+
+    def log_message(self, formato, *args):
+        pass
+
+    def _cuerpo(self):
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def _responder(self, estado, cuerpo=b'', tipo='application/json', cabeceras=()):
+        if isinstance(cuerpo, (dict, list)):
+            cuerpo = json.dumps(cuerpo).encode('utf-8')
+        self.send_response(estado)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(cuerpo)))
+        for nombre, valor in cabeceras:
+            self.send_header(nombre, valor)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def _simular(self):
+        """Latencia y fallos simulados; devuelve True si la petición debe fallar"""
+        self.drive.peticiones += 1
+        if self.latencia:
+            time.sleep(self.latencia)
+        if random.random() < self.prob_fallo:
+            self.drive.fallos += 1
+            self._cuerpo()
+            self._responder(503, {'error': {'code': 503, 'message': 'Fallo simulado'}})
+            return True
+        return False
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/estado':
+            return self._responder(200, self.drive.estado())
+        if self._simular():
+            return
+        if url.path == '/drive/v3/files':
+            return self._listar(url.query)
+        self._responder(404, {'error': {'code': 404}})
+
+    def _listar(self, parametros):
+        consulta = parse_qs(parametros).get('q', [''])[0]
+        return self._responder(200, {'files': self.drive.buscar(consulta)})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path == '/token':
+            self._cuerpo()
+            return self._responder(200, {'access_token': 'falso', 'expires_in': 3600, 'token_type': 'Bearer'})
+        if self._simular():
+            return
+        cuerpo = self._cuerpo()
+        if self.headers.get('X-HTTP-Method-Override') == 'GET':
+            # El cliente de Google manda así los files.list con una `q` muy larga
+            return self._listar(cuerpo.decode('utf-8'))
+        if url.path == '/drive/v3/files':
+            return self._responder(200, self.drive.crear(json.loads(cuerpo)))
+        if url.path == '/batch/drive/v3':
+            return self._batch(cuerpo)
+        if url.path == '/upload/drive/v3/files' and 'uploadType=resumable' in url.query:
+            id_subida = f's{len(self.drive.subidas) + 1}-{random.getrandbits(32)}'
+            self.drive.subidas[id_subida] = (json.loads(cuerpo or b'{}'), bytearray())
+            ubicacion = f'http://{self.headers["Host"]}/upload/drive/v3/files?uploadType=resumable&upload_id={id_subida}'
+            return self._responder(200, b'', cabeceras=[('Location', ubicacion)])
+        self._responder(404, {'error': {'code': 404}})
+
+    def do_PUT(self):
+        url = urlsplit(self.path)
+        if self._simular():
+            return
+        id_subida = parse_qs(url.query).get('upload_id', [''])[0]
+        if id_subida not in self.drive.subidas:
+            self._cuerpo()
+            return self._responder(404, {'error': {'code': 404}})
+        metadatos, recibido = self.drive.subidas[id_subida]
+        cuerpo = self._cuerpo()
+        rango = re.match(r'bytes (\*|(\d+)-(\d+))/(\d+|\*)', self.headers.get('Content-Range', ''))
+        if rango and rango.group(1) != '*':
+            inicio = int(rango.group(2))
+            del recibido[inicio:]
+            recibido.extend(cuerpo)
+        total = rango.group(4) if rango else '*'
+        if total != '*' and len(recibido) >= int(total):
+            del self.drive.subidas[id_subida]
+            return self._responder(200, self.drive.crear(metadatos, bytes(recibido)))
+        cabeceras = [('Range', f'bytes=0-{len(recibido) - 1}')] if recibido else []
+        self._responder(308, b'', cabeceras=cabeceras)
+
+    def _batch(self, cuerpo):
+        frontera = self.headers.get_boundary() or re.search(r'boundary="?([^";]+)', self.headers['Content-Type']).group(1)
+        mensaje = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            f'Content-Type: multipart/mixed; boundary="{frontera}"\r\n\r\n'.encode() + cuerpo
+        )
+        respuesta = []
+        for parte in mensaje.iter_parts():
+            peticion = parte.get_payload(decode=True).decode('utf-8')
+            _, _, json_peticion = peticion.partition('\r\n\r\n') if '\r\n\r\n' in peticion else peticion.partition('\n\n')
+            if random.random() < self.prob_fallo:
+                self.drive.fallos += 1
+                estado, creado = '503 Service Unavailable', json.dumps({'error': {'code': 503, 'message': 'Fallo simulado'}})
+            else:
+                estado, creado = '200 OK', json.dumps(self.drive.crear(json.loads(json_peticion)))
+            id_respuesta = parte['Content-ID'].replace('<', '<response-', 1)
+            respuesta.append(
+                f'--respuesta\r\nContent-Type: application/http\r\nContent-ID: {id_respuesta}\r\n\r\n'
+                f'HTTP/1.1 {estado}\r\nContent-Type: application/json\r\nContent-Length: {len(creado)}\r\n\r\n'
+                f'{creado}\r\n'
+            )
+        respuesta.append('--respuesta--\r\n')
+        if random.random() < self.prob_perdida:
+            self.drive.fallos += 1
+            return self._responder(503, {'error': {'code': 503, 'message': 'Respuesta perdida simulada'}})
+        self._responder(200, ''.join(respuesta).encode('utf-8'), tipo='multipart/mixed; boundary=respuesta')
+
+
+def escribir_credenciales(ruta, puerto):
+    """Cuenta de servicio con una clave nueva cuyo token_uri es este servidor"""
+    # Las credenciales de usuario autorizado siempre piden el token a Google;
+    # las de cuenta de servicio respetan token_uri
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    clave = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = clave.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption(),
+    ).decode('ascii')
+    with open(ruta, 'w') as f:
+        json.dump({
+            'type': 'service_account',
+            'project_id': 'falso',
+            'private_key_id': 'falso',
+            'private_key': pem,
+            'client_email': 'archivo@falso.iam.gserviceaccount.com',
+            'client_id': 'falso',
+            'token_uri': f'http://127.0.0.1:{puerto}/token',
+        }, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--puerto', type=int, default=8099)
+    parser.add_argument('--fallos', type=float, default=0.0, help='fracción de peticiones que responden 503')
+    parser.add_argument('--perdidas', type=float, default=0.0,
+                        help='fracción de batch que crean las carpetas y responden 503')
+    parser.add_argument('--latencia', type=float, default=0.0, help='segundos de espera por petición')
+    parser.add_argument('--credenciales', help='escribe aquí unas credenciales que apuntan a este servidor')
+    args = parser.parse_args()
+
+    if args.credenciales:
+        escribir_credenciales(args.credenciales, args.puerto)
+
+    Manejador.drive = Drive()
+    Manejador.prob_fallo = args.fallos
+    Manejador.prob_perdida = args.perdidas
+    Manejador.latencia = args.latencia
+    servidor = ThreadingHTTPServer(('127.0.0.1', args.puerto), Manejador)
+    print(f'Drive falso en http://127.0.0.1:{args.puerto} (fallos={args.fallos}, perdidas={args.perdidas})')
+    servidor.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""Caché de PDF direccionada por contenido.
+
+La clave es un hash estable del parte normalizado, de la versión del diseño
+y de la huella de las fuentes instaladas (fuentes.huella_fuentes, calculada
+una vez al importar el módulo), seguido de la fecha de generación que se
+imprime en el PDF (clave_pdf): la misma clave son siempre los mismos bytes,
+y sirve también de ETag. Hay un nivel en memoria (LRU acotado por
+bytes, propio de cada worker) y un nivel opcional en disco compartido por
+todos los workers de gunicorn de la máquina.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from fuentes import huella_fuentes
+from parte import Parte
+
+# Se incrementa cuando cambia el diseño del PDF para invalidar la caché
+VERSION_RENDER = '5'
+
+# Los workers o máquinas con otras fuentes generan otros bytes: otra clave
+_VERSION = f'{VERSION_RENDER}:{huella_fuentes()}'
+
+
+def clave_parte(datos, motor='platypus'):
+    """Hash SHA-256 del parte normalizado, la versión y las fuentes (y del motor, si no es el predeterminado)"""
+    normalizado = Parte.de(datos).como_dict()
+    serializado = json.dumps(normalizado, sort_keys=True, ensure_ascii=False)
+    version = _VERSION if motor == 'platypus' else f'{_VERSION}:{motor}'
+    return hashlib.sha256(f'{version}\n{serializado}'.encode('utf-8')).hexdigest()
+
+
+def clave_pdf(clave, generado):
+    """Clave de los bytes de un PDF: la del parte y la fecha de generación (al minuto)"""
+    return f"{clave}-{generado.strftime('%Y%m%d%H%M')}"
+
+
+class CachePDF:
+    """Caché LRU en memoria con un nivel opcional en disco"""
+
+    # Cada cuántas escrituras en disco se revisa el tamaño del directorio
+    PODA_CADA = 50
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, directorio=None, max_bytes_disco=1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.directorio = directorio
+        self.max_bytes_disco = max_bytes_disco
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._escrituras_disco = 0
+        self._lock = threading.Lock()
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+
+    @classmethod
+    def desde_entorno(cls):
+        return cls(
+            max_bytes=int(float(os.environ.get('PARTE_CACHE_MB', 64)) * 1024 * 1024),
+            directorio=os.environ.get('PARTE_CACHE_DIR') or None,
+            max_bytes_disco=int(float(os.environ.get('PARTE_CACHE_DISCO_MB', 1024)) * 1024 * 1024),
+        )
+
+    # Nivel en memoria
+
+    def _leer_memoria(self, clave):
+        with self._lock:
+            pdf = self._entradas.get(clave)
+            if pdf is not None:
+                self._entradas.move_to_end(clave)
+            return pdf
+
+    def _guardar_memoria(self, clave, pdf):
+        if len(pdf) > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._entradas.pop(clave, None)
+            if anterior is not None:
+                self._bytes -= len(anterior)
+            self._entradas[clave] = pdf
+            self._bytes += len(pdf)
+            while self._bytes > self.max_bytes:
+                _, expulsado = self._entradas.popitem(last=False)
+                self._bytes -= len(expulsado)
+
+    # Nivel en disco
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, clave[:2], f'{clave}.pdf')
+
+    def _leer_disco(self, clave):
+        if not self.directorio:
+            return None
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, 'rb') as archivo:
+                pdf = archivo.read()
+        except FileNotFoundError:
+            return None
+        # Actualiza la fecha de acceso para que la poda sea LRU
+        try:
+            os.utime(ruta)
+        except OSError:
+            pass
+        return pdf
+
+    def _guardar_disco(self, clave, pdf):
+        if not self.directorio:
+            return
+        ruta = self._ruta(clave)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        # Escritura atómica: otros workers nunca ven un archivo a medias
+        descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as archivo:
+                archivo.write(pdf)
+            os.replace(temporal, ruta)
+        except BaseException:
+            os.unlink(temporal)
+            raise
+
+        with self._lock:
+            self._escrituras_disco += 1
+            podar = self._escrituras_disco % self.PODA_CADA == 0
+        if podar:
+            self.podar_disco()
+
+    def podar_disco(self):
+        """Elimina los archivos usados hace más tiempo hasta respetar el límite"""
+        archivos = []
+        total = 0
+        for raiz, _, nombres in os.walk(self.directorio):
+            for nombre in nombres:
+                if not nombre.endswith('.pdf'):
+                    continue
+                ruta = os.path.join(raiz, nombre)
+                try:
+                    info = os.stat(ruta)
+                except FileNotFoundError:
+                    continue
+                archivos.append((info.st_mtime, info.st_size, ruta))
+                total += info.st_size
+        archivos.sort()
+        for _, tamano, ruta in archivos:
+            if total <= self.max_bytes_disco:
+                break
+            try:
+                os.unlink(ruta)
+            except FileNotFoundError:
+                pass
+            total -= tamano
+
+    # API pública
+
+    def obtener(self, clave):
+        """Devuelve (pdf, nivel) o (None, None) si la clave no está en caché"""
+        pdf = self._leer_memoria(clave)
+        if pdf is not None:
+            return pdf, 'memoria'
+        pdf = self._leer_disco(clave)
+        if pdf is not None:
+            self._guardar_memoria(clave, pdf)
+            return pdf, 'disco'
+        return None, None
+
+    def guardar(self, clave, pdf):
+        self._guardar_memoria(clave, pdf)
+        self._guardar_disco(clave, pdf)
+
+    def obtener_o_generar(self, datos, generar, motor='platypus'):
+        """Devuelve (pdf, nivel); nivel es None cuando el PDF se acaba de generar"""
+        parte = Parte.de(datos)
+        clave = clave_pdf(clave_parte(parte, motor), parte.generado)
+        pdf, nivel = self.obtener(clave)
+        if pdf is None:
+            pdf = generar(parte, motor)
+            self.guardar(clave, pdf)
+        return pdf, nivel
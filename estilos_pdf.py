@@ -0,0 +1,170 @@
+"""Registro de estilos del PDF del parte diario.
+
+Los estilos de ReportLab se construyen una sola vez por proceso (en el primer
+uso) y se comparten entre todas las peticiones. Los objetos del registro se
+consideran de solo lectura: nadie debe modificarlos después de creados.
+Las fuentes son las de fuentes.py (DejaVu Sans, en static/fonts).
+"""
+from collections import namedtuple
+from functools import lru_cache
+from types import MappingProxyType
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import TableStyle
+
+from fuentes import registrar_fuentes
+
+# Paleta del parte (la misma que usa la vista HTML)
+COLORES = MappingProxyType({
+    'titulo': colors.HexColor('#2c3e50'),
+    'subtitulo': colors.HexColor('#7f8c8d'),
+    'seccion': colors.HexColor('#3498db'),
+    'texto': colors.HexColor('#2c3e50'),
+    'fondo_etiqueta': colors.HexColor('#f8f9fa'),
+    'borde': colors.HexColor('#e0e0e0'),
+    'alerta_texto': colors.HexColor('#721c24'),
+    'alerta_fondo': colors.HexColor('#f8d7da'),
+})
+
+EstilosPDF = namedtuple('EstilosPDF', [
+    'titulo',
+    'subtitulo',
+    'seccion',
+    'contenido',
+    'firma',
+    'alerta',
+    'titulo_dia',
+    'footer',
+    'info_tabla',
+    'celda',
+])
+
+
+def construir_estilos():
+    """Construye el conjunto completo de estilos (sin caché)"""
+    styles = getSampleStyleSheet()
+    fuentes = registrar_fuentes()
+
+    titulo_style = ParagraphStyle(
+        'Titulo',
+        parent=styles['Heading1'],
+        fontName=fuentes.negrita,
+        fontSize=24,
+        textColor=COLORES['titulo'],
+        alignment=TA_CENTER,
+        spaceAfter=30
+    )
+
+    subtitulo_style = ParagraphStyle(
+        'Subtitulo',
+        parent=styles['Heading2'],
+        fontName=fuentes.negrita,
+        fontSize=12,
+        textColor=COLORES['subtitulo'],
+        alignment=TA_CENTER,
+        spaceAfter=40
+    )
+
+    seccion_style = ParagraphStyle(
+        'Seccion',
+        parent=styles['Heading2'],
+        fontName=fuentes.negrita,
+        fontSize=14,
+        textColor=COLORES['seccion'],
+        spaceAfter=12,
+        spaceBefore=20
+    )
+
+    contenido_style = ParagraphStyle(
+        'Contenido',
+        parent=styles['Normal'],
+        fontName=fuentes.normal,
+        fontSize=11,
+        textColor=COLORES['texto'],
+        leading=14,
+        spaceAfter=10
+    )
+
+    firma_style = ParagraphStyle(
+        'Firma',
+        parent=styles['Normal'],
+        fontName=fuentes.normal,
+        fontSize=12,
+        textColor=colors.black,
+        alignment=TA_LEFT,
+        spaceBefore=20
+    )
+
+    alerta_style = ParagraphStyle(
+        'Alerta',
+        parent=styles['Normal'],
+        fontName=fuentes.normal,
+        fontSize=11,
+        textColor=COLORES['alerta_texto'],
+        backColor=COLORES['alerta_fondo'],
+        borderPadding=10,
+        leading=14
+    )
+
+    # Encabezado de cada día en los informes de varios días
+    titulo_dia_style = ParagraphStyle(
+        'TituloDia',
+        parent=styles['Heading2'],
+        fontName=fuentes.negrita,
+        fontSize=16,
+        textColor=COLORES['titulo'],
+        spaceBefore=30,
+        spaceAfter=6,
+        keepWithNext=1
+    )
+
+    footer_style = ParagraphStyle(
+        'Footer',
+        parent=styles['Normal'],
+        fontName=fuentes.normal,
+        fontSize=9,
+        textColor=colors.gray,
+        alignment=TA_CENTER
+    )
+
+    info_tabla_style = TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), COLORES['fondo_etiqueta']),
+        ('TEXTCOLOR', (0, 0), (0, -1), COLORES['subtitulo']),
+        ('FONTNAME', (0, 0), (0, -1), fuentes.negrita),
+        ('FONTNAME', (1, 0), (1, -1), fuentes.normal),
+        ('FONTSIZE', (0, 0), (-1, -1), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+        ('TOPPADDING', (0, 0), (-1, -1), 12),
+        ('GRID', (0, 0), (-1, -1), 1, COLORES['borde']),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ])
+
+    # Valor de la tabla de información escrito como párrafo (el de info_tabla)
+    celda_style = ParagraphStyle(
+        'Celda',
+        parent=styles['Normal'],
+        fontName=fuentes.normal,
+        fontSize=11,
+        leading=13.2
+    )
+
+    return EstilosPDF(
+        titulo=titulo_style,
+        subtitulo=subtitulo_style,
+        seccion=seccion_style,
+        contenido=contenido_style,
+        firma=firma_style,
+        alerta=alerta_style,
+        titulo_dia=titulo_dia_style,
+        footer=footer_style,
+        info_tabla=info_tabla_style,
+        celda=celda_style,
+    )
+
+
+@lru_cache(maxsize=None)
+def obtener_estilos():
+    """Devuelve el registro de estilos compartido por el proceso"""
+    return construir_estilos()
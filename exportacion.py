@@ -0,0 +1,105 @@
+"""Exportación de los partes guardados en CSV, JSONL o Parquet, en trozos.
+
+Los tres formatos reciben las filas de Almacen.exportar (tuplas de COLUMNAS)
+y devuelven un generador de bytes: cada trozo sale en cuanto se llena, de
+modo que la respuesta empieza a enviarse antes de que termine la consulta y
+la memoria no depende del número de partes. Las columnas id y creado se
+incluyen y la importación (importacion.py) las ignora.
+
+Parquet es el formato por columnas para análisis; pyarrow se importa en la
+primera exportación en ese formato. Cada grupo de filas del archivo se
+envía al escribirlo y el pie con los metadatos al final.
+"""
+import csv
+import importlib.util
+import io
+import json
+
+from almacenamiento import COLUMNAS
+from salida_pdf import TAMANO_TROZO, SalidaEnTrozos
+
+# Filas por grupo de filas (row group) de Parquet
+FILAS_POR_GRUPO = 10000
+
+
+def _csv(filas):
+    # Con BOM, para que las hojas de cálculo lo abran como UTF-8
+    texto = io.StringIO()
+    texto.write('\ufeff')
+    escritor = csv.writer(texto)
+    escritor.writerow(COLUMNAS)
+    for fila in filas:
+        escritor.writerow(fila)
+        if texto.tell() >= TAMANO_TROZO:
+            yield texto.getvalue().encode('utf-8')
+            texto.seek(0)
+            texto.truncate()
+    yield texto.getvalue().encode('utf-8')
+
+
+def _jsonl(filas):
+    pendiente = []
+    tamano = 0
+    for fila in filas:
+        linea = json.dumps(dict(zip(COLUMNAS, fila)), ensure_ascii=False) + '\n'
+        pendiente.append(linea)
+        tamano += len(linea)
+        if tamano >= TAMANO_TROZO:
+            yield ''.join(pendiente).encode('utf-8')
+            pendiente = []
+            tamano = 0
+    yield ''.join(pendiente).encode('utf-8')
+
+
+def _esquema_parquet(pa):
+    return pa.schema([(columna, pa.int64() if columna == 'id' else pa.string()) for columna in COLUMNAS])
+
+
+def _parquet(filas):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    esquema = _esquema_parquet(pa)
+    salida = SalidaEnTrozos()
+    escritor = pq.ParquetWriter(salida, esquema, compression='zstd')
+    columnas = [[] for _ in COLUMNAS]
+
+    def grupo():
+        tabla = pa.Table.from_arrays(
+            [pa.array(valores, type=campo.type) for valores, campo in zip(columnas, esquema)], schema=esquema,
+        )
+        escritor.write_table(tabla)
+        for valores in columnas:
+            valores.clear()
+        return salida.vaciar()
+
+    for fila in filas:
+        for valores, valor in zip(columnas, fila):
+            valores.append(valor)
+        if len(columnas[0]) >= FILAS_POR_GRUPO:
+            yield grupo()
+    if columnas[0]:
+        yield grupo()
+    escritor.close()
+    yield salida.vaciar()
+
+
+# Formato -> (generador, tipo MIME, extensión)
+FORMATOS = {
+    'csv': (_csv, 'text/csv', 'csv'),
+    'jsonl': (_jsonl, 'application/x-ndjson', 'jsonl'),
+    'parquet': (_parquet, 'application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def disponible(formato):
+    """Indica si el formato puede generarse (Parquet necesita pyarrow)"""
+    return formato != 'parquet' or importlib.util.find_spec('pyarrow') is not None
+
+
+def exportar(filas, formato):
+    """Genera en trozos de bytes el archivo `formato` con las filas dadas"""
+    generador = FORMATOS[formato][0]
+    for trozo in generador(filas):
+        if trozo:
+            yield trozo
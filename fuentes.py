@@ -0,0 +1,199 @@
+"""Fuentes TrueType del PDF: registro, cobertura de caracteres y respaldo.
+
+La Helvetica estándar de ReportLab solo tiene los caracteres de WinAnsi; con
+DejaVu Sans (o la fuente de PARTE_FUENTE) el PDF muestra cualquier carácter
+que tenga la fuente. DejaVu Sans, su negrita y Noto Emoji van con la
+aplicación en static/fonts, así que todas las máquinas generan los mismos
+bytes; las fuentes del sistema solo se usan para las que falten ahí.
+
+Las fuentes se registran en ReportLab una vez por proceso, en el primer uso
+de los estilos, y con ellas quedan cargadas sus métricas: el ancho de cada
+glifo y la tabla carácter -> glifo, que aquí da la cobertura de cada fuente.
+
+ReportLab incrusta de cada fuente TrueType solo los glifos que usa el
+documento (subconjuntos de hasta 256 glifos), así que un parte lleva unos
+pocos KB de fuente en lugar del archivo completo.
+
+Los caracteres que no tiene la fuente principal (p. ej. emoji) se escriben
+con la primera fuente de respaldo que los tenga: PARTE_FUENTES_RESPALDO
+(rutas separadas por os.pathsep) o Noto Emoji y, si están instaladas,
+Symbola y Noto Sans Symbols 2. Sin DejaVu, o con PARTE_FUENTE=Helvetica, se
+usa Helvetica como hasta ahora.
+
+Los bytes del PDF dependen de estas fuentes, así que su huella forma parte
+de la clave de la caché (cache_pdf). Por eso el módulo no importa ReportLab
+hasta que se registran las fuentes: la huella se calcula al arrancar la
+aplicación, que no carga ReportLab.
+"""
+import hashlib
+import logging
+import os
+from collections import namedtuple
+from functools import lru_cache
+from itertools import groupby
+
+logger = logging.getLogger(__name__)
+
+# Fuentes que acompañan a la aplicación (tienen preferencia sobre las del sistema)
+DIRECTORIO_PROPIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'fonts')
+
+DIRECTORIOS_FUENTES = (
+    DIRECTORIO_PROPIO,
+    '/usr/share/fonts',
+    '/usr/local/share/fonts',
+    os.path.expanduser('~/.fonts'),
+    '/Library/Fonts',
+    '/System/Library/Fonts',
+    r'C:\Windows\Fonts',
+)
+
+# Archivos que se buscan en DIRECTORIOS_FUENTES si no se indican rutas
+FUENTE = 'DejaVuSans.ttf'
+FUENTE_NEGRITA = 'DejaVuSans-Bold.ttf'
+RESPALDOS = ('NotoEmoji-Regular.ttf', 'Symbola.ttf', 'NotoSansSymbols2-Regular.ttf')
+
+ESTANDAR = ('Helvetica', 'Helvetica-Bold')
+
+Fuentes = namedtuple('Fuentes', ['normal', 'negrita', 'respaldo'])
+
+
+@lru_cache(maxsize=None)
+def fuentes_instaladas():
+    """Nombre de archivo -> ruta de las fuentes TrueType disponibles (se recorre una vez)"""
+    encontradas = {}
+    for directorio in DIRECTORIOS_FUENTES:
+        for raiz, _, nombres in os.walk(directorio):
+            for nombre in nombres:
+                if nombre.lower().endswith('.ttf'):
+                    encontradas.setdefault(nombre, os.path.join(raiz, nombre))
+    return encontradas
+
+
+@lru_cache(maxsize=None)
+def rutas_fuentes():
+    """Rutas (normal, negrita, respaldos) de las fuentes; normal y negrita son None con Helvetica"""
+    normal = os.environ.get('PARTE_FUENTE') or fuentes_instaladas().get(FUENTE)
+    if not normal or normal == ESTANDAR[0]:
+        normal = negrita = None
+    else:
+        negrita = os.environ.get('PARTE_FUENTE_NEGRITA')
+        if not negrita and os.path.basename(normal) == FUENTE:
+            negrita = fuentes_instaladas().get(FUENTE_NEGRITA)
+        negrita = negrita or normal
+
+    rutas = os.environ.get('PARTE_FUENTES_RESPALDO')
+    if rutas is not None:
+        respaldo = [ruta for ruta in rutas.split(os.pathsep) if ruta]
+    else:
+        respaldo = [fuentes_instaladas()[nombre] for nombre in RESPALDOS if nombre in fuentes_instaladas()]
+    return normal, negrita, tuple(respaldo)
+
+
+@lru_cache(maxsize=None)
+def huella_fuentes():
+    """Hash corto del contenido de las fuentes que usará el PDF"""
+    resumen = hashlib.sha256()
+    normal, negrita, respaldo = rutas_fuentes()
+    for ruta in (normal, negrita, *respaldo):
+        if ruta is None:
+            resumen.update(ESTANDAR[0].encode())
+            continue
+        try:
+            with open(ruta, 'rb') as archivo:
+                resumen.update(hashlib.sha256(archivo.read()).digest())
+        except OSError:
+            # Fallará al registrarla; la ruta basta para distinguirla
+            resumen.update(ruta.encode())
+    return resumen.hexdigest()[:12]
+
+
+def _registrar(ruta):
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    nombre = os.path.splitext(os.path.basename(ruta))[0]
+    if nombre not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(nombre, ruta))
+    return nombre
+
+
+@lru_cache(maxsize=None)
+def registrar_fuentes():
+    """Registra las fuentes del PDF (una vez por proceso) y devuelve sus nombres"""
+    from reportlab.pdfbase import pdfmetrics
+
+    ruta, ruta_negrita, rutas = rutas_fuentes()
+    if ruta is None:
+        if os.environ.get('PARTE_FUENTE') != ESTANDAR[0]:
+            logger.warning('No se encontró %s: el PDF usará Helvetica', FUENTE)
+        normal, negrita = ESTANDAR
+    else:
+        normal = _registrar(ruta)
+        negrita = _registrar(ruta_negrita)
+        pdfmetrics.registerFontFamily(normal, normal=normal, bold=negrita, italic=normal, boldItalic=negrita)
+    respaldo = tuple(_registrar(ruta) for ruta in rutas)
+    return Fuentes(normal=normal, negrita=negrita, respaldo=respaldo)
+
+
+@lru_cache(maxsize=None)
+def cobertura(nombre):
+    """Códigos de los caracteres que tiene la fuente registrada `nombre`"""
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    fuente = pdfmetrics.getFont(nombre)
+    if isinstance(fuente, TTFont):
+        return frozenset(fuente.face.charToGlyph)
+    # Fuentes Type 1 estándar: los caracteres de WinAnsi
+    return frozenset(map(ord, bytes(range(32, 256)).decode('cp1252', 'ignore')))
+
+
+@lru_cache(maxsize=None)
+def _cubre_latin1(nombre):
+    caracteres = cobertura(nombre)
+    return all(codigo in caracteres for codigo in [*range(0x20, 0x7f), *range(0xa0, 0x100)])
+
+
+@lru_cache(maxsize=4096)
+def fuente_respaldo(caracter):
+    """Fuente de respaldo con la que se escribe `caracter`, o None si basta la principal"""
+    fuentes = registrar_fuentes()
+    codigo = ord(caracter)
+    if caracter.isspace() or codigo in cobertura(fuentes.normal):
+        return None
+    for nombre in fuentes.respaldo:
+        if codigo in cobertura(nombre):
+            return nombre
+    # Ninguna fuente lo tiene: se queda en la principal
+    return None
+
+
+def _latin1(texto):
+    try:
+        texto.encode('latin-1')
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+def necesita_respaldo(texto):
+    """Indica si algún carácter de `texto` se escribe con una fuente de respaldo"""
+    fuentes = registrar_fuentes()
+    if not fuentes.respaldo or (_cubre_latin1(fuentes.normal) and _latin1(texto)):
+        return False
+    return any(map(fuente_respaldo, texto))
+
+
+def con_respaldo(texto):
+    """Envuelve en <font> los tramos de `texto` que no tiene la fuente principal.
+
+    `texto` es marcado de Paragraph ya escapado: las etiquetas y entidades son
+    ASCII y las tiene cualquier fuente, así que nunca se parten.
+    """
+    if not necesita_respaldo(texto):
+        return texto
+    partes = []
+    for nombre, caracteres in groupby(texto, key=fuente_respaldo):
+        tramo = ''.join(caracteres)
+        partes.append(f'<font face="{nombre}">{tramo}</font>' if nombre else tramo)
+    return ''.join(partes)
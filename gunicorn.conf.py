@@ -0,0 +1,53 @@
+"""Configuración de gunicorn (se lee automáticamente desde este directorio).
+
+Con PARTE_PRECARGAR=1 el proceso maestro carga la aplicación y sus
+subsistemas pesados (ReportLab, estilos, motores de PDF y el cliente de
+Google) antes de crear los workers: cada worker arranca ya listo y comparte
+esas páginas de memoria con el maestro. Sin la variable, cada worker importa
+solo lo que usa, en su primer uso.
+
+Con PARTE_METRICAS_DIR el maestro vacía el directorio de métricas al
+arrancar (es el único sitio donde se borra) y, cuando un worker termina,
+pasa sus valores a los archivados (metricas.py): /metrics sigue sumándolos
+y los contadores no bajan cuando gunicorn recicla o reinicia un worker.
+
+Cada worker arranca en post_fork los hilos de la cola de trabajos, para que
+los trabajos pendientes se retomen tras un reinicio sin esperar a que llegue
+una petición.
+"""
+import os
+
+PRECARGAR = os.environ.get('PARTE_PRECARGAR') == '1'
+
+if PRECARGAR:
+    preload_app = True
+
+
+def on_starting(server):
+    import atexit
+
+    from metricas import registro
+    registro.vaciar_directorio()
+    # El maestro no atiende peticiones: no deja archivo de métricas al salir.
+    # Los workers heredan la baja y vuelcan en worker_exit
+    atexit.unregister(registro.volcar)
+
+    if PRECARGAR:
+        from app import precargar
+        precargar()
+
+
+def post_fork(server, worker):
+    from app import cola_trabajos
+    cola_trabajos.arrancar()
+
+
+def worker_exit(server, worker):
+    from metricas import registro
+    # Últimos valores del worker, que el maestro archivará en child_exit
+    registro.volcar(esperar=True)
+
+
+def child_exit(server, worker):
+    from metricas import registro
+    registro.archivar_proceso(worker.pid)
@@ -0,0 +1,326 @@
+"""Importación masiva de partes históricos desde un archivo JSONL o CSV.
+
+    flask --app app importar partes.jsonl --salida pdf/
+    flask --app app importar partes.csv --salida partes.zip --procesos 8
+
+El archivo se lee registro a registro y cada uno pasa por la misma validación
+que la API JSON (validar_json); en una importación la fecha es además
+obligatoria. Los partes válidos se renderizan por trozos en un pool de
+procesos con un máximo de trozos en vuelo, así que la memoria no depende del
+tamaño del archivo. Los PDF se escriben en un directorio o en una serie de
+ZIP de tamaño fijo (partes-00001.zip, partes-00002.zip, ...), y los
+registros rechazados en <salida>.errores.jsonl.
+
+El punto de control (<salida>.punto-control.json) guarda cuántos registros
+están ya escritos; repitiendo la orden con la misma salida se continúa desde
+ahí. Con ZIP solo se guarda al cerrar cada archivo de la serie, porque un ZIP
+a medio escribir no se puede ampliar.
+"""
+import csv
+import json
+import multiprocessing
+import os
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from parte import Parte, validar_json
+from renderizado import generar_con_motor
+
+FORMATOS = ('jsonl', 'csv')
+
+# Columnas que no son campos del parte pero vienen en las exportaciones: se ignoran
+COLUMNAS_IGNORADAS = ('id', 'creado')
+
+
+def formato_de(ruta):
+    """Formato de un archivo según su extensión ('jsonl' o 'csv')"""
+    extension = os.path.splitext(ruta)[1].lower().lstrip('.')
+    return {'json': 'jsonl', 'ndjson': 'jsonl'}.get(extension, extension)
+
+
+def leer_registros(ruta, formato):
+    """Genera (número, objeto) por cada registro; objeto es None si la línea no es JSON"""
+    with open(ruta, encoding='utf-8-sig', newline='') as archivo:
+        if formato == 'csv':
+            yield from enumerate(csv.DictReader(archivo), 1)
+            return
+        numero = 0
+        for linea in archivo:
+            if not linea.strip():
+                continue
+            numero += 1
+            try:
+                objeto = json.loads(linea)
+            except ValueError:
+                objeto = None
+            yield numero, objeto
+
+
+def validar_registro(objeto):
+    """Devuelve (parte, None) si el registro es válido o (None, errores) si no"""
+    if isinstance(objeto, dict):
+        objeto = {campo: valor for campo, valor in objeto.items() if campo not in COLUMNAS_IGNORADAS}
+    errores = validar_json(objeto)
+    if isinstance(objeto, dict) and 'fecha' not in errores and not (objeto.get('fecha') or '').strip():
+        errores['fecha'] = 'Campo obligatorio'
+    if errores:
+        return None, errores
+    return Parte(dict(objeto, fecha=objeto['fecha'].strip())), None
+
+
+def renderizar_trozo(motor, partes):
+    """Genera el PDF de cada parte; devuelve (pdf, None) o (None, error) por parte.
+
+    Se ejecuta en los procesos del pool: un parte que falla no pierde el trozo.
+    """
+    resultados = []
+    for parte in partes:
+        try:
+            resultados.append((generar_con_motor(motor, parte), None))
+        except Exception as error:
+            resultados.append((None, f'{type(error).__name__}: {error}'))
+    return resultados
+
+
+class DestinoDirectorio:
+    """Un PDF por parte en un directorio; cualquier trozo escrito es un punto seguro"""
+
+    def __init__(self, ruta, estado):
+        self.ruta = ruta
+        os.makedirs(ruta, exist_ok=True)
+
+    def escribir(self, nombre, pdf):
+        with open(os.path.join(self.ruta, nombre), 'wb') as archivo:
+            archivo.write(pdf)
+
+    def punto_seguro(self):
+        return True
+
+    def estado(self):
+        return {}
+
+    def cerrar(self):
+        pass
+
+
+class DestinoZip:
+    """Serie de ZIP con `por_zip` PDF cada uno; solo hay punto seguro al cerrar uno"""
+
+    def __init__(self, ruta, estado, por_zip=5000):
+        self.base = ruta[:-len('.zip')] if ruta.lower().endswith('.zip') else ruta
+        self.por_zip = por_zip
+        # Al reanudar, el ZIP que quedó a medias se vuelve a escribir entero
+        self.siguiente = estado.get('zip_siguiente', 1)
+        self._zip = None
+        self._entradas = 0
+        directorio = os.path.dirname(self.base)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+
+    def escribir(self, nombre, pdf):
+        if self._zip is None:
+            # Los PDF ya vienen comprimidos: se almacenan tal cual
+            self._zip = zipfile.ZipFile(f'{self.base}-{self.siguiente:05d}.zip', 'w',
+                                        compression=zipfile.ZIP_STORED)
+            self._entradas = 0
+        self._zip.writestr(nombre, pdf)
+        self._entradas += 1
+
+    def punto_seguro(self):
+        if self._zip is not None and self._entradas >= self.por_zip:
+            self.cerrar()
+        return self._zip is None
+
+    def estado(self):
+        return {'zip_siguiente': self.siguiente}
+
+    def cerrar(self):
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+            self.siguiente += 1
+
+
+class Importacion:
+    """Importa un archivo de partes en una salida, reanudable desde su punto de control"""
+
+    def __init__(self, entrada, salida, formato=None, motor='platypus', procesos=None,
+                 trozo=100, por_zip=5000, intervalo_informe=5.0, informar=print):
+        self.entrada = os.path.abspath(entrada)
+        self.formato = formato or formato_de(entrada)
+        if self.formato not in FORMATOS:
+            raise ValueError(f"Formato desconocido; use {' o '.join(FORMATOS)}")
+        self.salida = salida
+        self.es_zip = salida.lower().endswith('.zip')
+        base = salida[:-len('.zip')] if self.es_zip else salida.rstrip('/\\')
+        self.ruta_punto_control = f'{base}.punto-control.json'
+        self.ruta_errores = f'{base}.errores.jsonl'
+        self.motor = motor
+        self.procesos = os.cpu_count() if procesos is None else procesos
+        self.trozo = trozo
+        self.por_zip = por_zip
+        self.intervalo_informe = intervalo_informe
+        self.informar = informar
+
+    # Punto de control
+
+    def leer_punto_control(self):
+        """Estado guardado de una importación anterior a la misma salida, o None"""
+        try:
+            with open(self.ruta_punto_control, encoding='utf-8') as archivo:
+                estado = json.load(archivo)
+        except FileNotFoundError:
+            return None
+        if estado.get('entrada') != self.entrada:
+            raise ValueError(f"{self.ruta_punto_control} corresponde a otra entrada ({estado.get('entrada')}); "
+                             'use otra salida o empiece desde cero')
+        return estado
+
+    def _guardar_punto_control(self, estado):
+        temporal = f'{self.ruta_punto_control}.tmp'
+        with open(temporal, 'w', encoding='utf-8') as archivo:
+            json.dump(estado, archivo, ensure_ascii=False)
+        os.replace(temporal, self.ruta_punto_control)
+
+    def descartar_punto_control(self):
+        for ruta in (self.ruta_punto_control, self.ruta_errores):
+            if os.path.exists(ruta):
+                os.remove(ruta)
+
+    # Lectura por trozos
+
+    def _trozos(self, saltar):
+        """Genera (último número, [(número, parte)], [(número, errores)]) cada `trozo` registros"""
+        validos, rechazados = [], []
+        numero = saltar
+        for numero, objeto in leer_registros(self.entrada, self.formato):
+            if numero <= saltar:
+                continue
+            parte, errores = validar_registro(objeto)
+            if errores:
+                rechazados.append((numero, errores))
+            else:
+                validos.append((numero, parte))
+            if len(validos) + len(rechazados) >= self.trozo:
+                yield numero, validos, rechazados
+                validos, rechazados = [], []
+        if validos or rechazados:
+            yield numero, validos, rechazados
+
+    def _enviar(self, pool, partes):
+        if pool is None:
+            futuro = Future()
+            futuro.set_result(renderizar_trozo(self.motor, partes))
+            return futuro
+        return pool.submit(renderizar_trozo, self.motor, partes)
+
+    # Ejecución
+
+    def ejecutar(self):
+        """Importa lo que falte y devuelve el resumen de la importación completa"""
+        estado = self.leer_punto_control() or {
+            'entrada': self.entrada,
+            'registros': 0,
+            'pdf': 0,
+            'rechazados': 0,
+            'bytes_pdf': 0,
+            'bytes_errores': 0,
+        }
+        if estado.get('terminado'):
+            self.informar(f"Importación ya terminada: {estado['pdf']} PDF, {estado['rechazados']} rechazados")
+            return estado
+        if estado['registros']:
+            self.informar(f"Reanudando tras el registro {estado['registros']}")
+
+        if self.es_zip:
+            destino = DestinoZip(self.salida, estado, self.por_zip)
+        else:
+            destino = DestinoDirectorio(self.salida, estado)
+        pool = None
+        if self.procesos:
+            pool = ProcessPoolExecutor(max_workers=self.procesos, mp_context=multiprocessing.get_context('spawn'))
+
+        # Los errores posteriores al punto de control se vuelven a producir
+        errores = open(self.ruta_errores, 'ab')
+        errores.truncate(estado['bytes_errores'])
+        progreso = _Progreso(estado, self.informar, self.intervalo_informe)
+        en_vuelo = deque()
+        maximo_en_vuelo = max(1, self.procesos * 2)
+        try:
+            for ultimo, validos, rechazados in self._trozos(estado['registros']):
+                if len(en_vuelo) >= maximo_en_vuelo:
+                    self._escribir(en_vuelo.popleft(), destino, errores, estado, progreso)
+                futuro = self._enviar(pool, [parte for _, parte in validos])
+                en_vuelo.append((futuro, ultimo, validos, rechazados))
+            while en_vuelo:
+                self._escribir(en_vuelo.popleft(), destino, errores, estado, progreso)
+            destino.cerrar()
+            estado['terminado'] = True
+            self._confirmar(destino, errores, estado)
+        finally:
+            errores.close()
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+        progreso.final()
+        return estado
+
+    def _escribir(self, trabajo, destino, errores, estado, progreso):
+        futuro, ultimo, validos, rechazados = trabajo
+        rechazados = list(rechazados)
+        for (numero, parte), (pdf, error) in zip(validos, futuro.result()):
+            if error:
+                rechazados.append((numero, {'pdf': error}))
+                continue
+            # El número de registro hace único y estable el nombre entre reanudaciones
+            destino.escribir(f'{numero:07d}_{parte.nombre_archivo}', pdf)
+            estado['pdf'] += 1
+            estado['bytes_pdf'] += len(pdf)
+        for numero, detalle in sorted(rechazados, key=lambda r: r[0]):
+            linea = json.dumps({'registro': numero, 'errores': detalle}, ensure_ascii=False)
+            errores.write(linea.encode('utf-8') + b'\n')
+        estado['rechazados'] += len(rechazados)
+        estado['registros'] = ultimo
+        if destino.punto_seguro():
+            self._confirmar(destino, errores, estado)
+        progreso.avanzar()
+
+    def _confirmar(self, destino, errores, estado):
+        errores.flush()
+        estado['bytes_errores'] = errores.tell()
+        estado.update(destino.estado())
+        self._guardar_punto_control(estado)
+
+
+class _Progreso:
+    """Informe periódico del ritmo de la importación"""
+
+    def __init__(self, estado, informar, intervalo):
+        self.estado = estado
+        self.informar = informar
+        self.intervalo = intervalo
+        self.inicio = self.anterior = time.perf_counter()
+        self.pdf_inicio = self.pdf_anterior = estado['pdf']
+
+    def avanzar(self):
+        ahora = time.perf_counter()
+        if ahora - self.anterior < self.intervalo:
+            return
+        actual = (self.estado['pdf'] - self.pdf_anterior) / (ahora - self.anterior)
+        media = (self.estado['pdf'] - self.pdf_inicio) / (ahora - self.inicio)
+        self.informar(
+            f"{self.estado['registros']} registros, {self.estado['pdf']} PDF, "
+            f"{self.estado['rechazados']} rechazados · {actual:.0f} PDF/s (media {media:.0f} PDF/s) · "
+            f"{self.estado['bytes_pdf'] / 1e6:.1f} MB"
+        )
+        self.anterior, self.pdf_anterior = ahora, self.estado['pdf']
+
+    def final(self):
+        duracion = time.perf_counter() - self.inicio
+        pdf = self.estado['pdf'] - self.pdf_inicio
+        self.informar(
+            f"Terminado: {self.estado['registros']} registros, {self.estado['pdf']} PDF, "
+            f"{self.estado['rechazados']} rechazados · {pdf} PDF en {duracion:.1f} s "
+            f"({pdf / duracion if duracion else 0:.0f} PDF/s) · {self.estado['bytes_pdf'] / 1e6:.1f} MB"
+        )
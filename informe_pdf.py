@@ -0,0 +1,103 @@
+"""Informe PDF de un paciente para un rango de fechas (semanal, mensual, anual).
+
+Los partes se leen de la base de datos página a página y sus flowables se
+generan a medida que ReportLab los consume, así que la memoria de Python no
+crece con la cantidad de días del rango.
+"""
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from reportlab.platypus import Paragraph, Spacer, Table
+
+from estilos_pdf import obtener_estilos
+from fuentes import con_respaldo
+from parte import Parte
+from pdf_parte import elementos_secciones, nuevo_documento
+from salida_pdf import SalidaEnTrozos
+
+# Orden de los estados en la tabla resumen
+ESTADOS = ['Bueno', 'Regular', 'Malo']
+
+
+class _FlowablesPerezosos(list):
+    """Lista de flowables que se rellena desde un generador mientras se consume.
+
+    SimpleDocTemplate.build recorre la lista con `while len(flowables)` y va
+    quitando elementos del principio: cada vez que pregunta la longitud se
+    completa una ventana de elementos, suficiente para keepWithNext.
+    """
+
+    VENTANA = 64
+
+    def __init__(self, generador):
+        super().__init__()
+        self._generador = generador
+
+    def _rellenar(self):
+        while self._generador is not None and list.__len__(self) < self.VENTANA:
+            try:
+                self.append(next(self._generador))
+            except StopIteration:
+                self._generador = None
+
+    def __len__(self):
+        self._rellenar()
+        return list.__len__(self)
+
+
+def _formatear(fecha_iso):
+    return datetime.strptime(fecha_iso, '%Y-%m-%d').strftime('%d/%m/%Y')
+
+
+def _elementos_resumen(resumen, estilos):
+    filas = [['Estado general', 'Partes']]
+    estados = dict(resumen['estados'])
+    for estado in ESTADOS:
+        filas.append([estado, str(estados.pop(estado, 0))])
+    otros = sum(estados.values())
+    if otros:
+        filas.append(['No evaluado', str(otros)])
+    filas.append(['Total de partes', str(resumen['total'])])
+    filas.append(['Días con signos de alerta', str(len(resumen['dias_con_alerta']))])
+
+    tabla = Table(filas, colWidths=[250, 250])
+    tabla.setStyle(estilos.info_tabla)
+    yield tabla
+
+    if resumen['dias_con_alerta']:
+        yield Paragraph("DÍAS CON SIGNOS DE ALERTA", estilos.seccion)
+        yield Paragraph(', '.join(_formatear(dia) for dia in resumen['dias_con_alerta']), estilos.alerta)
+    yield Spacer(1, 30)
+
+
+def _elementos_informe(almacen, paciente, desde, hasta, estilos):
+    yield Paragraph("INFORME DEL PACIENTE", estilos.titulo)
+    yield Paragraph(
+        f"{con_respaldo(escape(paciente))} · del {_formatear(desde)} al {_formatear(hasta)}", estilos.subtitulo
+    )
+
+    yield from _elementos_resumen(almacen.resumen_paciente(paciente, desde, hasta), estilos)
+
+    for fila in almacen.iterar_por_paciente(paciente, desde, hasta):
+        # Los textos guardados pueden tener '<' o '&': se escapan como en el parte
+        parte = Parte(fila)
+        encabezado = (
+            f"{_formatear(fila['fecha'])} · Estado: {parte.marcado['estado_general'] or 'No evaluado'}"
+            f" · Cuidadora: {parte.marcado['cuidadora'] or 'No especificada'}"
+        )
+        yield Paragraph(con_respaldo(encabezado), estilos.titulo_dia)
+        yield from elementos_secciones(parte, estilos)
+
+    yield Spacer(1, 30)
+    yield Paragraph(
+        f"Documento generado el {datetime.now().strftime('%d/%m/%Y a las %H:%M')}",
+        estilos.footer
+    )
+
+
+def generar_informe_pdf(almacen, paciente, desde, hasta):
+    """Genera el informe de `paciente` entre `desde` y `hasta` (AAAA-MM-DD)"""
+    salida = SalidaEnTrozos()
+    elementos = _elementos_informe(almacen, paciente, desde, hasta, obtener_estilos())
+    nuevo_documento(salida).build(_FlowablesPerezosos(elementos))
+    return salida.vaciar()
@@ -0,0 +1,64 @@
+"""Generación de PDF en lote: varios partes en un único documento o en un ZIP.
+
+Se ejecuta a través de RenderizadorPDF (renderizado.generar_lote), con su
+pool, su plazo y su cola, y devuelve el documento entero: la respuesta no
+empieza hasta que el lote está generado, así que un error todavía puede
+llegar al cliente como 503, 504 o 500 y no como un archivo cortado.
+"""
+import zipfile
+
+from reportlab.platypus import PageBreak
+
+from estilos_pdf import obtener_estilos
+from parte import Parte
+from pdf_parte import construir_elementos, generar_pdf, lienzo_determinista, nuevo_documento
+from salida_pdf import SalidaEnTrozos, nombre_archivo_pdf
+
+
+def generar_lote_pdf(partes):
+    """Genera un único PDF con un parte por página (o páginas) y devuelve sus bytes"""
+    partes = [Parte.de(datos) for datos in partes]
+    # Todo el lote lleva la misma fecha de generación
+    for parte in partes[1:]:
+        parte.generado = partes[0].generado
+
+    estilos = obtener_estilos()
+    elementos = []
+    for indice, parte in enumerate(partes):
+        if indice:
+            elementos.append(PageBreak())
+        elementos.extend(construir_elementos(parte, estilos))
+
+    salida = SalidaEnTrozos()
+    firma = repr([(parte.como_dict(), parte.generado) for parte in partes])
+    nuevo_documento(salida).build(elementos, canvasmaker=lienzo_determinista(partes[0], firma))
+    return salida.vaciar()
+
+
+def _nombres_unicos(partes):
+    vistos = {}
+    for datos in partes:
+        nombre = nombre_archivo_pdf(datos)
+        repeticiones = vistos.get(nombre, 0)
+        vistos[nombre] = repeticiones + 1
+        if repeticiones:
+            base = nombre[:-len('.pdf')]
+            nombre = f"{base}_{repeticiones + 1}.pdf"
+        yield nombre, datos
+
+
+def generar_lote_zip(partes):
+    """Genera un ZIP con un PDF por parte y devuelve sus bytes"""
+    salida = SalidaEnTrozos()
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_STORED) as archivo_zip:
+        for nombre, datos in _nombres_unicos(partes):
+            # Los PDF ya vienen comprimidos: se almacenan tal cual
+            archivo_zip.writestr(nombre, generar_pdf(datos))
+    return salida.vaciar()
+
+
+# Formatos de /descargar-pdf/lote
+FORMATOS = {
+    'pdf': generar_lote_pdf,
+    'zip': generar_lote_zip,
+}
@@ -0,0 +1,63 @@
+"""Cola con un hilo en segundo plano que la procesa en lotes.
+
+La comparten EscritorEnLotes (almacenamiento.py) y ArchivoDrive
+(archivo_drive.py). El hilo se arranca con el primer elemento encolado, ya
+dentro del worker de gunicorn; toma un elemento y, mientras sigan llegando
+antes de `espera` segundos, hasta `max_lote`, y los procesa de una vez.
+"""
+import atexit
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class HiloEnLotes:
+    """Cola y hilo que la vacía en lotes; las subclases definen _procesar y _fallo"""
+
+    # Nombre del hilo (aparece en los volcados de pila y en el perfilador)
+    NOMBRE_HILO = 'lotes'
+
+    def __init__(self, max_lote, espera, max_cola=0):
+        self.max_lote = max_lote
+        self.espera = espera
+        self._cola = queue.Queue(max_cola)
+        self._hilo = None
+        self._lock = threading.Lock()
+        atexit.register(self.vaciar)
+
+    def _arrancar(self):
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name=self.NOMBRE_HILO, daemon=True)
+                self._hilo.start()
+
+    def vaciar(self):
+        """Espera a que se procesen todos los elementos encolados"""
+        if self._hilo is not None:
+            self._cola.join()
+
+    def _procesar(self, lote):
+        raise NotImplementedError
+
+    def _fallo(self, lote):
+        """Se llama, dentro del except, si _procesar lanza una excepción"""
+        logger.exception('No se pudo procesar un lote de %d elementos', len(lote))
+
+    def _bucle(self):
+        while True:
+            lote = [self._cola.get()]
+            try:
+                while len(lote) < self.max_lote:
+                    lote.append(self._cola.get(timeout=self.espera))
+            except queue.Empty:
+                pass
+            try:
+                self._procesar(lote)
+            except Exception:
+                # Un lote con error no debe detener el hilo
+                self._fallo(lote)
+            finally:
+                for _ in lote:
+                    self._cola.task_done()
@@ -0,0 +1,314 @@
+"""Métricas de la aplicación en formato de texto de Prometheus.
+
+Contadores e histogramas en memoria con un lock por métrica: el coste por
+observación es de unos microsegundos, apto para dejarlo activo en producción.
+
+Con varios workers de gunicorn (o con el pool de renderizado) cada proceso
+vuelca sus valores a `PARTE_METRICAS_DIR/metricas_<pid>.json` como mucho una
+vez por segundo, y /metrics suma los archivos de todos los procesos. El
+maestro de gunicorn (gunicorn.conf.py) vacía el directorio al arrancar y,
+cuando un worker termina, suma sus valores a `metricas_archivadas.json`
+antes de borrar su archivo (como `mark_process_dead` de prometheus_client):
+los contadores y los histogramas nunca bajan al reciclarse un worker.
+"""
+import atexit
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Límites superiores de los buckets de tiempo, en segundos
+BUCKETS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+INTERVALO_VOLCADO = 1.0
+
+# Valores acumulados de los procesos que ya han terminado
+ARCHIVO_ARCHIVADAS = 'metricas_archivadas.json'
+# Identidades de procesos archivados que se recuerdan (solo importan las recientes)
+MAX_PROCESOS_ARCHIVADOS = 100
+
+
+def _clave(etiquetas):
+    return tuple(sorted(etiquetas.items())) if etiquetas else ()
+
+
+def _formatear_etiquetas(clave, extra=()):
+    pares = list(clave) + list(extra)
+    if not pares:
+        return ''
+    texto = ','.join(
+        '{}="{}"'.format(nombre, str(valor).replace('\\', '\\\\').replace('"', '\\"'))
+        for nombre, valor in pares
+    )
+    return '{' + texto + '}'
+
+
+class Contador:
+    tipo = 'counter'
+
+    def __init__(self, registro, nombre, ayuda):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self._registro = registro
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, cantidad=1, **etiquetas):
+        clave = _clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + cantidad
+        self._registro.volcar_si_corresponde()
+
+    def instantanea(self):
+        with self._lock:
+            return {json.dumps(clave): valor for clave, valor in self._valores.items()}
+
+    @staticmethod
+    def combinar(acumulado, valores):
+        for clave, valor in valores.items():
+            acumulado[clave] = acumulado.get(clave, 0) + valor
+
+    def exponer(self, valores):
+        for clave, valor in sorted(valores.items()):
+            yield f'{self.nombre}{_formatear_etiquetas(json.loads(clave))} {valor}'
+
+
+class Histograma:
+    tipo = 'histogram'
+
+    def __init__(self, registro, nombre, ayuda, buckets=BUCKETS_SEGUNDOS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.buckets = tuple(buckets)
+        self._registro = registro
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, **etiquetas):
+        clave = _clave(etiquetas)
+        indice = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._valores.get(clave)
+            if serie is None:
+                # Un bucket por límite más el de +Inf; luego la suma y la cuenta
+                serie = self._valores[clave] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+        self._registro.volcar_si_corresponde()
+
+    def cronometro(self, **etiquetas):
+        return _Cronometro(self, etiquetas)
+
+    def instantanea(self):
+        with self._lock:
+            return {
+                json.dumps(clave): [list(buckets), suma, cuenta]
+                for clave, (buckets, suma, cuenta) in self._valores.items()
+            }
+
+    @staticmethod
+    def combinar(acumulado, valores):
+        for clave, (buckets, suma, cuenta) in valores.items():
+            if clave not in acumulado:
+                acumulado[clave] = [list(buckets), suma, cuenta]
+                continue
+            serie = acumulado[clave]
+            serie[0] = [a + b for a, b in zip(serie[0], buckets)]
+            serie[1] += suma
+            serie[2] += cuenta
+
+    def exponer(self, valores):
+        limites = [repr(limite) for limite in self.buckets] + ['+Inf']
+        for clave, (buckets, suma, cuenta) in sorted(valores.items()):
+            etiquetas = json.loads(clave)
+            acumulado = 0
+            for limite, cantidad in zip(limites, buckets):
+                acumulado += cantidad
+                yield f'{self.nombre}_bucket{_formatear_etiquetas(etiquetas, [("le", limite)])} {acumulado}'
+            yield f'{self.nombre}_sum{_formatear_etiquetas(etiquetas)} {suma}'
+            yield f'{self.nombre}_count{_formatear_etiquetas(etiquetas)} {cuenta}'
+
+
+class _Cronometro:
+    """Context manager que observa en un histograma la duración del bloque"""
+
+    __slots__ = ('_histograma', '_etiquetas', '_inicio')
+
+    def __init__(self, histograma, etiquetas):
+        self._histograma = histograma
+        self._etiquetas = etiquetas
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *excepcion):
+        self._histograma.observar(time.perf_counter() - self._inicio, **self._etiquetas)
+
+
+class Registro:
+    """Conjunto de métricas de un proceso, con volcado opcional a disco"""
+
+    def __init__(self, directorio=None):
+        self.directorio = directorio
+        self._metricas = []
+        self._proximo_volcado = 0.0
+        self._lock_volcado = threading.Lock()
+        self._proceso = None
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+            atexit.register(self.volcar)
+
+    def contador(self, nombre, ayuda):
+        metrica = Contador(self, nombre, ayuda)
+        self._metricas.append(metrica)
+        return metrica
+
+    def histograma(self, nombre, ayuda, buckets=BUCKETS_SEGUNDOS):
+        metrica = Histograma(self, nombre, ayuda, buckets)
+        self._metricas.append(metrica)
+        return metrica
+
+    def _instantanea(self):
+        return {metrica.nombre: metrica.instantanea() for metrica in self._metricas}
+
+    def volcar_si_corresponde(self):
+        if self.directorio and time.monotonic() >= self._proximo_volcado:
+            self.volcar()
+
+    def volcar(self, esperar=False):
+        """Escribe los valores de este proceso en su archivo del directorio compartido.
+
+        Sin `esperar`, no hace nada si otro hilo ya está volcando.
+        """
+        if not self.directorio or not self._lock_volcado.acquire(blocking=esperar):
+            return
+        try:
+            self._proximo_volcado = time.monotonic() + INTERVALO_VOLCADO
+            self._escribir(self._ruta_proceso(os.getpid()), {
+                'proceso': self._identidad(), 'metricas': self._instantanea(),
+            })
+        finally:
+            self._lock_volcado.release()
+
+    def _identidad(self):
+        """Identifica a este proceso aunque otro reutilice luego su pid"""
+        pid = os.getpid()
+        if self._proceso is None or self._proceso[0] != pid:
+            self._proceso = (pid, f'{pid}-{os.urandom(6).hex()}')
+        return self._proceso[1]
+
+    def _ruta_proceso(self, pid):
+        return os.path.join(self.directorio, f'metricas_{pid}.json')
+
+    def vaciar_directorio(self):
+        """Borra los archivos de todos los procesos y los archivados (al arrancar el servidor)"""
+        if not self.directorio:
+            return
+        for nombre in os.listdir(self.directorio):
+            if nombre.startswith('metricas_') or nombre.endswith('.tmp'):
+                try:
+                    os.remove(os.path.join(self.directorio, nombre))
+                except OSError:
+                    pass
+
+    def _ruta_archivadas(self):
+        return os.path.join(self.directorio, ARCHIVO_ARCHIVADAS)
+
+    def _leer(self, ruta):
+        try:
+            with open(ruta) as archivo:
+                return json.load(archivo)
+        except (OSError, ValueError):
+            return None
+
+    def _escribir(self, ruta, contenido):
+        descriptor, temporal = tempfile.mkstemp(dir=self.directorio, suffix='.tmp')
+        with os.fdopen(descriptor, 'w') as archivo:
+            json.dump(contenido, archivo)
+        os.replace(temporal, ruta)
+
+    def archivar_proceso(self, pid):
+        """Suma los valores de un proceso que ha terminado a los archivados y borra su archivo.
+
+        Solo lo llama el maestro, de uno en uno. Los archivados anotan la
+        identidad del proceso antes de borrar su archivo, para que quien lea
+        entre medias no lo cuente dos veces.
+        """
+        if not self.directorio:
+            return
+        ruta = self._ruta_proceso(pid)
+        volcado = self._leer(ruta)
+        if volcado is None:
+            return
+        archivadas = self._leer(self._ruta_archivadas()) or {'procesos': [], 'metricas': {}}
+        for metrica in self._metricas:
+            metrica.combinar(
+                archivadas['metricas'].setdefault(metrica.nombre, {}), volcado['metricas'].get(metrica.nombre, {})
+            )
+        archivadas['procesos'] = archivadas['procesos'][-MAX_PROCESOS_ARCHIVADOS + 1:] + [volcado['proceso']]
+        self._escribir(self._ruta_archivadas(), archivadas)
+        os.remove(ruta)
+
+    def _instantaneas(self):
+        if not self.directorio:
+            yield self._instantanea()
+            return
+        self.volcar()
+        volcados = []
+        for nombre in os.listdir(self.directorio):
+            if nombre == ARCHIVO_ARCHIVADAS or not (nombre.startswith('metricas_') and nombre.endswith('.json')):
+                continue
+            volcado = self._leer(os.path.join(self.directorio, nombre))
+            if volcado is not None:
+                volcados.append(volcado)
+        # Los archivados se leen los últimos: si un proceso se archivó mientras
+        # tanto, ya está incluido en ellos y su volcado se descarta
+        archivados = set()
+        archivadas = self._leer(self._ruta_archivadas())
+        if archivadas is not None:
+            archivados.update(archivadas['procesos'])
+            yield archivadas['metricas']
+        for volcado in volcados:
+            if volcado['proceso'] not in archivados:
+                yield volcado['metricas']
+
+    def exponer(self):
+        """Texto en formato de exposición de Prometheus, sumando todos los procesos"""
+        combinados = {metrica.nombre: {} for metrica in self._metricas}
+        for instantanea in self._instantaneas():
+            for metrica in self._metricas:
+                metrica.combinar(combinados[metrica.nombre], instantanea.get(metrica.nombre, {}))
+
+        lineas = []
+        for metrica in self._metricas:
+            lineas.append(f'# HELP {metrica.nombre} {metrica.ayuda}')
+            lineas.append(f'# TYPE {metrica.nombre} {metrica.tipo}')
+            lineas.extend(metrica.exponer(combinados[metrica.nombre]))
+        return '\n'.join(lineas) + '\n'
+
+
+registro = Registro(os.environ.get('PARTE_METRICAS_DIR') or None)
+
+FASES = registro.histograma(
+    'parte_fase_segundos',
+    'Duración de cada fase del procesamiento de un parte',
+)
+PETICIONES = registro.histograma(
+    'parte_peticion_segundos',
+    'Duración total de las peticiones HTTP por ruta',
+)
+PDF_GENERADOS = registro.contador('parte_pdf_generados_total', 'PDF generados')
+PDF_BYTES = registro.contador('parte_pdf_bytes_total', 'Bytes de PDF generados')
+PDF_PAGINAS = registro.contador('parte_pdf_paginas_total', 'Páginas de PDF generadas')
+PDF_MOTOR = registro.contador('parte_pdf_motor_total', 'PDF de partes pedidos al motor canvas por motor que los generó')
+ARCHIVO_DRIVE = registro.contador('parte_archivo_drive_total', 'PDF enviados al archivo de Drive por resultado')
+CACHE_PDF = registro.contador('parte_cache_pdf_total', 'Consultas a la caché de PDF por resultado')
+
+
+def cronometro(fase):
+    """Mide la duración de una fase: `with cronometro('pdf_build'): ...`"""
+    return FASES.cronometro(fase=fase)
@@ -0,0 +1,130 @@
+"""Campos del parte diario y normalización de los datos recibidos"""
+import os
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+# Datos de cabecera del parte
+CAMPOS_CABECERA = ['paciente', 'cuidadora', 'fecha', 'estado_general']
+
+# Secciones de texto libre, en el orden en que aparecen en el formulario
+SECCIONES = [
+    'estado_detalle',
+    'medicacion',
+    'alimentacion',
+    'hidratacion',
+    'eliminacion',
+    'descanso',
+    'movilidad',
+    'higiene',
+    'observaciones',
+    'signos_alerta',
+]
+
+CAMPOS_PARTE = CAMPOS_CABECERA + SECCIONES
+
+# Campos que se dibujan como párrafos en el PDF (y necesitan escapar el marcado);
+# los de la tabla de información, cuando llevan caracteres de una fuente de respaldo
+CAMPOS_PARRAFO = SECCIONES + ['cuidadora', 'paciente', 'estado_general']
+
+
+def normalizar_parte(datos):
+    """Devuelve un dict con todos los campos del parte como texto limpio.
+
+    Los campos ausentes quedan como cadena vacía, se eliminan los espacios de
+    los extremos y los saltos de línea se unifican a '\\n'. Dos envíos del
+    mismo parte producen siempre el mismo resultado.
+    """
+    normalizado = {}
+    for campo in CAMPOS_PARTE:
+        valor = datos.get(campo)
+        valor = '' if valor is None else str(valor)
+        normalizado[campo] = valor.replace('\r\n', '\n').replace('\r', '\n').strip()
+    return normalizado
+
+
+def parsear_fecha(valor):
+    """Convierte 'AAAA-MM-DD' en date; devuelve None si no es una fecha válida"""
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def fecha_iso(valor):
+    """Devuelve la fecha en formato AAAA-MM-DD, o la de hoy si no es válida"""
+    fecha = parsear_fecha(valor) or datetime.now().date()
+    return fecha.isoformat()
+
+
+# Longitud máxima de cada campo en la API JSON
+LONGITUD_MAXIMA = int(os.environ.get('PARTE_LONGITUD_MAXIMA', 20000))
+
+
+class ErrorValidacion(ValueError):
+    """Parte JSON no válido; `errores` asocia cada campo con su problema"""
+
+    def __init__(self, errores):
+        super().__init__('Parte no válido')
+        self.errores = errores
+
+
+def validar_json(objeto):
+    """Comprueba un parte recibido como objeto JSON; devuelve un dict campo -> error"""
+    if not isinstance(objeto, dict):
+        return {'': 'Se esperaba un objeto JSON'}
+    errores = {}
+    for campo, valor in objeto.items():
+        if campo not in CAMPOS_PARTE:
+            errores[campo] = 'Campo desconocido'
+        elif valor is not None and not isinstance(valor, str):
+            errores[campo] = 'Debe ser una cadena de texto'
+        elif valor and len(valor) > LONGITUD_MAXIMA:
+            errores[campo] = f'Supera los {LONGITUD_MAXIMA} caracteres'
+    if 'paciente' not in errores and not (objeto.get('paciente') or '').strip():
+        errores['paciente'] = 'Campo obligatorio'
+    fecha = objeto.get('fecha')
+    if fecha and 'fecha' not in errores and parsear_fecha(fecha.strip()) is None:
+        errores['fecha'] = 'Fecha no válida (AAAA-MM-DD)'
+    return errores
+
+
+class Parte:
+    """Parte diario normalizado, con un atributo por campo y los valores derivados.
+
+    Se construye una vez por petición y lo usan la vista HTML, los motores de
+    PDF, la caché y el archivo en Drive. `marcado` tiene el texto de los
+    campos escapado para los párrafos de ReportLab, que interpretan '<' y '&'.
+    `generado` es la fecha de generación que se imprime en el PDF; junto con
+    los campos determina sus bytes (ver almacenamiento.RegistroPDF).
+    """
+
+    __slots__ = tuple(CAMPOS_PARTE) + (
+        'dia', 'fecha_formateada', 'nombre_archivo', 'tiene_alerta', 'marcado', 'generado',
+    )
+
+    def __init__(self, datos):
+        for campo, valor in normalizar_parte(datos).items():
+            setattr(self, campo, valor)
+        self.dia = parsear_fecha(self.fecha) or datetime.now().date()
+        self.fecha_formateada = self.dia.strftime('%d/%m/%Y')
+        paciente_nombre = (self.paciente or 'parte_diario').replace(' ', '_')
+        self.nombre_archivo = f"parte_diario_{paciente_nombre}_{self.dia.strftime('%Y%m%d')}.pdf"
+        self.tiene_alerta = bool(self.signos_alerta)
+        self.marcado = {campo: escape(getattr(self, campo)) for campo in CAMPOS_PARRAFO}
+        self.generado = datetime.now().replace(second=0, microsecond=0)
+
+    @classmethod
+    def de(cls, datos):
+        """Devuelve `datos` si ya es un Parte; si no, lo construye"""
+        return datos if isinstance(datos, cls) else cls(datos)
+
+    @classmethod
+    def desde_json(cls, objeto):
+        """Valida un objeto JSON y devuelve el parte; lanza ErrorValidacion si no es válido"""
+        errores = validar_json(objeto)
+        if errores:
+            raise ErrorValidacion(errores)
+        return cls(dict(objeto, fecha=fecha_iso((objeto.get('fecha') or '').strip())))
+
+    def como_dict(self):
+        return {campo: getattr(self, campo) for campo in CAMPOS_PARTE}
@@ -0,0 +1,337 @@
+"""Renderizador rápido del parte diario: dibuja directamente en el canvas.
+
+El parte tiene siempre la misma estructura (título, tabla de datos, secciones
+de texto y firma), así que se maqueta sin pasar por platypus. Las posiciones
+replican las de SimpleDocTemplate con los estilos de estilos_pdf: márgenes de
+72 puntos, el relleno de 6 puntos del marco y el espacio entre párrafos
+(el mayor entre el espacio posterior de uno y el anterior del siguiente).
+
+Los párrafos se parten entre páginas con las mismas reglas que
+Paragraph.split. Lo que este renderizador no reproduce igual que platypus se
+genera con generar_pdf: palabras más anchas que la línea, saltos de línea
+dentro de la tabla o un bloque que no cabe ni en una página vacía.
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab import rl_config
+
+from estilos_pdf import COLORES, obtener_estilos
+from fuentes import necesita_respaldo, registrar_fuentes
+from metricas import PDF_BYTES, PDF_GENERADOS, PDF_MOTOR, PDF_PAGINAS, cronometro
+from parte import CAMPOS_PARRAFO, Parte
+from pdf_parte import SECCIONES_PDF, generar_pdf, lienzo_determinista
+from salida_pdf import SalidaEnTrozos
+
+ANCHO_PAGINA, ALTO_PAGINA = A4
+MARGEN = 72
+RELLENO_MARCO = 6
+
+# Caja de texto (la misma que el marco de SimpleDocTemplate)
+X_TEXTO = MARGEN + RELLENO_MARCO
+ANCHO_TEXTO = ANCHO_PAGINA - 2 * (MARGEN + RELLENO_MARCO)
+Y_SUPERIOR = ALTO_PAGINA - MARGEN - RELLENO_MARCO
+Y_INFERIOR = MARGEN + RELLENO_MARCO
+_FUZZ = 1e-6
+
+# Tabla de datos: dos columnas de 100 y 400 puntos, centrada aunque sea más
+# ancha que el marco, filas de interlineado 12 + relleno 12 arriba y abajo
+COLUMNAS_TABLA = (100, 400)
+ALTO_FILA = 36
+RELLENO_CELDA = 6
+BASE_CELDA = 13
+FUENTE_TABLA = 11
+
+# Métricas de un estilo de párrafo
+Metrica = namedtuple('Metrica', [
+    'fuente', 'tamano', 'interlineado', 'color', 'centrado',
+    'antes', 'despues', 'fondo', 'relleno', 'ancho_espacio', 'anchos',
+])
+
+
+class _AnchosFuente(dict):
+    """Ancho de cada carácter de una fuente en milésimas de em, calculado una vez"""
+
+    def __init__(self, fuente):
+        super().__init__()
+        self.fuente = fuente
+
+    def __missing__(self, caracter):
+        ancho = self[caracter] = stringWidth(caracter, self.fuente, 1000)
+        return ancho
+
+    def ancho(self, texto, tamano):
+        """Lo mismo que stringWidth(texto, fuente, tamano): ReportLab suma los anchos sin kerning"""
+        return sum(map(self.__getitem__, texto)) * 0.001 * tamano
+
+
+@lru_cache(maxsize=None)
+def anchos_fuente(fuente):
+    return _AnchosFuente(fuente)
+
+
+class _Desborde(Exception):
+    """El parte no se puede maquetar igual que platypus con este renderizador"""
+
+
+def _metrica(estilo):
+    return Metrica(
+        fuente=estilo.fontName,
+        tamano=estilo.fontSize,
+        interlineado=estilo.leading,
+        color=estilo.textColor,
+        centrado=estilo.alignment == TA_CENTER,
+        antes=estilo.spaceBefore,
+        despues=estilo.spaceAfter,
+        fondo=estilo.backColor,
+        relleno=estilo.borderPadding,
+        ancho_espacio=stringWidth(' ', estilo.fontName, estilo.fontSize),
+        anchos=anchos_fuente(estilo.fontName),
+    )
+
+
+@lru_cache(maxsize=None)
+def obtener_metricas():
+    """Métricas de los estilos del parte (se calculan una vez por proceso)"""
+    estilos = obtener_estilos()
+    return {nombre: _metrica(getattr(estilos, nombre)) for nombre in (
+        'titulo', 'subtitulo', 'seccion', 'contenido', 'alerta', 'firma', 'footer',
+    )}
+
+
+def partir_lineas(texto, metrica, ancho=ANCHO_TEXTO):
+    """Corta el texto en líneas como Paragraph: devuelve [(línea, ancho, nº de palabras)]"""
+    # Paragraph deja que una línea encoja sus espacios un poco para que quepa
+    encogimiento = rl_config.spaceShrinkage * metrica.ancho_espacio
+    lineas = []
+    palabras = []
+    actual = -metrica.ancho_espacio
+    anchos = metrica.anchos
+    for palabra in texto.split():
+        ancho_palabra = anchos.ancho(palabra, metrica.tamano)
+        if ancho_palabra > ancho:
+            # Paragraph partiría la palabra
+            raise _Desborde()
+        nuevo = actual + metrica.ancho_espacio + ancho_palabra
+        if nuevo <= ancho + encogimiento * len(palabras) or not palabras:
+            palabras.append(palabra)
+            actual = nuevo
+        else:
+            lineas.append((' '.join(palabras), actual, len(palabras)))
+            palabras = [palabra]
+            actual = ancho_palabra
+    if palabras:
+        lineas.append((' '.join(palabras), actual, len(palabras)))
+    return lineas
+
+
+class _Maquetador:
+    """Coloca bloques de arriba abajo sobre el canvas, pasando de página como el marco de platypus"""
+
+    def __init__(self, lienzo):
+        self.lienzo = lienzo
+        self.paginas = 1
+        self._nueva_pagina()
+
+    def _nueva_pagina(self):
+        self.y = Y_SUPERIOR
+        self.al_inicio = True
+        self.espacio_previo = 0
+
+    def _salto(self):
+        self.lienzo.showPage()
+        self.paginas += 1
+        self._nueva_pagina()
+
+    def _espacio_antes(self, antes):
+        """Espacio entre el bloque anterior y uno con spaceBefore=`antes`"""
+        return 0 if self.al_inicio else max(antes - self.espacio_previo, 0)
+
+    def _reservar(self, espacio, alto, despues):
+        """Ocupa el bloque y devuelve su coordenada superior"""
+        superior = self.y - espacio
+        self.y = superior - alto - despues
+        self.al_inicio = False
+        self.espacio_previo = despues
+        return superior
+
+    def _colocar(self, alto, antes=0, despues=0):
+        """Reserva un bloque que no se parte: si no cabe, pasa entero a la página siguiente"""
+        espacio = self._espacio_antes(antes)
+        if self.y - espacio - alto < Y_INFERIOR - _FUZZ:
+            if self.al_inicio:
+                raise _Desborde()
+            self._salto()
+            espacio = 0
+        return self._reservar(espacio, alto, despues)
+
+    def espacio(self, alto):
+        """Equivalente a Spacer(1, alto)"""
+        self._colocar(alto)
+
+    def parrafo(self, texto, metrica):
+        """Equivalente a Paragraph(texto, estilo), partido entre páginas como Paragraph.split"""
+        lineas = partir_lineas(texto, metrica)
+        interlineado = metrica.interlineado
+        while True:
+            alto = len(lineas) * interlineado
+            espacio = self._espacio_antes(metrica.antes)
+            disponible = self.y - Y_INFERIOR - espacio
+            if alto <= disponible + _FUZZ:
+                superior = self._reservar(espacio, alto, metrica.despues)
+                self._dibujar_lineas(lineas, superior, metrica)
+                return
+
+            # Con allowOrphans=0 no se deja una sola línea al final de la página
+            caben = int(disponible / interlineado)
+            if caben <= 1:
+                if self.al_inicio:
+                    raise _Desborde()
+                self._salto()
+                continue
+            superior = self._reservar(espacio, caben * interlineado, metrica.despues)
+            self._dibujar_lineas(lineas[:caben], superior, metrica)
+            lineas = lineas[caben:]
+            self._salto()
+
+    def _dibujar_lineas(self, lineas, superior, metrica):
+        if not lineas:
+            return
+        lienzo = self.lienzo
+        interlineado = metrica.interlineado
+        alto = len(lineas) * interlineado
+
+        if metrica.fondo is not None:
+            relleno = metrica.relleno
+            lienzo.setFillColor(metrica.fondo)
+            lienzo.rect(X_TEXTO - relleno, superior - alto - relleno,
+                        ANCHO_TEXTO + 2 * relleno, alto + 2 * relleno, stroke=0, fill=1)
+
+        texto_pdf = lienzo.beginText()
+        texto_pdf.setFont(metrica.fuente, metrica.tamano, interlineado)
+        texto_pdf.setFillColor(metrica.color)
+        base = superior - metrica.tamano
+        for linea, ancho, palabras in lineas:
+            sobrante = ANCHO_TEXTO - ancho
+            x = X_TEXTO + sobrante / 2 if metrica.centrado and sobrante > 0 else X_TEXTO
+            texto_pdf.setTextOrigin(x, base)
+            texto_pdf.setWordSpace(sobrante / (palabras - 1) if sobrante < 0 and palabras > 1 else 0)
+            texto_pdf.textOut(linea)
+            base -= interlineado
+        lienzo.drawText(texto_pdf)
+
+    def tabla(self, filas):
+        """Tabla de datos del parte (etiqueta, valor) con el estilo info_tabla"""
+        if any('\n' in valor for _, valor in filas):
+            # Table daría varias líneas a la celda
+            raise _Desborde()
+        alto = ALTO_FILA * len(filas)
+        superior = self._colocar(alto)
+        inferior = superior - alto
+        ancho = sum(COLUMNAS_TABLA)
+        x = X_TEXTO + (ANCHO_TEXTO - ancho) / 2
+        lienzo = self.lienzo
+        fuentes = registrar_fuentes()
+
+        lienzo.setFillColor(COLORES['fondo_etiqueta'])
+        lienzo.rect(x, inferior, COLUMNAS_TABLA[0], alto, stroke=0, fill=1)
+        for indice, (etiqueta, valor) in enumerate(filas):
+            base = superior - ALTO_FILA * (indice + 1) + BASE_CELDA
+            lienzo.setFillColor(COLORES['subtitulo'])
+            lienzo.setFont(fuentes.negrita, FUENTE_TABLA)
+            lienzo.drawString(x + RELLENO_CELDA, base, etiqueta)
+            lienzo.setFillColorRGB(0, 0, 0)
+            lienzo.setFont(fuentes.normal, FUENTE_TABLA)
+            lienzo.drawString(x + COLUMNAS_TABLA[0] + RELLENO_CELDA, base, valor)
+
+        lienzo.saveState()
+        lienzo.setLineCap(1)
+        lienzo.setLineJoin(1)
+        lienzo.setStrokeColor(COLORES['borde'])
+        lienzo.setLineWidth(1)
+        lineas = [(x, superior - ALTO_FILA * fila, x + ancho, superior - ALTO_FILA * fila)
+                  for fila in range(len(filas) + 1)]
+        lineas += [(x, inferior, x, superior), (x + ancho, inferior, x + ancho, superior),
+                   (x + COLUMNAS_TABLA[0], inferior, x + COLUMNAS_TABLA[0], superior)]
+        lienzo.lines(lineas)
+        lienzo.restoreState()
+
+
+def dibujar_parte(lienzo, parte):
+    """Dibuja el parte en el canvas; devuelve el número de páginas"""
+    if any(necesita_respaldo(getattr(parte, campo)) for campo in CAMPOS_PARRAFO):
+        # Los tramos en fuentes de respaldo los escribe Paragraph
+        raise _Desborde()
+    metricas = obtener_metricas()
+    maquetador = _Maquetador(lienzo)
+
+    maquetador.parrafo("PARTE DIARIO DE ATENCIÓN", metricas['titulo'])
+    maquetador.parrafo("Registro completo de cuidados y observaciones", metricas['subtitulo'])
+
+    maquetador.tabla([
+        ('Paciente:', parte.paciente or 'No especificado'),
+        ('Cuidadora:', parte.cuidadora or 'No especificada'),
+        ('Fecha:', parte.fecha_formateada),
+        ('Estado General:', parte.estado_general or 'No evaluado'),
+    ])
+    maquetador.espacio(30)
+
+    def seccion(titulo, contenido, metrica):
+        maquetador.parrafo(titulo, metricas['seccion'])
+        maquetador.parrafo(contenido, metrica)
+        maquetador.espacio(15)
+
+    for titulo, campo in SECCIONES_PDF:
+        contenido = getattr(parte, campo)
+        if contenido:
+            seccion(titulo, contenido, metricas['contenido'])
+    if parte.tiene_alerta:
+        seccion("SIGNOS DE ALERTA:", parte.signos_alerta, metricas['alerta'])
+    if parte.observaciones:
+        seccion("OBSERVACIONES ADICIONALES", parte.observaciones, metricas['contenido'])
+
+    # Firma
+    maquetador.espacio(40)
+    maquetador.parrafo("___________________________________", metricas['firma'])
+    maquetador.parrafo(parte.cuidadora or 'Cuidadora Responsable', metricas['firma'])
+    maquetador.parrafo("Cuidadora Responsable", metricas['firma'])
+
+    # Fecha de generación
+    maquetador.espacio(30)
+    maquetador.parrafo(
+        f"Documento generado el {parte.generado.strftime('%d/%m/%Y a las %H:%M')}",
+        metricas['footer'],
+    )
+    return maquetador.paginas
+
+
+def generar_pdf_canvas(datos):
+    """Genera el PDF del parte dibujando en el canvas; recurre a platypus si no es posible"""
+    parte = Parte.de(datos)
+    salida = SalidaEnTrozos()
+    lienzo = lienzo_determinista(parte)(salida, pagesize=A4)
+    # Los mismos metadatos que pone SimpleDocTemplate
+    lienzo.setAuthor('(anonymous)')
+    lienzo.setTitle('(anonymous)')
+    lienzo.setSubject('(unspecified)')
+    lienzo.setCreator('(unspecified)')
+
+    try:
+        with cronometro('pdf_canvas'):
+            paginas = dibujar_parte(lienzo, parte)
+            lienzo.save()
+    except _Desborde:
+        PDF_MOTOR.incrementar(motor='platypus')
+        return generar_pdf(parte)
+
+    pdf = salida.vaciar()
+
+    PDF_MOTOR.incrementar(motor='canvas')
+    PDF_GENERADOS.incrementar()
+    PDF_BYTES.incrementar(len(pdf))
+    PDF_PAGINAS.incrementar(paginas)
+
+    return pdf
@@ -0,0 +1,244 @@
+"""Generación del PDF del parte diario con ReportLab (platypus)"""
+import copy
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table
+
+from estilos_pdf import obtener_estilos
+from fuentes import con_respaldo, necesita_respaldo, registrar_fuentes
+from metricas import PDF_BYTES, PDF_GENERADOS, PDF_PAGINAS, cronometro
+from parte import Parte
+from salida_pdf import SalidaEnTrozos
+
+
+def fecha_pdf(generado):
+    """Formateador de la fecha de creación del PDF que escribe `generado`"""
+    minutos = int(generado.astimezone().utcoffset().total_seconds()) // 60
+    desfase = f"{'+' if minutos >= 0 else '-'}{abs(minutos) // 60:02d}'{abs(minutos) % 60:02d}'"
+    return lambda *_: f"D:{generado.strftime('%Y%m%d%H%M%S')}{desfase}"
+
+
+def lienzo_determinista(parte, firma=None):
+    """Fábrica de canvas cuyo PDF solo depende del parte y de su fecha `generado`.
+
+    En modo invariante ReportLab no mezcla la hora actual en el ID del
+    documento: el ID se deriva de `firma` (por defecto, el parte y su fecha)
+    y las fechas de creación y modificación se toman de `generado`.
+    """
+    if firma is None:
+        firma = repr((parte.como_dict(), parte.generado))
+
+    def crear(*args, **kwargs):
+        # La fuente inicial de la página es la del parte: así no se añade Helvetica
+        lienzo = canvas.Canvas(*args, **dict(kwargs, invariant=1, initialFontName=registrar_fuentes().normal))
+        lienzo.setDateFormatter(fecha_pdf(parte.generado))
+        lienzo._doc.updateSignature(firma)
+        return lienzo
+    return crear
+
+
+def nuevo_documento(destino):
+    """Crea el documento con el formato de página del parte"""
+    return SimpleDocTemplate(
+        destino,
+        pagesize=A4,
+        rightMargin=72,
+        leftMargin=72,
+        topMargin=72,
+        bottomMargin=72
+    )
+
+
+class ParrafoReutilizable(Paragraph):
+    """Paragraph que recuerda el resultado de wrap() para cada ancho.
+
+    Las copias superficiales (copy.copy) comparten el texto ya parseado y el
+    memo de wrap(), así que reutilizar un párrafo en otro documento con el
+    mismo ancho de marco no repite ni el parseo ni el corte en líneas.
+    """
+
+    # Atributos que deja wrap() y que necesitan drawOn() y split()
+    _ATRIBUTOS_WRAP = ('width', 'height', 'blPara', '_wrapWidths', '_width_max',
+                       '_splitLongWordCount', '_hyphenations')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._memo = {}
+
+    def wrap(self, availWidth, availHeight):
+        estado = self._memo.get(availWidth)
+        if estado is not None:
+            self.__dict__.update(estado)
+            return self.width, self.height
+        resultado = super().wrap(availWidth, availHeight)
+        self._memo[availWidth] = {
+            nombre: self.__dict__[nombre] for nombre in self._ATRIBUTOS_WRAP if nombre in self.__dict__
+        }
+        return resultado
+
+
+class CacheSecciones:
+    """Caché LRU de los flowables de cada sección, por hash de su contenido.
+
+    Los prototipos guardados nunca se maquetan: cada documento recibe copias
+    superficiales, así el estado de maquetación (canvas, _postponed...) no
+    pasa de un documento a otro.
+    """
+
+    def __init__(self, maximo=2048):
+        self.maximo = maximo
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def flowables(self, titulo, contenido, estilo_titulo, estilo_contenido):
+        """Devuelve los flowables de una sección, reutilizando los ya construidos"""
+        if not self.maximo:
+            return [Paragraph(titulo, estilo_titulo), Paragraph(contenido, estilo_contenido), Spacer(1, 15)]
+
+        clave = hashlib.sha1(
+            '\0'.join([estilo_titulo.name, estilo_contenido.name, titulo, contenido]).encode('utf-8')
+        ).digest()
+        with self._lock:
+            prototipos = self._entradas.get(clave)
+            if prototipos is not None:
+                self._entradas.move_to_end(clave)
+
+        if prototipos is None:
+            prototipos = (
+                ParrafoReutilizable(titulo, estilo_titulo),
+                ParrafoReutilizable(contenido, estilo_contenido),
+                Spacer(1, 15),
+            )
+            with self._lock:
+                self._entradas[clave] = prototipos
+                while len(self._entradas) > self.maximo:
+                    self._entradas.popitem(last=False)
+
+        return [copy.copy(flowable) for flowable in prototipos]
+
+
+# Flowables de secciones ya construidos (PARTE_CACHE_SECCIONES=0 la desactiva)
+cache_secciones = CacheSecciones(int(os.environ.get('PARTE_CACHE_SECCIONES', 2048)))
+
+
+# Secciones de texto del PDF en orden (título, campo); después van los signos
+# de alerta y las observaciones
+SECCIONES_PDF = (
+    ("ESTADO GENERAL", 'estado_detalle'),
+    ("MEDICACIÓN ADMINISTRADA", 'medicacion'),
+    ("ALIMENTACIÓN", 'alimentacion'),
+    ("HIDRATACIÓN", 'hidratacion'),
+    ("ELIMINACIÓN", 'eliminacion'),
+    ("DESCANSO Y SUEÑO", 'descanso'),
+    ("MOVILIDAD Y EJERCICIO", 'movilidad'),
+    ("HIGIENE Y CUIDADOS", 'higiene'),
+)
+
+
+def elementos_secciones(parte, estilos):
+    """Genera los flowables de las secciones de texto de un parte"""
+    marcado = parte.marcado
+
+    # Función para agregar secciones (solo se reconstruyen las que cambiaron)
+    def agregar_seccion(titulo, campo, estilo=estilos.contenido):
+        if marcado[campo]:
+            contenido = con_respaldo(marcado[campo])
+            yield from cache_secciones.flowables(titulo, contenido, estilos.seccion, estilo)
+
+    # Secciones dinámicas
+    for titulo, campo in SECCIONES_PDF:
+        yield from agregar_seccion(titulo, campo)
+
+    # Signos de alerta (si existen)
+    if parte.tiene_alerta:
+        yield from agregar_seccion("SIGNOS DE ALERTA:", 'signos_alerta', estilos.alerta)
+
+    yield from agregar_seccion("OBSERVACIONES ADICIONALES", 'observaciones')
+
+
+def celda_info(parte, campo, vacio, estilos):
+    """Valor de la tabla de información; párrafo si lleva caracteres de una fuente de respaldo"""
+    valor = getattr(parte, campo)
+    if not valor:
+        return vacio
+    if necesita_respaldo(valor):
+        # Las celdas de texto usan una sola fuente: los tramos de respaldo los escribe Paragraph
+        return Paragraph(con_respaldo(parte.marcado[campo]), estilos.celda)
+    return valor
+
+
+def construir_elementos(datos, estilos=None):
+    """Devuelve la lista de flowables de un parte (Parte o dict con sus campos)"""
+    parte = Parte.de(datos)
+
+    # Estilos compartidos (se construyen una sola vez por proceso)
+    if estilos is None:
+        estilos = obtener_estilos()
+
+    # Crear contenido
+    elementos = []
+
+    # Título
+    elementos.append(Paragraph("PARTE DIARIO DE ATENCIÓN", estilos.titulo))
+    elementos.append(Paragraph("Registro completo de cuidados y observaciones", estilos.subtitulo))
+
+    # Información básica
+    info_data = [
+        ['Paciente:', celda_info(parte, 'paciente', 'No especificado', estilos)],
+        ['Cuidadora:', celda_info(parte, 'cuidadora', 'No especificada', estilos)],
+        ['Fecha:', parte.fecha_formateada],
+        ['Estado General:', celda_info(parte, 'estado_general', 'No evaluado', estilos)]
+    ]
+
+    info_table = Table(info_data, colWidths=[100, 400])
+    info_table.setStyle(estilos.info_tabla)
+
+    elementos.append(info_table)
+    elementos.append(Spacer(1, 30))
+
+    # Secciones de texto
+    elementos.extend(elementos_secciones(parte, estilos))
+
+    # Firma
+    elementos.append(Spacer(1, 40))
+    elementos.append(Paragraph("___________________________________", estilos.firma))
+    elementos.append(Paragraph(con_respaldo(parte.marcado['cuidadora']) or 'Cuidadora Responsable', estilos.firma))
+    elementos.append(Paragraph("Cuidadora Responsable", estilos.firma))
+
+    # Fecha de generación
+    elementos.append(Spacer(1, 30))
+    elementos.append(Paragraph(
+        f"Documento generado el {parte.generado.strftime('%d/%m/%Y a las %H:%M')}",
+        estilos.footer
+    ))
+
+    return elementos
+
+
+def generar_pdf(datos):
+    """Genera un PDF profesional del parte diario"""
+    parte = Parte.de(datos)
+    salida = SalidaEnTrozos()
+
+    # Configurar el documento
+    doc = nuevo_documento(salida)
+
+    # Construir PDF
+    with cronometro('pdf_elementos'):
+        elementos = construir_elementos(parte)
+    with cronometro('pdf_build'):
+        doc.build(elementos, canvasmaker=lienzo_determinista(parte))
+
+    # Los bytes que escribió ReportLab, sin copia intermedia
+    pdf = salida.vaciar()
+
+    PDF_GENERADOS.incrementar()
+    PDF_BYTES.incrementar(len(pdf))
+    PDF_PAGINAS.incrementar(doc.page)
+
+    return pdf
@@ -0,0 +1,151 @@
+"""Perfilado bajo demanda de peticiones concretas.
+
+Un administrador (cabecera X-Admin-Token igual a PARTE_ADMIN_TOKEN) puede
+pedir que su petición se ejecute bajo un perfilador con la cabecera
+`X-Perfil` o el parámetro `?perfil=`:
+
+- cprofile: perfil determinista de cProfile, guardado como .prof (pstats)
+- muestreo: muestreo de la pila del hilo cada pocos milisegundos, guardado
+  como pilas colapsadas (.txt, compatible con flamegraph.pl / speedscope)
+
+Los perfiles se guardan en un buffer circular en disco: al superar el
+máximo se borran los más antiguos.
+"""
+import cProfile
+import hmac
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+TIPOS = ('cprofile', 'muestreo')
+
+_NOMBRE_VALIDO = re.compile(r'^[\w.-]+\.(prof|txt)$')
+
+
+class _Muestreador:
+    """Muestrea la pila de un hilo desde un hilo auxiliar"""
+
+    def __init__(self, intervalo=0.002):
+        self.intervalo = intervalo
+        self.pilas = Counter()
+        self._hilo_objetivo = threading.get_ident()
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._bucle, name='muestreador', daemon=True)
+
+    def iniciar(self):
+        self._hilo.start()
+
+    def detener(self):
+        self._parar.set()
+        self._hilo.join()
+
+    def _bucle(self):
+        while not self._parar.wait(self.intervalo):
+            marco = sys._current_frames().get(self._hilo_objetivo)
+            pila = []
+            while marco is not None:
+                codigo = marco.f_code
+                pila.append(f'{os.path.basename(codigo.co_filename)}:{codigo.co_name}')
+                marco = marco.f_back
+            if pila:
+                self.pilas[';'.join(reversed(pila))] += 1
+
+    def colapsado(self):
+        return ''.join(f'{pila} {cantidad}\n' for pila, cantidad in self.pilas.most_common())
+
+
+class Perfilador:
+    """Gestiona los perfiles de peticiones y su buffer circular en disco"""
+
+    def __init__(self, directorio, token=None, maximo=50):
+        self.directorio = directorio
+        self.token = token
+        self.maximo = maximo
+        self._lock = threading.Lock()
+
+    @classmethod
+    def desde_entorno(cls, directorio_por_defecto):
+        return cls(
+            os.environ.get('PARTE_PERFILES_DIR') or os.path.join(directorio_por_defecto, 'perfiles'),
+            token=os.environ.get('PARTE_ADMIN_TOKEN') or None,
+            maximo=int(os.environ.get('PARTE_PERFILES_MAX', 50)),
+        )
+
+    def es_admin(self, request):
+        """True si la petición trae el token de administración correcto"""
+        enviado = request.headers.get('X-Admin-Token', '')
+        return bool(self.token) and hmac.compare_digest(enviado.encode(), self.token.encode())
+
+    def tipo_pedido(self, request):
+        """Tipo de perfil solicitado por la petición, o None"""
+        tipo = request.headers.get('X-Perfil') or request.args.get('perfil')
+        if not tipo:
+            return None
+        return 'cprofile' if tipo == '1' else tipo
+
+    def iniciar(self, tipo):
+        """Arranca el perfilador del hilo actual y devuelve un objeto para detenerlo"""
+        if tipo == 'cprofile':
+            perfil = cProfile.Profile()
+            perfil.enable()
+        else:
+            perfil = _Muestreador()
+            perfil.iniciar()
+        return tipo, perfil, time.perf_counter()
+
+    def terminar(self, sesion, ruta):
+        """Detiene el perfilador y guarda el resultado; devuelve el nombre del archivo"""
+        tipo, perfil, inicio = sesion
+        duracion_ms = (time.perf_counter() - inicio) * 1000
+        ruta_limpia = re.sub(r'[^\w]+', '_', ruta).strip('_') or 'raiz'
+        marca = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+        extension = 'prof' if tipo == 'cprofile' else 'txt'
+        nombre = f'{marca}_{ruta_limpia}_{tipo}_{duracion_ms:.0f}ms.{extension}'
+
+        os.makedirs(self.directorio, exist_ok=True)
+        destino = os.path.join(self.directorio, nombre)
+        if tipo == 'cprofile':
+            perfil.disable()
+            perfil.dump_stats(destino)
+        else:
+            perfil.detener()
+            with open(destino, 'w') as archivo:
+                archivo.write(perfil.colapsado())
+        self._recortar()
+        return nombre
+
+    def _recortar(self):
+        with self._lock:
+            perfiles = sorted(self.listar(), key=lambda perfil: perfil['nombre'])
+            for perfil in perfiles[:max(0, len(perfiles) - self.maximo)]:
+                try:
+                    os.unlink(os.path.join(self.directorio, perfil['nombre']))
+                except FileNotFoundError:
+                    pass
+
+    def listar(self):
+        """Perfiles guardados, del más reciente al más antiguo"""
+        if not os.path.isdir(self.directorio):
+            return []
+        perfiles = []
+        for nombre in os.listdir(self.directorio):
+            if not _NOMBRE_VALIDO.match(nombre):
+                continue
+            try:
+                info = os.stat(os.path.join(self.directorio, nombre))
+            except FileNotFoundError:
+                continue
+            perfiles.append({
+                'nombre': nombre,
+                'bytes': info.st_size,
+                'creado': datetime.fromtimestamp(info.st_mtime).isoformat(timespec='seconds'),
+            })
+        perfiles.sort(key=lambda perfil: perfil['nombre'], reverse=True)
+        return perfiles
+
+    def nombre_valido(self, nombre):
+        return bool(_NOMBRE_VALIDO.match(nombre))
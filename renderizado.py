@@ -0,0 +1,142 @@
+"""Backend de renderizado de PDF: en el propio proceso o en un pool de procesos.
+
+Con `PARTE_RENDER_PROCESOS=0` (valor por defecto, pensado para desarrollo)
+`generar_pdf` se ejecuta en el mismo proceso que atiende la petición. Con un
+valor mayor que cero el trabajo de ReportLab se envía a un ProcessPoolExecutor
+acotado, de modo que el worker de gunicorn no queda ocupado durante el layout.
+
+El motor de cada parte se elige por petición: `platypus` (generar_pdf) o
+`canvas` (generar_pdf_canvas, que dibuja la plantilla fija directamente).
+Los motores se importan en el primer uso, y con pool solo en los procesos
+del pool: el worker que atiende las peticiones no necesita cargar ReportLab.
+"""
+import importlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturoTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from parte import Parte
+
+
+# Motores de renderizado de un parte: nombre -> (módulo, función)
+MOTORES = {
+    'platypus': ('pdf_parte', 'generar_pdf'),
+    'canvas': ('pdf_canvas', 'generar_pdf_canvas'),
+}
+
+
+class ColaLlena(Exception):
+    """No quedan plazas libres en la cola de renderizado"""
+
+
+class TiempoAgotado(Exception):
+    """El renderizado no terminó dentro del plazo configurado"""
+
+
+def motor_pdf(nombre):
+    """Función que genera el PDF de un parte con el motor `nombre`"""
+    modulo, funcion = MOTORES[nombre]
+    return getattr(importlib.import_module(modulo), funcion)
+
+
+def generar_con_motor(motor, datos):
+    # Función de nivel superior: se envía al pool por referencia y el motor
+    # se importa ya dentro del proceso que lo ejecuta
+    return motor_pdf(motor)(datos)
+
+
+def generar_lote(formato, partes):
+    # Como generar_con_motor: lote_pdf se importa en el proceso que lo ejecuta
+    from lote_pdf import FORMATOS
+    return FORMATOS[formato](partes)
+
+
+def _inicializar_proceso():
+    # Precalienta el registro de estilos en cada proceso del pool
+    from estilos_pdf import obtener_estilos
+    obtener_estilos()
+
+
+class RenderizadorPDF:
+    """Punto de entrada único para generar PDF, con o sin pool de procesos"""
+
+    def __init__(self, procesos=0, timeout=30, cola=None):
+        self.procesos = procesos
+        self.timeout = timeout
+        # Trabajos admitidos a la vez: los que se ejecutan más los que esperan
+        self.capacidad = procesos + (procesos * 2 if cola is None else cola)
+        self._plazas = threading.BoundedSemaphore(self.capacidad) if procesos else None
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def desde_entorno(cls):
+        cola = os.environ.get('PARTE_RENDER_COLA')
+        return cls(
+            procesos=int(os.environ.get('PARTE_RENDER_PROCESOS', 0)),
+            timeout=float(os.environ.get('PARTE_RENDER_TIMEOUT', 30)),
+            cola=int(cola) if cola is not None else None,
+        )
+
+    @property
+    def en_proceso(self):
+        return not self.procesos
+
+    def _executor(self):
+        # El pool se crea en el primer uso, ya dentro del worker de gunicorn
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.procesos,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_inicializar_proceso,
+                )
+            return self._pool
+
+    def ejecutar(self, funcion, *args, timeout=None):
+        """Ejecuta `funcion(*args)` en el pool (o en el proceso si no hay pool)"""
+        if self.en_proceso:
+            return funcion(*args)
+
+        if not self._plazas.acquire(blocking=False):
+            raise ColaLlena()
+
+        try:
+            futuro = self._executor().submit(funcion, *args)
+        except BaseException as error:
+            self._plazas.release()
+            if isinstance(error, BrokenProcessPool):
+                self._descartar_pool()
+            raise
+        # La plaza se libera cuando el proceso termina de verdad, aunque el
+        # cliente ya haya recibido un timeout
+        futuro.add_done_callback(lambda _: self._plazas.release())
+
+        try:
+            return futuro.result(timeout=self.timeout if timeout is None else timeout)
+        except FuturoTimeout:
+            futuro.cancel()
+            raise TiempoAgotado()
+        except BrokenProcessPool:
+            # Un proceso murió (p. ej. por falta de memoria): se recrea el pool
+            self._descartar_pool()
+            raise
+
+    def _descartar_pool(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def renderizar(self, datos, motor='platypus'):
+        """Genera el PDF de un parte con el motor indicado y devuelve sus bytes"""
+        return self.ejecutar(generar_con_motor, motor, Parte.de(datos))
+
+    def renderizar_lote(self, partes, formato='pdf', timeout=None):
+        """Genera un lote de partes en un PDF o un ZIP (ver lote_pdf) y devuelve sus bytes"""
+        return self.ejecutar(generar_lote, formato, partes, timeout=timeout)
+
+    def cerrar(self):
+        self._descartar_pool()
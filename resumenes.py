@@ -0,0 +1,119 @@
+"""Tablas de resumen (rollups) de los partes por paciente y por cuidadora.
+
+Hay una tabla por dimensión y periodo (resumen_paciente_dia,
+resumen_paciente_semana, resumen_cuidadora_dia, resumen_cuidadora_semana)
+con el número de partes, la distribución de estado_general y los partes con
+signos de alerta. Unos triggers sobre `partes` las mantienen al día en la
+misma transacción de cada guardado, así que las consultas de los paneles
+leen unas pocas filas por periodo sin recorrer el histórico.
+
+Las semanas se identifican por la fecha de su lunes (semana ISO).
+"""
+
+DIMENSIONES = ('paciente', 'cuidadora')
+
+# Periodo -> expresión SQL que lo calcula a partir de una fecha AAAA-MM-DD
+PERIODOS = {
+    'dia': '{fecha}',
+    'semana': "date({fecha}, 'weekday 0', '-6 days')",
+}
+
+ESTADOS = ('Bueno', 'Regular', 'Malo')
+
+# Contadores de cada fila de resumen
+CONTADORES = ('partes', 'bueno', 'regular', 'malo', 'sin_estado', 'con_alerta')
+
+
+def tabla(dimension, periodo):
+    return f'resumen_{dimension}_{periodo}'
+
+
+def expresion_periodo(periodo, fecha):
+    return PERIODOS[periodo].format(fecha=fecha)
+
+
+def _valores(fila, signo=''):
+    """Contadores que aporta un parte (`fila` es new u old en un trigger)"""
+    estado = f'lower({fila}.estado_general)'
+    estados = ', '.join(f"{signo}({estado} = '{nombre.lower()}')" for nombre in ESTADOS)
+    otros = ', '.join(f"'{nombre.lower()}'" for nombre in ESTADOS)
+    return f"{signo}1, {estados}, {signo}({estado} NOT IN ({otros})), {signo}({fila}.signos_alerta != '')"
+
+
+def _acumular(dimension, periodo, fila, signo=''):
+    nombre = tabla(dimension, periodo)
+    clave = f'{fila}.{dimension}'
+    fecha = expresion_periodo(periodo, f'{fila}.fecha')
+    sentencia = (
+        f"INSERT INTO {nombre} ({dimension}, periodo, {', '.join(CONTADORES)}) "
+        f"VALUES ({clave}, {fecha}, {_valores(fila, signo)}) "
+        f"ON CONFLICT ({dimension}, periodo) DO UPDATE SET "
+        + ', '.join(f'{c} = {c} + excluded.{c}' for c in CONTADORES) + ';'
+    )
+    if signo:
+        # Las filas que se quedan sin partes se eliminan
+        sentencia += f"\n    DELETE FROM {nombre} WHERE {dimension} = {clave} AND periodo = {fecha} AND partes = 0;"
+    return sentencia
+
+
+def _esquema():
+    sentencias = []
+    for dimension in DIMENSIONES:
+        for periodo in PERIODOS:
+            nombre = tabla(dimension, periodo)
+            sentencias.append(
+                f"CREATE TABLE IF NOT EXISTS {nombre} (\n"
+                f"    {dimension} TEXT NOT NULL,\n"
+                f"    periodo TEXT NOT NULL,\n"
+                + ''.join(f'    {c} INTEGER NOT NULL DEFAULT 0,\n' for c in CONTADORES)
+                + f"    PRIMARY KEY ({dimension}, periodo)\n) WITHOUT ROWID;\n"
+                f"CREATE INDEX IF NOT EXISTS idx_{nombre}_periodo ON {nombre} (periodo);"
+            )
+
+    def trigger(evento, cuerpo):
+        return (f"CREATE TRIGGER IF NOT EXISTS partes_resumen_{evento.lower()} AFTER {evento} ON partes BEGIN\n"
+                f"    {cuerpo}\nEND;")
+
+    combinaciones = [(d, p) for d in DIMENSIONES for p in PERIODOS]
+    sentencias.append(trigger('INSERT', '\n    '.join(_acumular(d, p, 'new') for d, p in combinaciones)))
+    sentencias.append(trigger('DELETE', '\n    '.join(_acumular(d, p, 'old', '-') for d, p in combinaciones)))
+    sentencias.append(trigger('UPDATE', '\n    '.join(
+        [_acumular(d, p, 'old', '-') for d, p in combinaciones] + [_acumular(d, p, 'new') for d, p in combinaciones]
+    )))
+    return '\n'.join(sentencias)
+
+
+ESQUEMA_RESUMENES = _esquema()
+
+
+def rellenar(conexion):
+    """Calcula los resúmenes de los partes ya guardados (bases anteriores a las tablas)"""
+    estado = 'lower(estado_general)'
+    otros = ', '.join(f"'{nombre.lower()}'" for nombre in ESTADOS)
+    sumas = ', '.join(
+        ['COUNT(*)']
+        + [f"SUM({estado} = '{nombre.lower()}')" for nombre in ESTADOS]
+        + [f'SUM({estado} NOT IN ({otros}))', "SUM(signos_alerta != '')"]
+    )
+    with conexion:
+        for dimension in DIMENSIONES:
+            for periodo in PERIODOS:
+                fecha = expresion_periodo(periodo, 'fecha')
+                conexion.execute(
+                    f"INSERT INTO {tabla(dimension, periodo)} ({dimension}, periodo, {', '.join(CONTADORES)}) "
+                    f"SELECT {dimension}, {fecha}, {sumas} FROM partes GROUP BY {dimension}, {fecha}"
+                )
+
+
+def como_dict(fila):
+    """Fila de resumen en el formato de la API"""
+    return {
+        'partes': fila['partes'],
+        'estados': {
+            'Bueno': fila['bueno'],
+            'Regular': fila['regular'],
+            'Malo': fila['malo'],
+            'Sin estado': fila['sin_estado'],
+        },
+        'con_alerta': fila['con_alerta'],
+    }
@@ -0,0 +1,50 @@
+"""Salida de los PDF generados: destino de escritura, envío en trozos y nombre.
+
+No depende de ReportLab, así que quien solo entrega PDF ya generados (la
+caché, el archivo en Drive, las descargas) no carga la librería.
+"""
+from parte import Parte
+
+# Tamaño de los fragmentos enviados al cliente
+TAMANO_TROZO = 64 * 1024
+
+
+class SalidaEnTrozos:
+    """Destino de escritura no posicionable que acumula bytes hasta que se consumen.
+
+    Guarda referencias a los bloques recibidos sin copiarlos: ReportLab escribe
+    el documento completo en una única llamada a write() al finalizarlo.
+    """
+
+    # pyarrow comprueba este atributo antes de escribir en un archivo de Python
+    closed = False
+
+    def __init__(self):
+        self._pendiente = []
+
+    def write(self, datos):
+        self._pendiente.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        """Devuelve (y olvida) los bytes escritos desde la última llamada"""
+        pendiente, self._pendiente = self._pendiente, []
+        return b''.join(pendiente)
+
+
+def en_trozos(contenido, tamano=TAMANO_TROZO):
+    """Recorre `contenido` en fragmentos de `tamano` bytes"""
+    vista = memoryview(contenido)
+    try:
+        for inicio in range(0, len(vista), tamano):
+            yield bytes(vista[inicio:inicio + tamano])
+    finally:
+        vista.release()
+
+
+def nombre_archivo_pdf(datos):
+    """Nombre de descarga del PDF: parte_diario_<paciente>_<AAAAMMDD>.pdf"""
+    return Parte.de(datos).nombre_archivo
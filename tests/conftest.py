@@ -0,0 +1,36 @@
+"""Configuración de pytest: los módulos de la aplicación están en la raíz del repositorio"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+# La aplicación se importa una vez por sesión: base de datos y directorios
+# temporales, nunca los de instance/
+TEMPORAL = tempfile.mkdtemp(prefix='partes-pruebas-')
+os.environ.setdefault('PARTE_DB', os.path.join(TEMPORAL, 'partes.db'))
+os.environ.setdefault('PARTE_TRABAJOS_DIR', os.path.join(TEMPORAL, 'trabajos'))
+os.environ.setdefault('PARTE_PERFILES_DIR', os.path.join(TEMPORAL, 'perfiles'))
+
+
+def parte_prueba(paciente, fecha, estado='Bueno', alerta='', cuidadora='Ana'):
+    """Datos de un parte para las pruebas del almacenamiento"""
+    return {
+        'paciente': paciente,
+        'cuidadora': cuidadora,
+        'fecha': fecha,
+        'estado_general': estado,
+        'signos_alerta': alerta,
+        'observaciones': 'sin novedad',
+    }
+
+
+@pytest.fixture
+def almacen(tmp_path):
+    """Base de datos vacía para una prueba"""
+    from almacenamiento import Almacen
+    return Almacen(str(tmp_path / 'partes.db'))
@@ -0,0 +1,53 @@
+"""Pruebas de la API JSON /api/v1/partes/*: los partes no válidos se rechazan con 422."""
+import pytest
+
+import app as aplicacion
+from parte import LONGITUD_MAXIMA
+
+RUTAS = ['/api/v1/partes/validar', '/api/v1/partes/vista-previa', '/api/v1/partes/pdf', '/api/v1/partes']
+
+NO_VALIDOS = [
+    ({'desconocido': 'x'}, 'desconocido', 'Campo desconocido'),
+    ({'observaciones': 5}, 'observaciones', 'Debe ser una cadena de texto'),
+    ({'cuidadora': ['Ana']}, 'cuidadora', 'Debe ser una cadena de texto'),
+    ({'observaciones': 'x' * (LONGITUD_MAXIMA + 1)}, 'observaciones', f'Supera los {LONGITUD_MAXIMA} caracteres'),
+]
+
+
+def _parte(**campos):
+    return dict({'paciente': 'Rosa', 'fecha': '2024-03-04', 'observaciones': 'Sin novedad'}, **campos)
+
+
+def _guardados():
+    return aplicacion.almacen.conexion().execute('SELECT COUNT(*) FROM partes').fetchone()[0]
+
+
+@pytest.fixture
+def cliente():
+    return aplicacion.app.test_client()
+
+
+@pytest.mark.parametrize('ruta', RUTAS)
+@pytest.mark.parametrize('campos, campo, mensaje', NO_VALIDOS)
+def test_parte_no_valido(cliente, ruta, campos, campo, mensaje):
+    guardados = _guardados()
+    respuesta = cliente.post(ruta, json=_parte(**campos))
+    assert respuesta.status_code == 422
+    assert respuesta.get_json() == {'valido': False, 'errores': {campo: mensaje}}
+    assert _guardados() == guardados
+
+
+@pytest.mark.parametrize('campos, campo, mensaje', NO_VALIDOS)
+def test_lote_no_valido(cliente, campos, campo, mensaje):
+    guardados = _guardados()
+    respuesta = cliente.post('/api/v1/partes/lote', json=[_parte(), _parte(**campos)])
+    assert respuesta.status_code == 422
+    assert respuesta.get_json() == {'valido': False, 'errores': {'1': {campo: mensaje}}}
+    # Si uno no es válido no se guarda ninguno
+    assert _guardados() == guardados
+
+
+def test_en_el_limite_es_valido(cliente):
+    respuesta = cliente.post('/api/v1/partes/validar', json=_parte(observaciones='x' * LONGITUD_MAXIMA))
+    assert respuesta.status_code == 200
+    assert respuesta.get_json()['valido'] is True
@@ -0,0 +1,70 @@
+"""Pruebas del modo ASGI: las rutas de Flask pasan por el adaptador WSGI en hilos."""
+import asyncio
+import json
+import threading
+
+import asgi
+
+
+def _peticion(metodo, ruta, cuerpo=b'', cabeceras=(), trozos=1):
+    """Ejecuta una petición HTTP contra la aplicación ASGI; devuelve (estado, cabeceras, cuerpo, mensajes)"""
+    scope = {
+        'type': 'http',
+        'http_version': '1.1',
+        'method': metodo,
+        'scheme': 'http',
+        'path': ruta.split('?')[0],
+        'query_string': ruta.partition('?')[2].encode(),
+        'root_path': '',
+        'headers': [(nombre.encode(), valor.encode()) for nombre, valor in cabeceras],
+        'client': ('127.0.0.1', 5000),
+        'server': ('testserver', 80),
+    }
+    tamano = -(-len(cuerpo) // trozos) or 1
+    entrantes = [{'type': 'http.request', 'body': cuerpo[i:i + tamano], 'more_body': i + tamano < len(cuerpo)}
+                 for i in range(0, max(len(cuerpo), 1), tamano)]
+    enviados = []
+
+    async def receive():
+        return entrantes.pop(0)
+
+    async def send(mensaje):
+        enviados.append(mensaje)
+
+    asyncio.run(asgi.aplicacion(scope, receive, send))
+    inicio = enviados[0]
+    assert inicio['type'] == 'http.response.start'
+    assert enviados[-1] == {'type': 'http.response.body', 'body': b''}
+    cuerpo = b''.join(mensaje.get('body', b'') for mensaje in enviados[1:])
+    return inicio['status'], dict(inicio['headers']), cuerpo, enviados
+
+
+def test_get_por_flask():
+    estado, cabeceras, cuerpo, _ = _peticion('GET', '/')
+    assert estado == 200
+    assert cabeceras[b'content-type'].startswith(b'text/html')
+    assert len(cuerpo) == int(cabeceras[b'content-length'])
+
+
+def test_cuerpo_en_varios_mensajes():
+    datos = json.dumps({'paciente': 'Rosa', 'fecha': '2024-03-04', 'observaciones': 'x' * 5000}).encode()
+    estado, _, cuerpo, _ = _peticion('POST', '/api/v1/partes/validar', datos,
+                                     [('content-type', 'application/json'), ('content-length', str(len(datos)))],
+                                     trozos=4)
+    assert estado == 200
+    assert json.loads(cuerpo)['parte']['observaciones'] == 'x' * 5000
+
+
+def test_la_vista_se_ejecuta_en_el_pool(monkeypatch):
+    hilos = []
+
+    def aplicacion_wsgi(environ, start_response):
+        hilos.append(threading.current_thread().name)
+        start_response('201 Created', [('Content-Type', 'text/plain'), ('X-Ruta', environ['PATH_INFO'])])
+        return [b'uno', b'', b'dos']
+
+    monkeypatch.setattr(asgi, '_wsgi', asgi._WsgiEnHilos(aplicacion_wsgi))
+    estado, cabeceras, cuerpo, enviados = _peticion('GET', '/x?y=1')
+    assert (estado, cabeceras[b'x-ruta'], cuerpo) == (201, b'/x', b'unodos')
+    assert len(enviados) == 4
+    assert hilos[0].startswith('asgi-wsgi')
@@ -0,0 +1,55 @@
+"""Pruebas de la búsqueda de texto: la consulta FTS5 se construye con entradas hostiles
+y se ejecuta contra una base real."""
+import sqlite3
+
+import pytest
+
+from almacenamiento import consulta_fts
+from conftest import parte_prueba as _parte
+
+
+@pytest.mark.parametrize('texto, consulta', [
+    ('fiebre alta', '"fiebre" "alta"'),
+    ('"dolor de cabeza"', '"dolor de cabeza"'),
+    ('medic*', '"medic"*'),
+    ('fiebre OR NOT tos', '"fiebre" "OR" "NOT" "tos"'),
+    ('"sin cerrar', '"sin" "cerrar"'),
+    ("o'neil", '"o neil"'),
+    ('paciente:Ana', '"paciente Ana"'),
+    ('NEAR(a b)', '"NEAR a" "b"'),
+])
+def test_consulta_fts(texto, consulta):
+    assert consulta_fts(texto) == consulta
+
+
+def test_consulta_fts_por_campos():
+    assert consulta_fts('tos', ['paciente', 'cuidadora']) == '{paciente cuidadora} : ("tos")'
+
+
+@pytest.mark.parametrize('texto', ['', '   ', '*** "" -', '(*)', '""'])
+def test_consulta_fts_sin_terminos(texto):
+    with pytest.raises(ValueError):
+        consulta_fts(texto)
+
+
+@pytest.mark.parametrize('texto', [
+    'fiebre OR', 'AND tos', 'NOT', '"', '""fiebre""', 'col:val', '^x', 'a-b', 'NEAR(a b, 2)',
+    'fiebre*', '*fiebre', "'; DROP TABLE partes; --", '{paciente} : x', 'medicación',
+])
+def test_busqueda_con_entradas_hostiles(almacen, texto):
+    almacen.guardar(_parte('Luis', '2024-03-04'))
+    try:
+        consulta = consulta_fts(texto)
+    except ValueError:
+        return
+    # Nunca debe llegar a SQLite una expresión FTS5 mal formada
+    try:
+        almacen.buscar(texto)
+    except sqlite3.OperationalError as error:
+        pytest.fail(f'{texto!r} -> {consulta!r}: {error}')
+
+
+def test_busqueda_sin_diacriticos(almacen):
+    almacen.guardar(dict(_parte('Luis', '2024-03-04'), medicacion='Medicación de la mañana'))
+    resultados, _ = almacen.buscar('medicacion manana')
+    assert [r['paciente'] for r in resultados] == ['Luis']
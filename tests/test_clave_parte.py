@@ -0,0 +1,62 @@
+"""Pruebas de cache_pdf.clave_parte: estable ante envíos equivalentes, distinta con otro motor u otras fuentes."""
+import os
+import subprocess
+import sys
+
+import pytest
+
+from cache_pdf import clave_parte
+from conftest import RAIZ
+
+DATOS = {
+    'paciente': 'Luis Pérez',
+    'cuidadora': 'Ana',
+    'fecha': '2024-03-04',
+    'estado_general': 'Bueno',
+    'observaciones': 'Pasó buena noche.\nDesayunó bien.',
+}
+
+
+def test_orden_de_los_campos():
+    invertido = dict(reversed(list(DATOS.items())))
+    assert list(invertido) != list(DATOS)
+    assert clave_parte(invertido) == clave_parte(DATOS)
+
+
+@pytest.mark.parametrize('equivalente', [
+    dict(DATOS, paciente='  Luis Pérez \n'),
+    dict(DATOS, observaciones='Pasó buena noche.\r\nDesayunó bien.'),
+    dict(DATOS, observaciones='Pasó buena noche.\rDesayunó bien.'),
+    dict(DATOS, signos_alerta=None, medicacion=''),
+])
+def test_envios_equivalentes(equivalente):
+    assert clave_parte(equivalente) == clave_parte(DATOS)
+
+
+def test_cambia_con_el_contenido():
+    assert clave_parte(dict(DATOS, observaciones='Pasó mala noche.\nDesayunó bien.')) != clave_parte(DATOS)
+
+
+def test_cambia_con_el_motor():
+    assert clave_parte(DATOS, 'canvas') != clave_parte(DATOS, 'platypus')
+    assert clave_parte(DATOS, 'canvas') == clave_parte(dict(DATOS), 'canvas')
+
+
+def _clave_con_fuentes(**entorno):
+    """clave_parte(DATOS) en un proceso nuevo: la huella de las fuentes se calcula al importar cache_pdf"""
+    entorno = dict(os.environ, PARTE_FUENTES_RESPALDO='', **entorno)
+    codigo = f'from cache_pdf import clave_parte; print(clave_parte({DATOS!r}))'
+    return subprocess.run([sys.executable, '-c', codigo], cwd=RAIZ, env=entorno, check=True,
+                          capture_output=True, text=True).stdout.strip()
+
+
+def test_cambia_con_las_fuentes(tmp_path):
+    fuente = tmp_path / 'Fuente.ttf'
+    fuente.write_bytes(b'fuente 1')
+    primera = _clave_con_fuentes(PARTE_FUENTE=str(fuente))
+    assert _clave_con_fuentes(PARTE_FUENTE=str(fuente)) == primera
+
+    # Mismo archivo con otro contenido (p. ej. otra versión de DejaVu)
+    fuente.write_bytes(b'fuente 2')
+    assert _clave_con_fuentes(PARTE_FUENTE=str(fuente)) != primera
+    assert _clave_con_fuentes(PARTE_FUENTE='Helvetica') != primera
@@ -0,0 +1,36 @@
+"""Pruebas de /api/partes/exportar: reservada a administradores."""
+import json
+
+import pytest
+
+import app as aplicacion
+
+TOKEN = 'token-de-prueba'
+
+
+@pytest.fixture
+def cliente(monkeypatch):
+    monkeypatch.setattr(aplicacion.perfilador, 'token', TOKEN)
+    aplicacion.almacen.guardar({'paciente': 'Exportado', 'fecha': '2024-03-04', 'observaciones': 'Dato de salud'})
+    return aplicacion.app.test_client()
+
+
+@pytest.mark.parametrize('cabeceras', [{}, {'X-Admin-Token': 'otro'}, {'X-Admin-Token': ''}])
+def test_exportar_sin_token(cliente, cabeceras):
+    respuesta = cliente.get('/api/partes/exportar?formato=jsonl', headers=cabeceras)
+    assert respuesta.status_code == 403
+    assert b'Dato de salud' not in respuesta.data
+
+
+def test_exportar_sin_token_configurado(cliente, monkeypatch):
+    monkeypatch.setattr(aplicacion.perfilador, 'token', None)
+    assert cliente.get('/api/partes/exportar', headers={'X-Admin-Token': ''}).status_code == 403
+
+
+def test_exportar_como_administrador(cliente):
+    respuesta = cliente.get('/api/partes/exportar?formato=jsonl&paciente=Exportado',
+                            headers={'X-Admin-Token': TOKEN})
+    assert respuesta.status_code == 200
+    assert respuesta.headers['Cache-Control'] == 'no-store'
+    filas = [json.loads(linea) for linea in respuesta.data.splitlines()]
+    assert filas and all(fila['paciente'] == 'Exportado' for fila in filas)
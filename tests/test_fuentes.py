@@ -0,0 +1,55 @@
+"""Pruebas de las fuentes del PDF: las de static/fonts y el respaldo para emoji."""
+import os
+
+import pytest
+from reportlab.platypus import Paragraph
+
+from fuentes import DIRECTORIO_PROPIO, cobertura, con_respaldo, registrar_fuentes, rutas_fuentes
+from parte import Parte
+from pdf_parte import construir_elementos
+from renderizado import generar_con_motor
+
+EMOJI = '\U0001F464\U0001F48A'
+
+DATOS = {
+    'paciente': f'Rosa {EMOJI[0]} <b>',
+    'cuidadora': 'Ana',
+    'fecha': '2024-03-04',
+    'estado_general': f'Bueno {EMOJI[1]}',
+    'observaciones': 'Sin novedad',
+}
+
+
+@pytest.fixture(autouse=True)
+def fuentes_propias():
+    for variable in ('PARTE_FUENTE', 'PARTE_FUENTE_NEGRITA', 'PARTE_FUENTES_RESPALDO'):
+        if variable in os.environ:
+            pytest.skip(f'{variable} cambia las fuentes del proceso')
+
+
+def test_fuentes_de_la_aplicacion():
+    normal, negrita, respaldo = rutas_fuentes()
+    assert normal == os.path.join(DIRECTORIO_PROPIO, 'DejaVuSans.ttf')
+    assert negrita == os.path.join(DIRECTORIO_PROPIO, 'DejaVuSans-Bold.ttf')
+    assert respaldo[0] == os.path.join(DIRECTORIO_PROPIO, 'NotoEmoji-Regular.ttf')
+    assert all(ord(caracter) in cobertura(registrar_fuentes().respaldo[0]) for caracter in EMOJI)
+
+
+def test_respaldo_en_parrafos():
+    assert con_respaldo('Paracetamol') == 'Paracetamol'
+    assert con_respaldo(f'Paracetamol {EMOJI[1]}') == f'Paracetamol <font face="NotoEmoji-Regular">{EMOJI[1]}</font>'
+
+
+def test_respaldo_en_la_tabla_de_informacion():
+    tabla = construir_elementos(DATOS)[2]
+    paciente, cuidadora, fecha, estado = (fila[1] for fila in tabla._cellvalues)
+    assert isinstance(paciente, Paragraph) and isinstance(estado, Paragraph)
+    assert 'NotoEmoji-Regular' in paciente.text and '&lt;b&gt;' in paciente.text
+    # Sin caracteres de respaldo la celda sigue siendo texto
+    assert (cuidadora, fecha) == ('Ana', '04/03/2024')
+
+
+@pytest.mark.parametrize('motor', ['platypus', 'canvas'])
+def test_pdf_con_emoji_en_la_cabecera(motor):
+    pdf = generar_con_motor(motor, Parte(DATOS))
+    assert b'NotoEmoji' in pdf
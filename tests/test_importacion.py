@@ -0,0 +1,116 @@
+"""Pruebas de la importación masiva: reanudar desde el punto de control da la misma salida."""
+import json
+import os
+import zipfile
+
+import pytest
+
+import importacion
+from importacion import Importacion
+
+# Los registros 5 y 7 se rechazan: sin fecha y con un campo desconocido
+REGISTROS = [
+    {'paciente': f'Paciente {numero}', 'fecha': f'2024-03-{numero:02d}', 'observaciones': 'Sin novedad'}
+    for numero in range(1, 11)
+]
+REGISTROS[4]['fecha'] = ''
+REGISTROS[6]['desconocido'] = 'x'
+
+
+class Interrumpido(BaseException):
+    """Como un Ctrl+C o un kill a mitad de la importación (no lo captura renderizar_trozo)"""
+
+
+def _generador(fallar_en=None):
+    llamadas = []
+
+    def generar(motor, parte):
+        llamadas.append(parte.paciente)
+        if len(llamadas) == fallar_en:
+            raise Interrumpido()
+        return f'%PDF {parte.paciente}'.encode()
+
+    return generar
+
+
+def _importar(entrada, salida, monkeypatch, fallar_en=None):
+    monkeypatch.setattr(importacion, 'generar_con_motor', _generador(fallar_en))
+    Importacion(str(entrada), str(salida), procesos=0, trozo=1, por_zip=3, informar=lambda texto: None).ejecutar()
+
+
+@pytest.fixture
+def entrada(tmp_path):
+    ruta = tmp_path / 'partes.jsonl'
+    ruta.write_text(''.join(json.dumps(registro) + '\n' for registro in REGISTROS), encoding='utf-8')
+    return ruta
+
+
+def _contenido_zips(directorio):
+    contenido = {}
+    for nombre in sorted(os.listdir(directorio)):
+        if nombre.endswith('.zip'):
+            with zipfile.ZipFile(directorio / nombre) as archivo:
+                contenido[nombre] = {entrada: archivo.read(entrada) for entrada in archivo.namelist()}
+    return contenido
+
+
+def _contenido_directorio(directorio):
+    return {nombre: (directorio / nombre).read_bytes() for nombre in sorted(os.listdir(directorio))}
+
+
+def test_reanudar_en_directorio(tmp_path, entrada, monkeypatch):
+    _importar(entrada, tmp_path / 'referencia', monkeypatch)
+
+    salida = tmp_path / 'pdf'
+    with pytest.raises(Interrumpido):
+        _importar(entrada, salida, monkeypatch, fallar_en=5)
+    punto_control = json.loads((tmp_path / 'pdf.punto-control.json').read_text())
+    assert punto_control['registros'] == 5 and not punto_control.get('terminado')
+    # Una línea de errores a medio escribir cuando murió el proceso
+    with open(tmp_path / 'pdf.errores.jsonl', 'ab') as errores:
+        errores.write(b'{"registro": 6, "err')
+
+    _importar(entrada, salida, monkeypatch)
+    assert _contenido_directorio(salida) == _contenido_directorio(tmp_path / 'referencia')
+    assert (tmp_path / 'pdf.errores.jsonl').read_bytes() == (tmp_path / 'referencia.errores.jsonl').read_bytes()
+    assert [json.loads(linea)['registro'] for linea in (tmp_path / 'pdf.errores.jsonl').read_text().splitlines()] \
+        == [5, 7]
+
+
+def test_reanudar_serie_de_zip(tmp_path, entrada, monkeypatch):
+    referencia = tmp_path / 'referencia'
+    referencia.mkdir()
+    _importar(entrada, referencia / 'partes.zip', monkeypatch)
+    esperado = _contenido_zips(referencia)
+    assert [len(entradas) for entradas in esperado.values()] == [3, 3, 2]
+
+    salida = tmp_path / 'salida'
+    salida.mkdir()
+    # Falla al renderizar el registro 6: partes-00001.zip está cerrado (registros
+    # 1 a 3), partes-00002.zip tiene el registro 4 y el rechazo del 5 ya está en
+    # el archivo de errores, los dos después del punto de control
+    with pytest.raises(Interrumpido):
+        _importar(entrada, salida / 'partes.zip', monkeypatch, fallar_en=5)
+    punto_control = json.loads((salida / 'partes.punto-control.json').read_text())
+    assert punto_control['registros'] == 3 and punto_control['zip_siguiente'] == 2
+    errores = salida / 'partes.errores.jsonl'
+    assert errores.stat().st_size > punto_control['bytes_errores']
+    # El ZIP a medias se queda sin directorio central, como tras un kill
+    a_medias = salida / 'partes-00002.zip'
+    a_medias.write_bytes(a_medias.read_bytes()[:40])
+    with open(errores, 'ab') as archivo:
+        archivo.write(b'{"registro": 6')
+
+    _importar(entrada, salida / 'partes.zip', monkeypatch)
+    assert _contenido_zips(salida) == esperado
+    assert errores.read_bytes() == (referencia / 'partes.errores.jsonl').read_bytes()
+    assert json.loads((salida / 'partes.punto-control.json').read_text())['terminado'] is True
+
+
+def test_punto_control_de_otra_entrada(tmp_path, entrada, monkeypatch):
+    salida = tmp_path / 'pdf'
+    _importar(entrada, salida, monkeypatch)
+    otra = tmp_path / 'otra.jsonl'
+    otra.write_bytes(entrada.read_bytes())
+    with pytest.raises(ValueError, match='otra entrada'):
+        _importar(otra, salida, monkeypatch)
@@ -0,0 +1,79 @@
+"""Pruebas de /descargar-pdf/lote: documento determinista, límite síncrono y errores del renderizador."""
+import io
+import zipfile
+from datetime import datetime
+
+import pytest
+
+import app as aplicacion
+from lote_pdf import generar_lote_pdf
+from parte import Parte
+from renderizado import ColaLlena, RenderizadorPDF, TiempoAgotado
+
+
+def _partes(n):
+    return [{'paciente': f'Paciente {i % 3}', 'fecha': f'2024-03-{i % 28 + 1:02d}', 'observaciones': 'Sin novedad'}
+            for i in range(n)]
+
+
+@pytest.fixture
+def cliente():
+    return aplicacion.app.test_client()
+
+
+def test_lote_pdf_determinista():
+    def partes():
+        lista = [Parte(datos) for datos in _partes(3)]
+        lista[0].generado = datetime(2024, 3, 4, 9, 30)
+        return lista
+
+    pdf = generar_lote_pdf(partes())
+    assert pdf.startswith(b'%PDF')
+    assert generar_lote_pdf(partes()) == pdf
+    assert b'D:20240304093000' in pdf
+
+
+def test_lote_pdf_y_zip(cliente):
+    pdf = cliente.post('/descargar-pdf/lote', json=_partes(3))
+    assert pdf.status_code == 200
+    assert pdf.mimetype == 'application/pdf'
+    assert pdf.data.startswith(b'%PDF')
+
+    respuesta = cliente.post('/descargar-pdf/lote?formato=zip', json=_partes(4))
+    assert respuesta.status_code == 200
+    assert respuesta.headers['Content-Disposition'].endswith('.zip"')
+    with zipfile.ZipFile(io.BytesIO(respuesta.data)) as archivo:
+        nombres = archivo.namelist()
+        assert len(nombres) == len(set(nombres)) == 4
+        assert all(archivo.read(nombre).startswith(b'%PDF') for nombre in nombres)
+
+    assert cliente.post('/descargar-pdf/lote?formato=docx', json=_partes(1)).status_code == 400
+
+
+def test_lote_sincrono_limitado(cliente, monkeypatch):
+    monkeypatch.setattr(aplicacion, 'LOTE_MAXIMO_SINCRONO', 2)
+    respuesta = cliente.post('/descargar-pdf/lote', json=_partes(3))
+    assert respuesta.status_code == 413
+    assert '/api/trabajos' in respuesta.get_json()['error']
+    # Por la cola de trabajos sí se admite
+    assert cliente.post('/api/trabajos', json={'partes': _partes(3)}).status_code == 202
+
+
+@pytest.mark.parametrize('error, estado', [(ColaLlena(), 503), (TiempoAgotado(), 504), (RuntimeError('x'), 500)])
+def test_errores_del_renderizado_antes_de_responder(cliente, monkeypatch, error, estado):
+    def fallar(partes, formato='pdf', timeout=None):
+        raise error
+
+    monkeypatch.setattr(aplicacion.renderizador, 'renderizar_lote', fallar)
+    respuesta = cliente.post('/descargar-pdf/lote?formato=zip', json=_partes(2))
+    assert respuesta.status_code == estado
+    assert not respuesta.data.startswith(b'PK')
+
+
+def test_lote_en_el_pool():
+    renderizador = RenderizadorPDF(procesos=1, timeout=60)
+    try:
+        assert renderizador.renderizar_lote(_partes(2)).startswith(b'%PDF')
+        assert renderizador.renderizar_lote(_partes(2), 'zip').startswith(b'PK')
+    finally:
+        renderizador.cerrar()
@@ -0,0 +1,106 @@
+"""Pruebas de la suma de métricas entre procesos: nunca bajan al terminar un worker."""
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+import metricas
+from conftest import RAIZ
+
+# Un worker que cuenta `n` PDF y observa `n` fases de 0,2 s y termina como en
+# gunicorn: volcado final en worker_exit
+WORKER = '''
+import sys
+from metricas import FASES, PDF_GENERADOS, registro
+n = int(sys.argv[1])
+for _ in range(n):
+    PDF_GENERADOS.incrementar()
+    FASES.observar(0.2, fase='pdf_build')
+registro.volcar(esperar=True)
+print(__import__('os').getpid())
+'''
+
+
+def _worker(directorio, n):
+    salida = subprocess.run(
+        [sys.executable, '-c', WORKER, str(n)], cwd=RAIZ, check=True, capture_output=True, text=True,
+        env=dict(os.environ, PARTE_METRICAS_DIR=str(directorio)),
+    )
+    return int(salida.stdout)
+
+
+def _totales(registro):
+    """Valores de /metrics que deben ser monótonos: contadores, _count y _sum"""
+    totales = {}
+    for linea in registro.exponer().splitlines():
+        coincidencia = re.match(r'(parte_\w+?(?:_total|_count|_sum))(\{.*\})? (\S+)$', linea)
+        if coincidencia:
+            totales[coincidencia.group(1) + (coincidencia.group(2) or '')] = float(coincidencia.group(3))
+    return totales
+
+
+def _no_bajan(antes, despues):
+    for serie, valor in antes.items():
+        assert despues.get(serie, 0) >= valor, serie
+
+
+@pytest.fixture
+def registro(tmp_path):
+    # El registro del maestro: mismas métricas que la aplicación, sin valores propios
+    registro = metricas.Registro(str(tmp_path))
+    registro.contador('parte_pdf_generados_total', 'PDF generados')
+    registro.histograma('parte_fase_segundos', 'Fases')
+    registro.vaciar_directorio()
+    return registro
+
+
+def test_archivar_conserva_los_totales(registro, tmp_path):
+    primero = _worker(tmp_path, 3)
+    segundo = _worker(tmp_path, 5)
+    antes = _totales(registro)
+    assert antes['parte_pdf_generados_total'] == 8
+    assert antes['parte_fase_segundos_count{fase="pdf_build"}'] == 8
+
+    registro.archivar_proceso(primero)
+    assert _totales(registro) == antes
+    assert not os.path.exists(tmp_path / f'metricas_{primero}.json')
+
+    # Un worker nuevo suma sobre lo archivado
+    _worker(tmp_path, 2)
+    registro.archivar_proceso(segundo)
+    despues = _totales(registro)
+    _no_bajan(antes, despues)
+    assert despues['parte_pdf_generados_total'] == 10
+    assert despues['parte_fase_segundos_sum{fase="pdf_build"}'] == pytest.approx(2.0)
+
+
+def test_lectura_durante_el_archivado(registro, tmp_path, monkeypatch):
+    pid = _worker(tmp_path, 4)
+    antes = _totales(registro)
+    leidas = []
+    borrar = os.remove
+
+    def remove(ruta):
+        # Archivados ya escritos y archivo del worker aún presente
+        leidas.append(_totales(registro))
+        borrar(ruta)
+
+    monkeypatch.setattr(metricas.os, 'remove', remove)
+    registro.archivar_proceso(pid)
+    assert leidas == [antes]
+    assert _totales(registro) == antes
+
+
+def test_archivar_un_proceso_sin_archivo(registro, tmp_path):
+    pid = _worker(tmp_path, 1)
+    registro.archivar_proceso(pid)
+    registro.archivar_proceso(pid)
+    assert _totales(registro)['parte_pdf_generados_total'] == 1
+
+
+def test_vaciar_directorio_borra_los_archivados(registro, tmp_path):
+    registro.archivar_proceso(_worker(tmp_path, 1))
+    registro.vaciar_directorio()
+    assert _totales(registro).get('parte_pdf_generados_total', 0) == 0
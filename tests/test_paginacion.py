@@ -0,0 +1,69 @@
+"""Pruebas de la paginación por clave (fecha, id): el cursor se recorre entero
+buscando huecos y duplicados."""
+import random
+
+import pytest
+
+from conftest import parte_prueba as _parte
+
+
+def _recorrer(almacen, paciente, limite, **filtros):
+    total = almacen.conexion().execute('SELECT count(*) FROM partes').fetchone()[0]
+    ids, cursor, paginas = [], None, 0
+    while True:
+        anterior = cursor
+        partes, cursor = almacen.listar_por_paciente(paciente, despues=cursor, limite=limite, **filtros)
+        assert len(partes) <= limite
+        ids.extend(parte['id'] for parte in partes)
+        paginas += 1
+        if cursor is None:
+            return ids, paginas
+        # Un cursor que no avanza repetiría la misma página para siempre
+        assert cursor != anterior and paginas <= total, 'el cursor no avanza'
+
+
+@pytest.mark.parametrize('limite', [1, 7, 10, 50, 1000])
+def test_paginacion_sin_huecos_ni_duplicados(almacen, limite):
+    aleatorio = random.Random(limite)
+    # Muchas fechas repetidas: el desempate por id es lo que se prueba
+    fechas = [f'2024-03-{aleatorio.randrange(1, 8):02d}' for _ in range(137)]
+    almacen.guardar_varios([_parte(aleatorio.choice(['Luis', 'Marta']), fecha) for fecha in fechas])
+
+    for paciente in ('Luis', 'Marta'):
+        esperados = [fila[0] for fila in almacen.conexion().execute(
+            'SELECT id FROM partes WHERE paciente = ? ORDER BY fecha, id', (paciente,)
+        )]
+        ids, paginas = _recorrer(almacen, paciente, limite)
+        assert ids == esperados
+        assert paginas == max(1, -(-len(esperados) // limite))
+
+
+def test_paginacion_con_rango_de_fechas(almacen):
+    almacen.guardar_varios([_parte('Luis', f'2024-03-{dia % 20 + 1:02d}') for dia in range(100)])
+    esperados = [fila[0] for fila in almacen.conexion().execute(
+        "SELECT id FROM partes WHERE paciente = 'Luis' AND fecha BETWEEN '2024-03-05' AND '2024-03-09' "
+        'ORDER BY fecha, id'
+    )]
+    ids, _ = _recorrer(almacen, 'Luis', 6, desde='2024-03-05', hasta='2024-03-09')
+    assert ids == esperados
+
+
+def test_paginacion_estable_con_inserciones(almacen):
+    almacen.guardar_varios([_parte('Luis', f'2024-03-{dia % 10 + 1:02d}') for dia in range(40)])
+    vistos = []
+    partes, cursor = almacen.listar_por_paciente('Luis', limite=15)
+    vistos.extend(parte['id'] for parte in partes)
+    # Un parte nuevo anterior al cursor no aparece ni desplaza los siguientes
+    almacen.guardar(_parte('Luis', '2024-03-01'))
+    nuevo_posterior = almacen.guardar(_parte('Luis', '2024-03-31'))
+    while cursor is not None:
+        partes, cursor = almacen.listar_por_paciente('Luis', despues=cursor, limite=15)
+        vistos.extend(parte['id'] for parte in partes)
+    assert len(vistos) == len(set(vistos)) == 41
+    assert vistos[-1] == nuevo_posterior
+
+
+def test_iterar_por_paciente_coincide_con_listar(almacen):
+    almacen.guardar_varios([_parte('Luis', f'2024-0{mes}-01') for mes in range(1, 10) for _ in range(30)])
+    ids = [parte['id'] for parte in almacen.iterar_por_paciente('Luis', tamano_pagina=37)]
+    assert ids == _recorrer(almacen, 'Luis', 1000)[0]
@@ -0,0 +1,139 @@
+"""Pruebas de /pdf/<clave>.pdf: ETag, 304, rangos, redirección de claves antiguas y registro."""
+import re
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as aplicacion
+from almacenamiento import Almacen, RegistroPDF
+from cache_pdf import clave_pdf
+
+DATOS = {
+    'paciente': 'Luis Pérez',
+    'cuidadora': 'Ana',
+    'fecha': '2024-03-04',
+    'estado_general': 'Bueno',
+    'observaciones': 'Pasó buena noche',
+}
+
+
+@pytest.fixture
+def cliente():
+    return aplicacion.app.test_client()
+
+
+def _enlazar(cliente, **cambios):
+    """Genera el parte por /generar y devuelve la URL del PDF enlazada en la vista"""
+    respuesta = cliente.post('/generar', data=dict(DATOS, **cambios))
+    assert respuesta.status_code == 200
+    return re.search(r'href="(/pdf/[0-9a-f]+\.pdf)"', respuesta.get_data(as_text=True)).group(1)
+
+
+def _clave(url):
+    return url[len('/pdf/'):-len('.pdf')]
+
+
+def test_etag_y_304(cliente):
+    url = _enlazar(cliente)
+    respuesta = cliente.get(url)
+    assert respuesta.status_code == 200
+    assert respuesta.data.startswith(b'%PDF')
+    etag, debil = respuesta.get_etag()
+    assert not debil and etag.startswith(_clave(url) + '-')
+    assert 'private' in respuesta.headers['Cache-Control']
+
+    revalidacion = cliente.get(url, headers={'If-None-Match': f'"{etag}"'})
+    assert revalidacion.status_code == 304
+    assert revalidacion.data == b''
+    assert revalidacion.get_etag() == (etag, False)
+
+    # Otro ETag (o el de otra fecha de generación) no vale
+    otro = cliente.get(url, headers={'If-None-Match': f'"{_clave(url)}"'})
+    assert otro.status_code == 200
+
+
+def test_rangos(cliente):
+    url = _enlazar(cliente, observaciones='Rangos')
+    completo = cliente.get(url)
+    etag = completo.get_etag()[0]
+    total = len(completo.data)
+
+    trozo = cliente.get(url, headers={'Range': 'bytes=100-199'})
+    assert trozo.status_code == 206
+    assert trozo.data == completo.data[100:200]
+    assert trozo.headers['Content-Range'] == f'bytes 100-199/{total}'
+
+    final = cliente.get(url, headers={'Range': 'bytes=-50', 'If-Range': f'"{etag}"'})
+    assert final.status_code == 206
+    assert final.data == completo.data[-50:]
+
+    # Con un If-Range que no coincide se envía el PDF entero
+    otro = cliente.get(url, headers={'Range': 'bytes=0-9', 'If-Range': '"otro"'})
+    assert otro.status_code == 200
+    assert otro.data == completo.data
+
+    fuera = cliente.get(url, headers={'Range': f'bytes={total + 10}-{total + 20}'})
+    assert fuera.status_code == 416
+    assert fuera.headers['Content-Range'] == f'bytes */{total}'
+
+
+def test_clave_desconocida(cliente):
+    assert cliente.get(f"/pdf/{'0' * 64}.pdf").status_code == 404
+    assert cliente.get(f"/pdf/{'0' * 64}.pdf", headers={'If-None-Match': '*'}).status_code == 404
+
+
+def test_clave_antigua_redirige(cliente):
+    # Una clave de una versión anterior del diseño, registrada con los datos del parte
+    antigua = 'a' * 64
+    generado = datetime(2024, 3, 4, 9, 30)
+    aplicacion.almacen.registrar_pdf(antigua, 'platypus', dict(DATOS, observaciones='Antigua'), generado)
+
+    respuesta = cliente.get(f'/pdf/{antigua}.pdf')
+    assert respuesta.status_code == 301
+    actual = respuesta.headers['Location']
+    assert actual != f'/pdf/{antigua}.pdf'
+
+    # La clave actual queda registrada con la misma fecha de generación
+    nueva = cliente.get(actual)
+    assert nueva.status_code == 200
+    assert nueva.get_etag()[0] == clave_pdf(_clave(actual), generado)
+
+
+def test_descarga_y_get_comparten_etag(cliente):
+    url = _enlazar(cliente, observaciones='Descarga')
+    descarga = cliente.post('/descargar-pdf', data=dict(DATOS, observaciones='Descarga'))
+    assert descarga.headers['Content-Location'] == url
+    assert descarga.get_etag() == cliente.get(url).get_etag()
+
+
+def test_registro_simultaneo_en_dos_workers(tmp_path):
+    almacen = Almacen(str(tmp_path / 'partes.db'))
+    # Cada worker tiene su propio registro en memoria y su propia fecha
+    primero, segundo = RegistroPDF(almacen), RegistroPDF(almacen)
+    antes = datetime(2024, 3, 4, 9, 59)
+    despues = antes + timedelta(minutes=1)
+    assert primero.generado('c' * 64, 'platypus', DATOS, antes) == antes
+    assert segundo.generado('c' * 64, 'platypus', DATOS, despues) == antes
+    assert segundo.consultar('c' * 64) == antes
+
+
+def test_registro_caducado_cambia_el_etag(cliente):
+    url = _enlazar(cliente, observaciones='Caduca')
+    clave = _clave(url)
+    antiguo = cliente.get(url)
+    etag = antiguo.get_etag()[0]
+
+    # El registro caduca, se purga y otro worker vuelve a registrar la clave
+    # con otra fecha: el PDF de la caché no debe servirse con el ETag nuevo
+    conexion = aplicacion.almacen.conexion()
+    with conexion:
+        conexion.execute('DELETE FROM pdfs WHERE clave = ?', (clave,))
+    aplicacion.registro_pdf._generados.clear()
+    RegistroPDF(aplicacion.almacen).generado(clave, 'platypus', dict(DATOS, observaciones='Caduca'),
+                                             datetime.now().replace(second=0, microsecond=0) + timedelta(minutes=5))
+
+    nuevo = cliente.get(url, headers={'Range': 'bytes=0-9', 'If-Range': f'"{etag}"'})
+    assert nuevo.status_code == 200
+    assert nuevo.get_etag()[0] != etag
+    assert nuevo.data != antiguo.data
+    assert cliente.get(url, headers={'If-None-Match': f'"{etag}"'}).status_code == 200
@@ -0,0 +1,128 @@
+"""Pruebas de las tablas de resumen: los triggers de resumenes.py se comparan
+con una agregación hecha en Python sobre la tabla `partes` después de cada
+clase de cambio (inserción, actualización de paciente o fecha y borrado).
+"""
+import random
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+import resumenes
+from conftest import parte_prueba as _parte
+
+
+def _periodo(periodo, fecha):
+    if periodo == 'dia':
+        return fecha
+    dia = date.fromisoformat(fecha)
+    return (dia - timedelta(days=dia.weekday())).isoformat()
+
+
+def _esperado(almacen, dimension, periodo):
+    """Contadores por (valor, periodo) calculados en Python a partir de `partes`"""
+    filas = almacen.conexion().execute(
+        f'SELECT {dimension}, fecha, estado_general, signos_alerta FROM partes'
+    ).fetchall()
+    totales = defaultdict(Counter)
+    for valor, fecha, estado, alerta in filas:
+        contadores = totales[(valor, _periodo(periodo, fecha))]
+        contadores['partes'] += 1
+        estado = estado.lower()
+        contadores[estado if estado in ('bueno', 'regular', 'malo') else 'sin_estado'] += 1
+        contadores['con_alerta'] += alerta != ''
+    return {clave: tuple(contadores[c] for c in resumenes.CONTADORES) for clave, contadores in totales.items()}
+
+
+def _tabla(almacen, dimension, periodo):
+    filas = almacen.conexion().execute(
+        f"SELECT {dimension}, periodo, {', '.join(resumenes.CONTADORES)} FROM {resumenes.tabla(dimension, periodo)}"
+    ).fetchall()
+    return {(fila[0], fila[1]): tuple(fila[2:]) for fila in filas}
+
+
+def _comprobar_resumenes(almacen):
+    for dimension in resumenes.DIMENSIONES:
+        for periodo in resumenes.PERIODOS:
+            assert _tabla(almacen, dimension, periodo) == _esperado(almacen, dimension, periodo), (dimension, periodo)
+
+
+def test_resumenes_al_insertar(almacen):
+    almacen.guardar_varios([
+        _parte('Luis', '2024-03-04'),
+        _parte('Luis', '2024-03-10', estado='malo', alerta='fiebre'),
+        _parte('Luis', '2024-03-11', estado='Regular'),
+        _parte('Marta', '2024-03-10', estado='', cuidadora='Eva'),
+        _parte('Marta', '2024-03-10', estado='Otro', alerta='caída', cuidadora='Eva'),
+    ])
+    almacen.guardar(_parte('Luis', '2024-03-04', estado='BUENO'))
+    _comprobar_resumenes(almacen)
+    # 2024-03-10 es domingo: cuenta en la semana del lunes 4
+    assert _tabla(almacen, 'paciente', 'semana')[('Luis', '2024-03-04')][0] == 3
+
+
+def test_resumenes_al_actualizar(almacen):
+    ids = almacen.guardar_varios([
+        _parte('Luis', '2024-03-04'),
+        _parte('Luis', '2024-03-05', alerta='tos'),
+        _parte('Marta', '2024-03-05', cuidadora='Eva'),
+    ])
+    conexion = almacen.conexion()
+    with conexion:
+        # Cambio de paciente y de cuidadora
+        conexion.execute("UPDATE partes SET paciente = 'Marta', cuidadora = 'Eva' WHERE id = ?", (ids[0],))
+    _comprobar_resumenes(almacen)
+    with conexion:
+        # Cambio de fecha a otra semana, de estado y de alerta
+        conexion.execute(
+            "UPDATE partes SET fecha = '2024-03-12', estado_general = 'Malo', signos_alerta = '' WHERE id = ?",
+            (ids[1],),
+        )
+    _comprobar_resumenes(almacen)
+    # Las filas que se quedan sin partes desaparecen
+    assert ('Luis', '2024-03-04') not in _tabla(almacen, 'paciente', 'dia')
+    assert ('Luis', '2024-03-04') not in _tabla(almacen, 'paciente', 'semana')
+
+
+def test_resumenes_al_borrar(almacen):
+    ids = almacen.guardar_varios([_parte('Luis', f'2024-03-{dia:02d}', alerta='x' * (dia % 2)) for dia in range(1, 15)])
+    conexion = almacen.conexion()
+    with conexion:
+        conexion.execute('DELETE FROM partes WHERE id IN (?, ?, ?)', (ids[0], ids[5], ids[6]))
+    _comprobar_resumenes(almacen)
+    with conexion:
+        conexion.execute('DELETE FROM partes')
+    for dimension in resumenes.DIMENSIONES:
+        for periodo in resumenes.PERIODOS:
+            assert _tabla(almacen, dimension, periodo) == {}
+
+
+def test_resumenes_cambios_aleatorios(almacen):
+    aleatorio = random.Random(7)
+    pacientes = ['Luis', 'Marta', 'Ñoño']
+    estados = ['Bueno', 'regular', 'MALO', '', 'Otro']
+    inicio = date(2024, 1, 1)
+
+    def aleatorio_parte():
+        return _parte(
+            aleatorio.choice(pacientes),
+            (inicio + timedelta(days=aleatorio.randrange(60))).isoformat(),
+            estado=aleatorio.choice(estados),
+            alerta=aleatorio.choice(['', '', 'fiebre']),
+            cuidadora=aleatorio.choice(['Ana', 'Eva']),
+        )
+
+    ids = almacen.guardar_varios([aleatorio_parte() for _ in range(200)])
+    conexion = almacen.conexion()
+    for _ in range(100):
+        parte_id = aleatorio.choice(ids)
+        nuevo = aleatorio_parte()
+        with conexion:
+            if aleatorio.random() < 0.3:
+                conexion.execute('DELETE FROM partes WHERE id = ?', (parte_id,))
+            else:
+                conexion.execute(
+                    'UPDATE partes SET paciente = ?, cuidadora = ?, fecha = ?, estado_general = ?, '
+                    'signos_alerta = ? WHERE id = ?',
+                    (nuevo['paciente'], nuevo['cuidadora'], nuevo['fecha'], nuevo['estado_general'],
+                     nuevo['signos_alerta'], parte_id),
+                )
+    _comprobar_resumenes(almacen)
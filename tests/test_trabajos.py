@@ -0,0 +1,80 @@
+"""Pruebas de la cola de trabajos: un trabajo largo no se ejecuta dos veces."""
+import runpy
+import threading
+import time
+
+import pytest
+
+from almacenamiento import Almacen
+from conftest import RAIZ
+from trabajos import EN_CURSO, PENDIENTE, TERMINADO, ColaTrabajos
+
+
+class RenderizadorLento:
+    """Como RenderizadorPDF sin pool: ignora el timeout y tarda `segundos`"""
+
+    def __init__(self, segundos):
+        self.segundos = segundos
+        self.ejecuciones = 0
+        self._lock = threading.Lock()
+
+    def ejecutar(self, funcion, *args, timeout=None):
+        with self._lock:
+            self.ejecuciones += 1
+        time.sleep(self.segundos)
+        return b'%PDF-falso'
+
+    def renderizar_lote(self, partes, formato='pdf', timeout=None):
+        return self.ejecutar(None, partes, timeout=timeout)
+
+
+def _esperar(cola, trabajo_id, estado, limite=10):
+    final = time.monotonic() + limite
+    while time.monotonic() < final:
+        trabajo = cola.obtener(trabajo_id)
+        if trabajo['estado'] == estado:
+            return trabajo
+        time.sleep(0.02)
+    pytest.fail(f'El trabajo no llegó a {estado}: {cola.obtener(trabajo_id)}')
+
+
+def test_trabajo_mas_largo_que_el_plazo(tmp_path):
+    renderizador = RenderizadorLento(1.2)
+    cola = ColaTrabajos(Almacen(str(tmp_path / 'partes.db')), renderizador, str(tmp_path / 'trabajos'),
+                        hilos=2, plazo=0.4)
+    trabajo_id = cola.crear('lote', {'partes': []}, 'lote.pdf')
+    cola.arrancar()
+    _esperar(cola, trabajo_id, EN_CURSO)
+
+    # Mientras se ejecuta, la recuperación de abandonados (la que hace cada
+    # worker en su mantenimiento) no debe devolverlo a la cola
+    estados = set()
+    while cola.obtener(trabajo_id)['estado'] != TERMINADO:
+        cola._recuperar_abandonados()
+        estados.add(cola.obtener(trabajo_id)['estado'])
+        time.sleep(0.05)
+
+    assert PENDIENTE not in estados
+    assert renderizador.ejecuciones == 1
+    assert cola.obtener(trabajo_id)['intentos'] == 1
+
+
+def test_trabajo_abandonado_vuelve_a_la_cola(tmp_path):
+    cola = ColaTrabajos(Almacen(str(tmp_path / 'partes.db')), RenderizadorLento(0), str(tmp_path / 'trabajos'),
+                        plazo=0.2)
+    trabajo_id = cola.crear('lote', {'partes': []}, 'lote.pdf')
+    # Un worker lo reclama y muere sin renovar el plazo
+    assert cola._reclamar()['id'] == trabajo_id
+    time.sleep(0.3)
+    cola._recuperar_abandonados()
+    assert cola.obtener(trabajo_id)['estado'] == PENDIENTE
+
+
+def test_los_hilos_arrancan_con_el_worker(monkeypatch):
+    import app
+
+    arrancados = []
+    monkeypatch.setattr(app.cola_trabajos, 'arrancar', lambda: arrancados.append(True))
+    configuracion = runpy.run_path(f'{RAIZ}/gunicorn.conf.py')
+    configuracion['post_fork'](None, None)
+    assert arrancados == [True]
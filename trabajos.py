@@ -0,0 +1,270 @@
+"""Cola persistente de trabajos de renderizado de PDF.
+
+Los trabajos se guardan en SQLite (en la misma base que los partes) y los
+procesan hilos locales de cada worker, que se arrancan al crear el worker
+(post_fork en gunicorn.conf.py, lifespan en asgi.py). Mientras un trabajo se
+ejecuta, su worker renueva cada poco el plazo (`iniciado`); si el worker
+muere a medias deja de renovarlo y el trabajo vuelve a la cola cuando vence.
+Los PDF terminados se guardan en disco y se eliminan cuando vence su TTL.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from almacenamiento import Almacen
+from renderizado import ColaLlena
+
+logger = logging.getLogger(__name__)
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS trabajos (
+    id TEXT PRIMARY KEY,
+    tipo TEXT NOT NULL,
+    parametros TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    nombre TEXT NOT NULL,
+    intentos INTEGER NOT NULL DEFAULT 0,
+    creado REAL NOT NULL,
+    -- Inicio del intento actual, renovado mientras se ejecuta
+    iniciado REAL,
+    terminado REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_trabajos_estado ON trabajos (estado, creado);
+"""
+
+PENDIENTE = 'pendiente'
+EN_CURSO = 'en_curso'
+TERMINADO = 'terminado'
+ERROR = 'error'
+
+# Intentos antes de dar un trabajo por fallido
+MAX_INTENTOS = 3
+
+
+# Función de renderizado del informe: de nivel de módulo para poder enviarse
+# al pool de procesos; importa ReportLab dentro del proceso que la ejecuta
+
+def renderizar_informe(ruta_db, paciente, desde, hasta):
+    from informe_pdf import generar_informe_pdf
+    return generar_informe_pdf(Almacen(ruta_db), paciente, desde, hasta)
+
+
+class ColaTrabajos:
+    """Cola de trabajos con hilos de procesamiento locales"""
+
+    def __init__(self, almacen, renderizador, directorio, hilos=1, ttl=24 * 3600, plazo=600):
+        self.almacen = almacen
+        self.renderizador = renderizador
+        self.directorio = directorio
+        self.hilos = hilos
+        self.ttl = ttl
+        # Tiempo sin renovar tras el cual un trabajo en curso se considera abandonado
+        self.plazo = plazo
+        self._despertar = threading.Event()
+        self._arrancado = False
+        self._lock = threading.Lock()
+        os.makedirs(directorio, exist_ok=True)
+        self.almacen.conexion().executescript(ESQUEMA)
+
+    @classmethod
+    def desde_entorno(cls, almacen, renderizador, directorio_por_defecto):
+        return cls(
+            almacen,
+            renderizador,
+            os.environ.get('PARTE_TRABAJOS_DIR') or os.path.join(directorio_por_defecto, 'trabajos'),
+            hilos=int(os.environ.get('PARTE_TRABAJOS_HILOS', 1)),
+            ttl=float(os.environ.get('PARTE_TRABAJOS_TTL', 24 * 3600)),
+        )
+
+    # API pública
+
+    def crear(self, tipo, parametros, nombre):
+        """Encola un trabajo y devuelve su id"""
+        trabajo_id = uuid.uuid4().hex
+        conexion = self.almacen.conexion()
+        with conexion:
+            conexion.execute(
+                "INSERT INTO trabajos (id, tipo, parametros, estado, nombre, creado) VALUES (?, ?, ?, ?, ?, ?)",
+                (trabajo_id, tipo, json.dumps(parametros, ensure_ascii=False), PENDIENTE, nombre, time.time()),
+            )
+        self._despertar.set()
+        return trabajo_id
+
+    def obtener(self, trabajo_id):
+        """Estado del trabajo como dict, o None si no existe (o ya expiró)"""
+        fila = self.almacen.conexion().execute(
+            "SELECT id, tipo, estado, nombre, intentos, creado, iniciado, terminado, error "
+            "FROM trabajos WHERE id = ?",
+            (trabajo_id,),
+        ).fetchone()
+        if fila is None:
+            return None
+        trabajo = dict(fila)
+        if trabajo['terminado'] is not None:
+            trabajo['expira'] = trabajo['terminado'] + self.ttl
+        return trabajo
+
+    def ruta_artefacto(self, trabajo_id):
+        return os.path.join(self.directorio, f'{trabajo_id}.pdf')
+
+    def arrancar(self):
+        """Arranca los hilos de procesamiento (una vez por proceso)"""
+        if self._arrancado:
+            return
+        with self._lock:
+            if self._arrancado:
+                return
+            self._arrancado = True
+            for indice in range(self.hilos):
+                threading.Thread(target=self._bucle, name=f'trabajos-{indice}', daemon=True).start()
+
+    # Procesamiento
+
+    def _reclamar(self):
+        """Marca como en curso el trabajo pendiente más antiguo y lo devuelve"""
+        conexion = self.almacen.conexion()
+        with conexion:
+            fila = conexion.execute(
+                "UPDATE trabajos SET estado = ?, iniciado = ?, intentos = intentos + 1 "
+                "WHERE id = (SELECT id FROM trabajos WHERE estado = ? ORDER BY creado LIMIT 1) "
+                "RETURNING id, tipo, parametros, intentos",
+                (EN_CURSO, time.time(), PENDIENTE),
+            ).fetchone()
+        return dict(fila) if fila else None
+
+    def _finalizar(self, trabajo_id, estado, error=None):
+        conexion = self.almacen.conexion()
+        with conexion:
+            conexion.execute(
+                "UPDATE trabajos SET estado = ?, terminado = ?, error = ? WHERE id = ?",
+                (estado, time.time(), error, trabajo_id),
+            )
+
+    def _ejecutar(self, trabajo):
+        parametros = json.loads(trabajo['parametros'])
+        if trabajo['tipo'] == 'lote':
+            pdf = self.renderizador.renderizar_lote(parametros['partes'], timeout=self.plazo)
+        elif trabajo['tipo'] == 'informe':
+            pdf = self.renderizador.ejecutar(
+                renderizar_informe,
+                self.almacen.ruta,
+                parametros['paciente'],
+                parametros['desde'],
+                parametros['hasta'],
+                timeout=self.plazo,
+            )
+        else:
+            raise ValueError(f"Tipo de trabajo desconocido: {trabajo['tipo']}")
+
+        # Escritura atómica del artefacto
+        descriptor, temporal = tempfile.mkstemp(dir=self.directorio, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as archivo:
+                archivo.write(pdf)
+            os.replace(temporal, self.ruta_artefacto(trabajo['id']))
+        except BaseException:
+            os.unlink(temporal)
+            raise
+
+    def _renovar(self, trabajo_id, terminado):
+        """Renueva el plazo del trabajo hasta que se activa `terminado`"""
+        while not terminado.wait(self.plazo / 4):
+            try:
+                conexion = self.almacen.conexion()
+                with conexion:
+                    conexion.execute(
+                        "UPDATE trabajos SET iniciado = ? WHERE id = ? AND estado = ?",
+                        (time.time(), trabajo_id, EN_CURSO),
+                    )
+            except Exception:
+                logger.exception('No se pudo renovar el plazo del trabajo %s', trabajo_id)
+
+    def _devolver(self, trabajo_id):
+        """Vuelve a dejar pendiente un trabajo que no se pudo empezar"""
+        conexion = self.almacen.conexion()
+        with conexion:
+            conexion.execute(
+                "UPDATE trabajos SET estado = ?, intentos = intentos - 1 WHERE id = ?",
+                (PENDIENTE, trabajo_id),
+            )
+
+    def _recuperar_abandonados(self):
+        """Devuelve a la cola los trabajos de workers que murieron a medias"""
+        limite = time.time() - self.plazo
+        conexion = self.almacen.conexion()
+        with conexion:
+            conexion.execute(
+                "UPDATE trabajos SET estado = CASE WHEN intentos >= ? THEN ? ELSE ? END, "
+                "error = CASE WHEN intentos >= ? THEN 'Se agotaron los intentos' ELSE error END, "
+                "terminado = CASE WHEN intentos >= ? THEN ? ELSE terminado END "
+                "WHERE estado = ? AND iniciado < ?",
+                (MAX_INTENTOS, ERROR, PENDIENTE, MAX_INTENTOS, MAX_INTENTOS, time.time(), EN_CURSO, limite),
+            )
+
+    def purgar_expirados(self):
+        """Elimina los trabajos terminados (y sus PDF) cuyo TTL ya venció"""
+        conexion = self.almacen.conexion()
+        limite = time.time() - self.ttl
+        expirados = [
+            fila[0]
+            for fila in conexion.execute(
+                "SELECT id FROM trabajos WHERE estado IN (?, ?) AND terminado < ?",
+                (TERMINADO, ERROR, limite),
+            )
+        ]
+        for trabajo_id in expirados:
+            try:
+                os.unlink(self.ruta_artefacto(trabajo_id))
+            except FileNotFoundError:
+                pass
+        if expirados:
+            with conexion:
+                conexion.executemany("DELETE FROM trabajos WHERE id = ?", [(t,) for t in expirados])
+
+    def _mantenimiento(self):
+        self._recuperar_abandonados()
+        self.purgar_expirados()
+
+    def _bucle(self):
+        ultimo_mantenimiento = 0
+        while True:
+            try:
+                if time.monotonic() - ultimo_mantenimiento > 60:
+                    self._mantenimiento()
+                    ultimo_mantenimiento = time.monotonic()
+
+                trabajo = self._reclamar()
+                if trabajo is None:
+                    self._despertar.wait(1)
+                    self._despertar.clear()
+                    continue
+
+                # Sin pool, el plazo no corta el renderizado: mientras dure, se
+                # renueva para que otro hilo no lo dé por abandonado
+                terminado = threading.Event()
+                threading.Thread(
+                    target=self._renovar, args=(trabajo['id'], terminado), name='trabajos-plazo', daemon=True,
+                ).start()
+                try:
+                    self._ejecutar(trabajo)
+                except ColaLlena:
+                    # El pool de procesos está saturado: se reintenta más tarde
+                    self._devolver(trabajo['id'])
+                    time.sleep(1)
+                    continue
+                except Exception as error:
+                    logger.exception('Falló el trabajo %s', trabajo['id'])
+                    self._finalizar(trabajo['id'], ERROR, str(error) or error.__class__.__name__)
+                else:
+                    self._finalizar(trabajo['id'], TERMINADO)
+                finally:
+                    terminado.set()
+            except Exception:
+                # Errores de la propia cola (p. ej. base de datos bloqueada)
+                logger.exception('Error en el procesamiento de trabajos')
+                time.sleep(1)